@@ -0,0 +1,329 @@
+"""
+Process many PDFs in one run, each into its own output directory.
+
+Per-document status is checkpointed in <output>/batch_manifest.json after
+every document, so an interrupted run picks up where it stopped: finished
+documents are skipped unless the PDF changed, and documents that were still
+running are processed again. Documents are scheduled largest-first (by page
+count) over a pool of worker processes, which keeps the tail of the run short.
+
+Example:
+    python batch_cli.py inbox/ more/statement.pdf --output batch_output --workers 4
+    python batch_cli.py pdf_list.txt --output batch_output --retry-failed
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz
+
+from instrumentation import profiler
+from pipeline import init_worker, make_options, process_document
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "batch_manifest.json"
+
+
+def find_pdfs(inputs):
+    """
+    Expand directories (searched recursively), PDF files and list files into absolute PDF paths.
+
+    A list file is a .txt file with one path per line or a .json file holding a
+    list of paths; relative paths are resolved against the list file's directory.
+    """
+    pdf_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pdf_paths.extend(
+                path for path in glob.glob(os.path.join(item, "**", "*"), recursive=True)
+                if path.lower().endswith(".pdf") and os.path.isfile(path)
+            )
+        elif item.lower().endswith(".pdf"):
+            pdf_paths.append(item)
+        elif item.lower().endswith((".txt", ".json")):
+            with open(item, "r", encoding="utf-8") as list_file:
+                if item.lower().endswith(".json"):
+                    listed = json.load(list_file)
+                else:
+                    listed = [line.strip() for line in list_file if line.strip() and not line.startswith("#")]
+            base_dir = os.path.dirname(os.path.abspath(item))
+            pdf_paths.extend(os.path.join(base_dir, path) for path in listed)
+        else:
+            raise ValueError(f"Not a directory, PDF or list file: {item}")
+
+    # Keep the first occurrence of every document
+    return list(dict.fromkeys(os.path.abspath(path) for path in pdf_paths))
+
+
+def output_name(pdf_path):
+    """
+    Name of a document's output directory: its file name plus a hash of its path,
+    so documents with the same name in different folders don't collide.
+    """
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    digest = hashlib.sha1(pdf_path.encode("utf-8")).hexdigest()[:8]
+    return f"{stem}_{digest}"
+
+
+def load_manifest(output_root):
+    path = os.path.join(output_root, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"documents": {}}
+    with open(path, "r", encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(manifest, output_root):
+    """
+    Write the manifest atomically, so an interruption never leaves it half-written.
+    """
+    os.makedirs(output_root, exist_ok=True)
+    path = os.path.join(output_root, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _file_signature(pdf_path):
+    stat = os.stat(pdf_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _page_count(pdf_path):
+    try:
+        with fitz.open(pdf_path) as pdf_document:
+            return pdf_document.page_count
+    except Exception:
+        # Unreadable documents are scheduled last and fail in their worker
+        return 0
+
+
+def plan_documents(pdf_paths, manifest, output_root, retry_failed=False):
+    """
+    Update the manifest with the given documents and return the ones to process, largest first.
+    """
+    documents = manifest["documents"]
+    todo = []
+    for pdf_path in pdf_paths:
+        try:
+            signature = _file_signature(pdf_path)
+        except OSError as error:
+            # A missing or inaccessible file fails on its own instead of aborting the batch
+            logger.error("Can't read %s: %s", pdf_path, error)
+            documents[pdf_path] = {
+                "output_dir": os.path.join(output_root, output_name(pdf_path)),
+                "pages": 0, "size": None, "mtime": None, "status": "failed", "error": str(error),
+            }
+            continue
+        entry = documents.get(pdf_path)
+
+        unchanged = entry is not None and entry.get("size") == signature["size"] \
+            and entry.get("mtime") == signature["mtime"]
+        if unchanged and entry["status"] == "done":
+            continue
+        if unchanged and entry["status"] == "failed" and not retry_failed:
+            continue
+
+        if not unchanged:
+            entry = {
+                "output_dir": os.path.join(output_root, output_name(pdf_path)),
+                "pages": _page_count(pdf_path),
+                **signature,
+            }
+            documents[pdf_path] = entry
+        entry.update(status="pending", error=None)
+        todo.append(pdf_path)
+
+    todo.sort(key=lambda path: (documents[path]["pages"], documents[path]["size"]), reverse=True)
+    return todo
+
+
+def process_document_task(pdf_path, output_dir, document_options):
+    """
+    Process one document inside a worker process and summarize it.
+
+    Returns:
+        tuple: (summary dict, profiling records of the document).
+    """
+    start = time.perf_counter()
+    incremental = document_options.pop("incremental", False)
+    if incremental:
+        from incremental import process_document_incremental
+
+        page_results = process_document_incremental(pdf_path, output_dir=output_dir, **document_options)
+    else:
+        page_results = process_document(pdf_path, output_dir=output_dir, **document_options)
+
+    document_types = {}
+    error_pages = []
+    duplicate_pages = []
+    for page_result in page_results:
+        document_types[page_result["page"]] = page_result["classification"]
+        if page_result["checksum_errors"]:
+            error_pages.append(page_result["page"])
+        if page_result.get("duplicate_of"):
+            duplicate_pages.append(page_result["page"])
+
+    summary = {
+        "seconds": round(time.perf_counter() - start, 3),
+        "document_types": sorted(set(document_types.values())),
+        "checksum_error_pages": error_pages,
+        "duplicate_pages": duplicate_pages,
+    }
+    return summary, profiler.take_records()
+
+
+def run_batch(pdf_paths, output_root, workers=1, retry_failed=False, **document_options):
+    """
+    Process documents into per-document directories under ``output_root``, checkpointing as they finish.
+
+    Args:
+        pdf_paths (list): Absolute paths of the PDFs.
+        output_root (str): Directory for the manifest and the per-document output directories.
+        workers (int): Documents processed in parallel, each in its own worker process.
+        retry_failed (bool): Whether to process documents that failed in a previous run again.
+        **document_options: Passed to process_document (or process_document_incremental
+            with incremental=True) for every document.
+
+    Returns:
+        dict: The manifest, with the status of every document.
+    """
+    manifest = load_manifest(output_root)
+    todo = plan_documents(pdf_paths, manifest, output_root, retry_failed)
+    save_manifest(manifest, output_root)
+
+    documents = manifest["documents"]
+    logger.info("%d documents to process, %d already done",
+                len(todo), sum(1 for entry in documents.values() if entry["status"] == "done"))
+    if not todo:
+        return manifest
+
+    def finish(pdf_path, summary=None, error=None):
+        entry = documents[pdf_path]
+        if error is None:
+            entry.update(status="done", **summary)
+        else:
+            entry.update(status="failed", error=error)
+        save_manifest(manifest, output_root)
+        logger.info("[%s] %s (%d pages)", entry["status"], pdf_path, entry["pages"])
+
+    if workers <= 1:
+        for pdf_path in todo:
+            documents[pdf_path]["status"] = "running"
+            save_manifest(manifest, output_root)
+            try:
+                summary, records = process_document_task(
+                    pdf_path, documents[pdf_path]["output_dir"], dict(document_options)
+                )
+            except Exception as error:
+                logger.exception("Processing %s failed", pdf_path)
+                finish(pdf_path, error=str(error))
+            else:
+                # The task drained the records of this process; put them back for the report
+                profiler.merge(records)
+                finish(pdf_path, summary)
+        return manifest
+
+    options = make_options(
+        language=document_options.get("language", "en"),
+        extract_tables=document_options.get("extract_tables", True),
+    )
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(options, cpu_threads, document_options.get("ocr_cache_dir"),
+                  document_options.get("quantize_tables", False)),
+    ) as executor:
+        # Submitted largest-first; the pool hands them out in this order
+        futures = {}
+        for pdf_path in todo:
+            documents[pdf_path]["status"] = "running"
+            future = executor.submit(
+                process_document_task, pdf_path, documents[pdf_path]["output_dir"], dict(document_options)
+            )
+            futures[future] = pdf_path
+        save_manifest(manifest, output_root)
+
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                summary, records = future.result()
+            except Exception as error:
+                logger.error("Processing %s failed: %s", pdf_path, error)
+                finish(pdf_path, error=str(error))
+            else:
+                profiler.merge(records)
+                finish(pdf_path, summary)
+
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process a batch of PDFs, each into its own output directory.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories of PDFs or .txt/.json lists of PDFs")
+    parser.add_argument("--output", default="batch_output", help="root directory of the per-document outputs")
+    parser.add_argument("--workers", type=int, default=1, help="documents processed in parallel (0 for one per CPU core)")
+    parser.add_argument("--retry-failed", action="store_true", help="process documents that failed before again")
+    parser.add_argument("--text-mode", choices=["ocr", "hybrid"], default="ocr")
+    parser.add_argument("--render-mode", choices=["full", "adaptive"], default="full")
+    parser.add_argument("--storage-format", choices=["json", "binary", "both"], default="json")
+    parser.add_argument("--no-tables", action="store_true", help="skip table extraction")
+    parser.add_argument("--table-prefilter", type=float, metavar="THRESHOLD",
+                        help="skip table detection on pages whose layout evidence of a table scores below THRESHOLD (0-1)")
+    parser.add_argument("--save-images", action="store_true", help="save the rendered pages of every document")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse the unchanged stage results of previous runs in each document's directory")
+    parser.add_argument("--ocr-cache-dir", help="directory of the OCR result cache, shared by all documents")
+    parser.add_argument("--dedup-dir",
+                        help="index of processed pages, shared by all documents; near-duplicate pages reuse earlier results")
+    parser.add_argument("--profile", help="write a JSON report of per-stage timings to this file")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    if args.incremental:
+        for flag, used in (("--save-images", args.save_images),
+                           ("--table-prefilter", args.table_prefilter is not None),
+                           ("--dedup-dir", args.dedup_dir)):
+            if used:
+                parser.error(f"{flag} can't be combined with --incremental")
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    document_options = {
+        "text_mode": args.text_mode,
+        "render_mode": args.render_mode,
+        "extract_tables": not args.no_tables,
+        "storage_format": args.storage_format,
+        "ocr_cache_dir": args.ocr_cache_dir,
+    }
+    if args.incremental:
+        document_options["incremental"] = True
+    else:
+        document_options.update(
+            save_images=args.save_images, table_prefilter=args.table_prefilter, dedup_dir=args.dedup_dir,
+        )
+
+    manifest = run_batch(
+        find_pdfs(args.inputs), args.output, workers=args.workers or os.cpu_count() or 1,
+        retry_failed=args.retry_failed, **document_options,
+    )
+
+    if args.profile:
+        profiler.save_json(args.profile)
+
+    statuses = [entry["status"] for entry in manifest["documents"].values()]
+    logger.info("Done: %d, failed: %d", statuses.count("done"), statuses.count("failed"))
+    return 1 if "failed" in statuses else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Benchmark every pipeline stage on synthetic documents.
+
+Example:
+    python -m benchmarks.run_benchmarks --pages 20 --repeat 3 --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench.json --tolerance 0.2
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_documents import generate_document
+
+logger = logging.getLogger(__name__)
+
+STAGES = [
+    "pdf_to_images",
+    "perform_ocr",
+    "classify_document",
+    "extract_key_values",
+    "extract_tables_from_images",
+    "checksum_validator",
+]
+
+
+def percentile(values, fraction):
+    """
+    Return the given percentile (0-1) of the values, interpolating between samples.
+    """
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_stages(pdf_path, work_dir, skip_tables=False):
+    """
+    Run every stage once on a document and return the seconds each one took.
+    """
+    from pdf_to_image import pdf_to_images
+    from ocr import perform_ocr
+    from classify_document import classify_document
+    from key_value_extractor import extract_key_values
+    from checksum_validator import checksum_validator
+
+    timings = {}
+
+    def timed(name, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    # Start from an empty directory so no stale pages are picked up
+    for stale in glob.glob(os.path.join(work_dir, "*")):
+        os.remove(stale)
+
+    image_paths = timed("pdf_to_images", pdf_to_images, pdf_path, output_dir=work_dir)
+    ocr_json_path = timed("perform_ocr", perform_ocr, input_dir=work_dir, output_dir=work_dir)
+    classification_json_path = timed("classify_document", classify_document, ocr_json_path, output_dir=work_dir)
+    timed("extract_key_values", extract_key_values, ocr_json_path, classification_json_path, output_dir=work_dir)
+    if not skip_tables:
+        from table_extractor import extract_tables_from_images
+
+        timed("extract_tables_from_images", extract_tables_from_images, image_paths)
+    timed("checksum_validator", checksum_validator, ocr_json_path, classification_json_path, output_dir=work_dir)
+
+    return timings
+
+
+def summarize(samples, pages):
+    """
+    Summarize the timings of one stage over all repeats.
+    """
+    return {
+        "runs": len(samples),
+        "mean_seconds": statistics.mean(samples),
+        "p50_seconds": percentile(samples, 0.5),
+        "p90_seconds": percentile(samples, 0.9),
+        "p99_seconds": percentile(samples, 0.99),
+        "max_seconds": max(samples),
+        "pages_per_second": pages / statistics.median(samples) if statistics.median(samples) else None,
+    }
+
+
+def run_benchmarks(kinds, pages, table_density, repeat, use_stand_ins=True, skip_tables=False, seed=0):
+    """
+    Generate one document per kind, run all stages ``repeat`` times and summarize the timings.
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_paths = {}
+        for kind in kinds:
+            pdf_paths[kind] = generate_document(
+                kind, os.path.join(temp_dir, f"{kind}.pdf"), pages=pages,
+                table_density=table_density, seed=seed,
+            )
+
+        if use_stand_ins:
+            from benchmarks.stand_ins import install_stand_ins
+
+            install_stand_ins(pdf_paths.values())
+
+        if not skip_tables:
+            if importlib.util.find_spec("torch") is None:
+                logger.warning("torch is not installed, skipping the table extraction stage")
+                skip_tables = True
+
+        for kind, pdf_path in pdf_paths.items():
+            work_dir = os.path.join(temp_dir, kind)
+            os.makedirs(work_dir, exist_ok=True)
+
+            samples = {}
+            for run in range(repeat):
+                for stage_name, seconds in run_stages(pdf_path, work_dir, skip_tables).items():
+                    samples.setdefault(stage_name, []).append(seconds)
+                logger.info("Finished run %d/%d for %s", run + 1, repeat, kind)
+
+            results[kind] = {stage_name: summarize(values, pages) for stage_name, values in samples.items()}
+
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=0.1, metric="p50_seconds"):
+    """
+    Compare results with a baseline results file.
+
+    Returns:
+        list: One entry per stage that got slower than the baseline by more than ``tolerance``.
+    """
+    regressions = []
+    for kind, stages in results.items():
+        for stage_name, stats in stages.items():
+            baseline_stats = baseline.get("results", {}).get(kind, {}).get(stage_name)
+            if not baseline_stats or not baseline_stats.get(metric):
+                continue
+
+            change = stats[metric] / baseline_stats[metric] - 1
+            if change > tolerance:
+                regressions.append({
+                    "document": kind,
+                    "stage": stage_name,
+                    "metric": metric,
+                    "baseline": baseline_stats[metric],
+                    "current": stats[metric],
+                    "change": change,
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic documents.")
+    parser.add_argument("--kinds", nargs="+", default=["bank_statement", "check", "salary_slip"],
+                        help="document kinds to generate")
+    parser.add_argument("--pages", type=int, default=10, help="pages per document")
+    parser.add_argument("--table-density", type=float, default=0.75,
+                        help="fraction of pages that contain a table")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per document")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the document generator")
+    parser.add_argument("--real-models", action="store_true",
+                        help="use the real OCR and table-transformer models instead of the stand-ins")
+    parser.add_argument("--skip-tables", action="store_true", help="skip the table extraction stage")
+    parser.add_argument("--output", default="benchmark_results.json", help="results file to write")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed slowdown against the baseline, e.g. 0.1 for 10%%")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    results = run_benchmarks(
+        args.kinds, args.pages, args.table_density, args.repeat,
+        use_stand_ins=not args.real_models, skip_tables=args.skip_tables, seed=args.seed,
+    )
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "kinds": args.kinds,
+            "pages": args.pages,
+            "table_density": args.table_density,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "stand_ins": not args.real_models,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=4)
+    logger.info("Benchmark results saved to %s", args.output)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            logger.error(
+                "Regression in %s/%s: %.4fs -> %.4fs (%+.0f%%)",
+                regression["document"], regression["stage"],
+                regression["baseline"], regression["current"], regression["change"] * 100,
+            )
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Lightweight stand-ins for the OCR and table-transformer models.
+
+They let the benchmarks run offline and without model downloads while
+exercising the same code paths as the real models. The OCR stand-in returns
+the PDF text layer of pages it has seen rendered, and the table stand-ins find
+tables, rows and columns from ruling lines.
+"""
+import hashlib
+
+import cv2
+import fitz
+import numpy as np
+
+import model_registry
+from text_layer import text_layer_records
+
+TABLE_LABEL = 0
+LABEL2ID = {"table": 0, "table column": 1, "table row": 2, "table column header": 3}
+
+
+def _image_hash(bgr_image):
+    return hashlib.sha1(np.ascontiguousarray(bgr_image).tobytes()).hexdigest()
+
+
+class TextLayerOCR:
+    """
+    OCR stand-in that answers with the text layer of known rendered pages.
+
+    Images it doesn't know (e.g. table crops) produce no text.
+    """
+
+    def __init__(self):
+        self.pages = {}
+
+    def add_document(self, pdf_path, zoom=2):
+        """
+        Remember the text lines of every page of a PDF rendered at ``zoom``.
+        """
+        with fitz.open(pdf_path) as document:
+            for page in document:
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+                lines = [
+                    [record["position"], (record["text"], 0.99)]
+                    for record in text_layer_records(page, zoom)
+                ]
+
+                self.pages[_image_hash(rgb[:, :, ::-1])] = lines
+
+    def ocr(self, image, cls=True):
+        if isinstance(image, str):
+            image = cv2.imread(image)
+        lines = self.pages.get(_image_hash(image))
+        return [lines or None]
+
+
+def _line_positions(mask, axis, min_fraction):
+    """
+    Return the centre of each run of rows (axis=1) or columns (axis=0) that are mostly dark.
+    """
+    fractions = mask.mean(axis=axis)
+    indices = np.flatnonzero(fractions >= min_fraction)
+    if indices.size == 0:
+        return []
+
+    # Merge adjacent indices belonging to the same thick line
+    groups = np.split(indices, np.flatnonzero(np.diff(indices) > 1) + 1)
+    return [float(group.mean()) for group in groups]
+
+
+class _Outputs:
+    def __init__(self, detections):
+        self.detections = detections
+
+
+class _Config:
+    def __init__(self, label2id):
+        self.label2id = label2id
+
+
+class RulingLineProcessor:
+    """
+    Stand-in for the image processors: turns images into dark-pixel masks.
+    """
+
+    def __call__(self, images=None, return_tensors=None):
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        masks = [np.asarray(image.convert("L")) < 128 for image in images]
+        return {"pixel_values": masks}
+
+    def post_process_object_detection(self, outputs, threshold=0.5, target_sizes=None):
+        import torch
+
+        results = []
+        for (boxes, labels, scores), target_size in zip(outputs.detections, target_sizes):
+            height, width = float(target_size[0]), float(target_size[1])
+            keep = [index for index, score in enumerate(scores) if score >= threshold]
+            scaled = [
+                [boxes[i][0] * width, boxes[i][1] * height, boxes[i][2] * width, boxes[i][3] * height]
+                for i in keep
+            ]
+            results.append({
+                "scores": torch.tensor([scores[i] for i in keep], dtype=torch.float32),
+                "labels": torch.tensor([labels[i] for i in keep], dtype=torch.int64),
+                "boxes": torch.tensor(scaled, dtype=torch.float32).reshape(-1, 4),
+            })
+        return results
+
+
+class RulingLineTableDetector:
+    """
+    Stand-in for the table detection model: a table spans the outer ruling lines of a page.
+    """
+
+    config = _Config(LABEL2ID)
+
+    def __call__(self, pixel_values=None, **kwargs):
+        detections = []
+        for mask in pixel_values:
+            height, width = mask.shape
+            rows = _line_positions(mask, axis=1, min_fraction=0.3)
+            if len(rows) < 2:
+                detections.append(([], [], []))
+                continue
+
+            line_rows = mask[[int(row) for row in rows]]
+            columns = np.flatnonzero(line_rows.any(axis=0))
+            box = [columns[0] / width, rows[0] / height, columns[-1] / width, rows[-1] / height]
+            detections.append(([box], [TABLE_LABEL], [0.99]))
+        return _Outputs(detections)
+
+
+class RulingLineStructureRecognizer:
+    """
+    Stand-in for the structure model: rows and columns lie between ruling lines.
+    """
+
+    config = _Config(LABEL2ID)
+
+    def __call__(self, pixel_values=None, **kwargs):
+        detections = []
+        for mask in pixel_values:
+            height, width = mask.shape
+            rows = _line_positions(mask, axis=1, min_fraction=0.5)
+            if len(rows) < 2:
+                detections.append(([], [], []))
+                continue
+
+            table = mask[int(rows[0]):int(rows[-1]) + 1]
+            columns = _line_positions(table, axis=0, min_fraction=0.9)
+            left, right = (columns[0], columns[-1]) if len(columns) >= 2 else (0, width - 1)
+
+            boxes, labels = [], []
+            for top, bottom in zip(rows, rows[1:]):
+                boxes.append([left / width, top / height, right / width, bottom / height])
+                labels.append(LABEL2ID["table row"])
+            for column_left, column_right in zip(columns, columns[1:]):
+                boxes.append([column_left / width, rows[0] / height, column_right / width, rows[-1] / height])
+                labels.append(LABEL2ID["table column"])
+            boxes.append([left / width, rows[0] / height, right / width, rows[1] / height])
+            labels.append(LABEL2ID["table column header"])
+
+            detections.append((boxes, labels, [0.99] * len(boxes)))
+        return _Outputs(detections)
+
+
+def install_stand_ins(pdf_paths, zoom=2, language="en"):
+    """
+    Register the stand-in models with the model registry and return the OCR stand-in.
+    """
+    ocr = TextLayerOCR()
+    for pdf_path in pdf_paths:
+        ocr.add_document(pdf_path, zoom)
+
+    processor = RulingLineProcessor()
+    model_registry.register_ocr(ocr, language)
+    model_registry.register_table_models(
+        processor, RulingLineTableDetector(), RulingLineStructureRecognizer(), processor
+    )
+    return ocr
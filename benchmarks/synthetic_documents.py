@@ -0,0 +1,196 @@
+import random
+
+import fitz
+
+# A4 page size in points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+
+DESCRIPTIONS = [
+    "salary credit", "atm withdrawal debit", "grocery store debit", "interest credit",
+    "utility bill debit", "transfer credit", "card payment debit", "refund credit",
+]
+
+FILLER = (
+    "The bank is not liable for any loss arising from unauthorised use of the account. "
+    "Please review this document carefully and report any discrepancy within thirty days. "
+    "Terms and conditions apply to all services described in this document."
+)
+
+
+def _format_amount(cents):
+    return f"{cents / 100:,.2f}"
+
+
+def draw_table(page, top, header, rows, column_widths, row_height=18):
+    """
+    Draw a ruled table with a header row and return the y coordinate below it.
+    """
+    left = MARGIN
+    right = left + sum(column_widths)
+    bottom = top + row_height * (len(rows) + 1)
+
+    # Horizontal ruling lines
+    for index in range(len(rows) + 2):
+        y = top + index * row_height
+        page.draw_line((left, y), (right, y), width=1)
+
+    # Vertical ruling lines
+    x = left
+    for width in [0] + column_widths:
+        x += width
+        page.draw_line((x, top), (x, bottom), width=1)
+
+    for row_index, row in enumerate([header] + rows):
+        x = left
+        y = top + row_index * row_height + row_height - 5
+        for value, width in zip(row, column_widths):
+            page.insert_text((x + 4, y), value, fontsize=9)
+            x += width
+
+    return bottom
+
+
+def draw_paragraph(page, top, text, lines=6):
+    """
+    Write a few lines of filler text and return the y coordinate below them.
+    """
+    y = top
+    for _ in range(lines):
+        page.insert_text((MARGIN, y), text[:95], fontsize=9)
+        y += 14
+    return y
+
+
+def generate_bank_statement(pdf_path, pages=4, table_density=0.75, rows_per_page=25, seed=0):
+    """
+    Write a bank statement with running balances that carry over from page to page.
+    """
+    rng = random.Random(seed)
+    document = fitz.open()
+    balance = 100000
+    day = 1
+
+    for page_index in range(pages):
+        page = document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        y = MARGIN + 20
+        page.insert_text((MARGIN, y), "Bank Statement", fontsize=16)
+        y += 24
+        page.insert_text((MARGIN, y), "Account Number: 1234567890", fontsize=10)
+        y += 16
+        page.insert_text((MARGIN, y), "Statement period: 01/01/2024 - 31/12/2024", fontsize=10)
+        y += 16
+        if page_index == 0:
+            page.insert_text((MARGIN, y), f"Opening Balance: {_format_amount(balance)}", fontsize=10)
+            y += 16
+        y += 10
+
+        if rng.random() < table_density:
+            rows = []
+            for _ in range(rows_per_page):
+                description = rng.choice(DESCRIPTIONS)
+                amount = rng.randint(100, 50000)
+                credit, debit = ("", "")
+                if "credit" in description:
+                    balance += amount
+                    credit = _format_amount(amount)
+                else:
+                    balance -= amount
+                    debit = _format_amount(amount)
+                date = f"{(day % 28) + 1:02d}/{(day // 28) % 12 + 1:02d}/2024"
+                day += 1
+                rows.append([date, description, credit, debit, _format_amount(balance)])
+            y = draw_table(
+                page, y, ["Date", "Description", "Credit", "Debit", "Balance"], rows,
+                [75, 170, 80, 80, 90],
+            )
+            page.insert_text((MARGIN, y + 20), f"Closing Balance: {_format_amount(balance)}", fontsize=10)
+        else:
+            draw_paragraph(page, y, FILLER, lines=30)
+
+    document.save(pdf_path)
+    document.close()
+    return pdf_path
+
+
+def generate_cheque(pdf_path, pages=1, table_density=0.0, seed=0):
+    """
+    Write one cheque per page.
+    """
+    rng = random.Random(seed)
+    document = fitz.open()
+
+    for page_index in range(pages):
+        page = document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        y = MARGIN + 20
+        lines = [
+            f"Check Number: {100000 + page_index}",
+            "Date: 01/02/2024",
+            f"Pay to the order of John Smith {_format_amount(rng.randint(1000, 900000))}",
+            "Memo: rent",
+            "Routing Number: 021000021",
+            "Authorized Signature",
+        ]
+        for line in lines:
+            page.insert_text((MARGIN, y), line, fontsize=11)
+            y += 22
+        if rng.random() < table_density:
+            draw_table(page, y + 10, ["Item", "Amount"], [["rent", "1,200.00"], ["fees", "25.00"]], [200, 100])
+
+    document.save(pdf_path)
+    document.close()
+    return pdf_path
+
+
+def generate_salary_slip(pdf_path, pages=1, table_density=0.5, seed=0):
+    """
+    Write one salary slip per page, with an earnings table on some of them.
+    """
+    rng = random.Random(seed)
+    document = fitz.open()
+
+    for page_index in range(pages):
+        page = document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        gross = rng.randint(300000, 900000)
+        deductions = gross // 10
+        y = MARGIN + 20
+        lines = [
+            "Salary Slip",
+            f"Employee: Employee {page_index + 1}",
+            "Employer: Example Industries",
+            "Pay Period: 01/2024",
+            f"Gross Salary: {_format_amount(gross)}",
+            f"Deductions: {_format_amount(deductions)}",
+            f"Net Salary: {_format_amount(gross - deductions)}",
+        ]
+        for line in lines:
+            page.insert_text((MARGIN, y), line, fontsize=11)
+            y += 20
+        if rng.random() < table_density:
+            rows = [
+                ["Basic", _format_amount(gross * 7 // 10)],
+                ["Allowance", _format_amount(gross * 3 // 10)],
+                ["Income tax", _format_amount(deductions)],
+            ]
+            draw_table(page, y + 10, ["Component", "Amount"], rows, [200, 100])
+
+    document.save(pdf_path)
+    document.close()
+    return pdf_path
+
+
+GENERATORS = {
+    "bank_statement": generate_bank_statement,
+    "check": generate_cheque,
+    "salary_slip": generate_salary_slip,
+}
+
+
+def generate_document(kind, pdf_path, pages=4, table_density=0.75, seed=0):
+    """
+    Write a synthetic document of the given kind ("bank_statement", "check" or "salary_slip").
+    """
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown document kind: {kind}")
+    return GENERATORS[kind](pdf_path, pages=pages, table_density=table_density, seed=seed)
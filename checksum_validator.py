@@ -1,131 +1,286 @@
+import logging
 import json
 import re
 import os
-from fuzzywuzzy import fuzz
+from decimal import Decimal, ROUND_HALF_UP
 
-def fuzzy_match(keyword, text, threshold=80):
+import numpy as np
+
+from ocr import get_page_text
+from fuzzy_matching import FuzzyMatcher
+from instrumentation import stage
+from result_store import load_ocr_results
+
+logger = logging.getLogger(__name__)
+
+# Vocabulary used to tell credit rows from debit rows
+transaction_type_matcher = FuzzyMatcher(["credit", "debit"], threshold=80)
+
+# Token classes of the transaction row parser
+DATE, WORD, AMOUNT, OTHER = "date", "word", "amount", "other"
+
+# One alternation classifies every whitespace-separated token in a single scan
+_TOKEN_PATTERN = re.compile(
+    r"(?P<date>\d{2}/\d{2}/\d{4})(?!\S)"
+    r"|(?P<amount>-?(?:\d[\d,]*(?:\.\d+)?|\.\d+))(?!\S)"
+    r"|(?P<word>[A-Za-z]+)(?!\S)"
+    r"|(?P<other>\S+)"
+)
+
+# A row is a date, one or more words, and one to three amounts (the last one is the balance)
+MAX_ROW_AMOUNTS = 3
+
+
+def tokenize(text):
     """
-    Check if a keyword matches any part of the text with a minimum similarity threshold.
+    Split text on whitespace and classify each token as a date, word, amount or other.
+
+    Yields:
+        tuple: (token class, token text).
     """
-    words = text.split()
-    for word in words:
-        if fuzz.partial_ratio(keyword.lower(), word.lower()) >= threshold:
-            return True
-    return False
+    for match in _TOKEN_PATTERN.finditer(text):
+        yield match.lastgroup, match.group()
 
-def extract_transaction_rows(page_text):
+
+class TransactionRowParser:
     """
-    Extract transaction rows from page text.
+    Single-pass state machine that assembles transaction rows from tokens.
+
+    Text can be fed in pieces (e.g. one OCR line at a time); a row may span
+    pieces. Each token is looked at once, so parsing time is linear in the
+    length of the text.
+
+    A row is a date, followed by one or more words (the description) and one
+    to three amounts. The first amount is the transaction amount and the last
+    one the balance. Any other token ends the row being built.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self._reset()
+
+    def _reset(self):
+        self._date = None
+        self._words = []
+        self._amounts = []
+
+    def _emit(self):
+        if self._date is not None and self._words and self._amounts:
+            self.rows.append((self._date, " ".join(self._words), list(self._amounts)))
+        self._reset()
+
+    def feed(self, text):
+        for kind, token in tokenize(text):
+            if kind == DATE:
+                # A new date always starts a new row
+                self._emit()
+                self._date = token
+            elif self._date is None:
+                continue
+            elif kind == WORD and not self._amounts:
+                self._words.append(token)
+            elif kind == AMOUNT and self._words:
+                self._amounts.append(token)
+                if len(self._amounts) == MAX_ROW_AMOUNTS:
+                    self._emit()
+            else:
+                self._emit()
+        return self
+
+    def close(self):
+        """
+        Finish the row being built and return all rows as (date, description, amounts) tuples.
+        """
+        self._emit()
+        return self.rows
+
+
+def _parse_amount(token):
+    return float(token.replace(",", ""))
+
+
+def build_transactions(rows):
+    """
+    Turn parsed (date, description, amounts) rows into transaction dicts.
+
     Each row contains: date, description, credit, debit, and balance.
     """
+    # Score all row descriptions against the credit/debit vocabulary in one batch
+    row_types = transaction_type_matcher.match_many([row[1] for row in rows])
+
     transactions = []
-    
-    # Define regular expressions for extracting transaction details
-    patterns = {
-        "date": r"(\d{2}/\d{2}/\d{4})", 
-        "description": r"([A-Za-z\s]+)", 
-        "amount": r"([\d,\.]+)",  
-    }
-    
-    # Find all transaction rows 
-    rows = re.findall(
-        rf"{patterns['date']}\s+{patterns['description']}\s+{patterns['amount']}?\s+{patterns['amount']}?\s+{patterns['amount']}",
-        page_text, re.IGNORECASE
-    )
-
-    # Parse each transaction row
-    for row in rows:
-        date, description, amount1, amount2, balance = row
+    for (date, description, amounts), (is_credit, is_debit) in zip(rows, row_types):
         credit, debit = 0.0, 0.0
-        
-        # Determine which amounts correspond to credit or debit
-        if fuzzy_match("credit", description):
-            credit = float(amount1.replace(",", ""))
-        elif fuzzy_match("debit", description):
-            debit = float(amount1.replace(",", ""))
-        
-        # Populate the transaction dictionary
+
+        # With a single amount the row only states its balance
+        if len(amounts) > 1:
+            if is_credit:
+                credit = _parse_amount(amounts[0])
+            elif is_debit:
+                debit = _parse_amount(amounts[0])
+
         transactions.append({
-            "date": date.strip(),
-            "description": description.strip(),
+            "date": date,
+            "description": description,
             "credit": credit,
             "debit": debit,
-            "balance": float(balance.replace(",", "")),
+            "balance": _parse_amount(amounts[-1]),
         })
-    
+
     return transactions
 
+
+def extract_transaction_rows(page_text):
+    """
+    Extract transaction rows from page text.
+    Each row contains: date, description, credit, debit, and balance.
+    """
+    return build_transactions(TransactionRowParser().feed(page_text).close())
+
+
+def extract_transaction_rows_from_lines(lines):
+    """
+    Extract transaction rows from a stream of text lines, e.g. OCR lines in reading order.
+    """
+    parser = TransactionRowParser()
+    for line in lines:
+        parser.feed(line)
+    return build_transactions(parser.close())
+
+def to_cents(amount):
+    """
+    Convert an amount (number or string such as "1,234.56") to an exact number of cents.
+    """
+    if isinstance(amount, str):
+        amount = amount.replace(",", "")
+    cents = (Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    return int(cents)
+
+def transactions_to_columns(transactions):
+    """
+    Build columnar integer-cent arrays of the credit, debit and balance of each row.
+    """
+    return {
+        "credit": np.array([to_cents(t["credit"]) for t in transactions], dtype=np.int64),
+        "debit": np.array([to_cents(t["debit"]) for t in transactions], dtype=np.int64),
+        "balance": np.array([to_cents(t["balance"]) for t in transactions], dtype=np.int64),
+    }
+
 def validate_balance(transactions, opening_balance):
     """
     Validate the running balance of each transaction row.
+
+    The running balance is computed in exact cents with a single cumulative
+    sum, and every mismatching row is reported.
     """
-    current_balance = opening_balance
-    errors = []
+    if not transactions:
+        return []
+
+    columns = transactions_to_columns(transactions)
 
-    for index, transaction in enumerate(transactions):
-        credit = transaction["credit"]
-        debit = transaction["debit"]
-        expected_balance = transaction["balance"]
-
-        # Calculate new balance by adding credit or subtracting debit
-        current_balance += credit - debit
-
-        # Compare calculated balance with expected balance
-        if round(current_balance, 2) != round(expected_balance, 2):
-            errors.append({
-                "row": index + 1,
-                "date": transaction["date"],
-                "description": transaction["description"],
-                "expected_balance": expected_balance,
-                "calculated_balance": current_balance,
-                "error": "Balance mismatch"
-            })
+    # Calculate the running balance by adding credits and subtracting debits
+    calculated = to_cents(opening_balance) + np.cumsum(columns["credit"] - columns["debit"])
+
+    # Compare calculated balances with expected balances
+    errors = []
+    for index in np.flatnonzero(calculated != columns["balance"]):
+        transaction = transactions[index]
+        errors.append({
+            "row": int(index) + 1,
+            "date": transaction["date"],
+            "description": transaction["description"],
+            "expected_balance": transaction["balance"],
+            "calculated_balance": int(calculated[index]) / 100,
+            "error": "Balance mismatch"
+        })
 
     return errors
 
+def find_opening_balance(page_text):
+    """
+    Return the opening balance stated on the page, or None when there is none.
+    """
+    opening_balance_match = re.search(r"opening balance[:\s]*([\d,\.]+)", page_text)
+    if not opening_balance_match:
+        return None
+    return float(opening_balance_match.group(1).replace(",", ""))
+
+def validate_transactions(transactions, opening_balance, carried_balance=None):
+    """
+    Validate one page's transactions, falling back to the balance carried over from the previous page.
+
+    Returns:
+        tuple: (errors, closing_balance). errors is None when neither an opening
+        balance nor a carried balance is available.
+    """
+    if opening_balance is None:
+        opening_balance = carried_balance
+    if opening_balance is None:
+        # Nothing to start from, but the stated balances still carry over
+        closing_balance = transactions[-1]["balance"] if transactions else None
+        return None, closing_balance
+
+    with stage("validate", items=len(transactions)):
+        errors = validate_balance(transactions, opening_balance)
+
+    # The last stated balance opens the next page
+    closing_balance = transactions[-1]["balance"] if transactions else opening_balance
+    return errors, closing_balance
+
+def validate_page(page_text, carried_balance=None):
+    """
+    Validate the transactions of one bank statement page.
+
+    Returns:
+        tuple: (errors, closing_balance), see validate_transactions.
+    """
+    # Extract transactions and opening balance
+    transactions = extract_transaction_rows(page_text)
+    opening_balance = find_opening_balance(page_text)
+
+    return validate_transactions(transactions, opening_balance, carried_balance)
+
+def save_checksum_results(errors_summary, output_dir="data"):
+    """
+    Save page-wise balance errors to checksum_validation_result.json and return its path.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    checksum_result_path = os.path.join(output_dir, "checksum_validation_result.json")
+    with open(checksum_result_path, "w", encoding="utf-8") as json_file:
+        json.dump(errors_summary, json_file, indent=4)
+
+    logger.info("Checksum validation results saved to %s", checksum_result_path)
+
+    return checksum_result_path
+
 def checksum_validator(ocr_json_path, classification_json_path, output_dir="data"):
     """
     Perform checksum validation on a bank statement document.
     """
     # Load OCR data and classification results
-    with open(ocr_json_path, "r", encoding="utf-8") as file:
-        ocr_data = json.load(file)
+    ocr_data = load_ocr_results(ocr_json_path)
     
     with open(classification_json_path, "r", encoding="utf-8") as file:
         classification_data = json.load(file)
 
     errors_summary = {}
 
+    # Closing balance of the previous statement page
+    carried_balance = None
+
     # Process each page classified as a bank statement
     for page_number, page_content in ocr_data.items():
         if classification_data.get(page_number) == "bank_statement":
-            page_text = " ".join(item["text"].lower() for item in page_content)
-
-            # Extract transactions and opening balance
-            transactions = extract_transaction_rows(page_text)
+            page_text = get_page_text(page_content)
 
-            # Find the opening balance from the text
-            opening_balance_match = re.search(r"opening balance[:\s]*([\d,\.]+)", page_text)
-            if opening_balance_match:
-                opening_balance = float(opening_balance_match.group(1).replace(",", ""))
-            else:
-                print(f"Opening balance not found on page {page_number}")
-                continue
-            
             # Validate balance row-by-row
-            errors = validate_balance(transactions, opening_balance)
-            if errors:
+            errors, carried_balance = validate_page(page_text, carried_balance)
+            if errors is None:
+                logger.warning("Opening balance not found on page %s", page_number)
+            elif errors:
                 errors_summary[page_number] = errors
             else:
-                print(f"No balance discrepancies found on page {page_number}")
+                logger.info("No balance discrepancies found on page %s", page_number)
 
     # Save validation errors to a JSON file
-    os.makedirs(output_dir, exist_ok=True)
-    checksum_result_path = os.path.join(output_dir, "checksum_validation_result.json")
-    with open(checksum_result_path, "w", encoding="utf-8") as json_file:
-        json.dump(errors_summary, json_file, indent=4)
-
-    print(f"Checksum validation results saved to {checksum_result_path}")
-
-    return checksum_result_path
-
+    return save_checksum_results(errors_summary, output_dir)
@@ -1,47 +1,135 @@
+import logging
 import json
 import re
 import os
 
-def classify_page_text(page_text):
+from ocr import get_page_text
+from instrumentation import stage
+from result_store import load_ocr_results
 
-    # Define keyword sets for each document type
-    keywords = {
-        "bank_statement": ["account number", "transaction", "balance", "deposit", "withdrawal", "statement"],
-        "check": ["pay to the order", "memo", "check number", "authorized signature", "routing number"],
-        "salary_slip": ["net salary", "gross salary", "deduction", "pay period", "employer", "employee", "income"],
-    }
+logger = logging.getLogger(__name__)
 
-    # Count keyword matches for each category
-    match_counts = {category: 0 for category in keywords}
+# Default keyword sets for each document type
+DEFAULT_KEYWORDS = {
+    "bank_statement": ["account number", "transaction", "balance", "deposit", "withdrawal", "statement"],
+    "check": ["pay to the order", "memo", "check number", "authorized signature", "routing number"],
+    "salary_slip": ["net salary", "gross salary", "deduction", "pay period", "employer", "employee", "income"],
+}
 
-    for category, words in keywords.items():
-        for word in words:
-            # Count occurrences of each keyword in the page text
-            match_counts[category] += len(re.findall(r"\b" + re.escape(word) + r"\b", page_text))
+class KeywordClassifier:
+    """
+    Classifies page text by weighted keyword counts in a single regex scan.
+
+    All keywords of all categories are compiled once into one alternation,
+    wrapped in a lookahead so that every word-boundary position is tried and
+    overlapping keywords are all counted, just like searching for each keyword
+    separately.
+
+    Args:
+        keywords (dict): Category name -> list of keywords, or -> {keyword: weight}.
+    """
+
+    def __init__(self, keywords):
+        self.categories = list(keywords)
+
+        # keyword -> list of (category, weight)
+        self.keyword_weights = {}
+        for category, words in keywords.items():
+            if not isinstance(words, dict):
+                words = {word: 1.0 for word in words}
+            for word, weight in words.items():
+                self.keyword_weights.setdefault(word.lower(), []).append((category, float(weight)))
+
+        # Longest keywords first, so a match reports the longest keyword at each position
+        ordered = sorted(self.keyword_weights, key=len, reverse=True)
+        self.pattern = re.compile(
+            r"\b(?=(" + "|".join(re.escape(word) for word in ordered) + r")\b)"
+        )
+
+        # Shorter keywords that also match wherever a longer keyword matches
+        self.prefix_keywords = {
+            word: [
+                other for other in ordered
+                if other != word and word.startswith(other)
+                and re.fullmatch(re.escape(other) + r"\b.*", word, re.DOTALL)
+            ]
+            for word in ordered
+        }
+
+    def score(self, page_text):
+        """
+        Return the weighted keyword count of every category for the page text.
+        """
+        scores = {category: 0 for category in self.categories}
+        for match in self.pattern.finditer(page_text):
+            word = match.group(1)
+            for matched in [word] + self.prefix_keywords[word]:
+                for category, weight in self.keyword_weights[matched]:
+                    scores[category] += weight
+        return scores
+
+    def classify(self, page_text):
+        """
+        Return the category with the highest score, or 'others' when no keyword matches.
+        """
+        scores = self.score(page_text)
+
+        # Determine the category with the highest match count
+        classified_category = max(scores, key=scores.get)
+
+        # If no matches or very low match counts, classify as 'others'
+        if all(count == 0 for count in scores.values()):
+            classified_category = "others"
+
+        return classified_category
+
+def load_keyword_config(config_path):
+    """
+    Build a KeywordClassifier from a JSON file of keyword sets.
+
+    The file maps each category to a list of keywords, or to an object of
+    keyword -> weight, e.g. {"invoice": {"invoice number": 2, "amount due": 1}}.
+    """
+    with open(config_path, "r", encoding="utf-8") as file:
+        return KeywordClassifier(json.load(file))
 
-    # Determine the category with the highest match count
-    classified_category = max(match_counts, key=match_counts.get)
+default_classifier = KeywordClassifier(DEFAULT_KEYWORDS)
 
-    # If no matches or very low match counts, classify as 'others'
-    if all(count == 0 for count in match_counts.values()):
-        classified_category = "others"
-    
-    return classified_category
+def classify_page_text(page_text, classifier=None):
+    """
+    Classify the lower-cased text of a page using the given (or default) keyword classifier.
+    """
+    with stage("classify"):
+        return (classifier or default_classifier).classify(page_text)
+
+def save_classification_results(classification_results, output_dir="data"):
+    """
+    Save page-wise classification results to classification_result.json and return its path.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    classification_result_path = os.path.join(output_dir, "classification_result.json")
+    with open(classification_result_path, "w", encoding="utf-8") as json_file:
+        json.dump(classification_results, json_file, indent=4)
+    logger.info("Page-wise classification result saved to %s", classification_result_path)
 
-def classify_document(ocr_json_path, output_dir="data"):
+    return classification_result_path
+
+def classify_document(ocr_json_path, output_dir="data", keywords_path=None):
     """
     Classifies each page of a document based on extracted OCR text and saves results as JSON.
 
     Args:
-        ocr_json_path (str): Path to the JSON file containing OCR results.
+        ocr_json_path (str): Path to the JSON file (or OCR store directory) containing OCR results.
         output_dir (str): Directory where the classification result JSON will be saved.
+        keywords_path (str): Optional JSON file with custom keyword sets and weights.
 
     Returns:
         str: Path to the JSON file containing the page-wise classification results.
     """
-    # Load OCR data from JSON file
-    with open(ocr_json_path, "r", encoding="utf-8") as file:
-        ocr_data = json.load(file)
+    # Load OCR data from the JSON file or OCR store
+    ocr_data = load_ocr_results(ocr_json_path)
+
+    classifier = load_keyword_config(keywords_path) if keywords_path else None
 
     # Dictionary to store classification results for each page
     classification_results = {}
@@ -49,21 +137,15 @@ def classify_document(ocr_json_path, output_dir="data"):
     # Process each page individually
     for page_number, page_content in ocr_data.items():
         # Combine all text in the page
-        page_text = " ".join(item["text"].lower() for item in page_content)
+        page_text = get_page_text(page_content)
 
         # Classify the page based on its text content
-        classified_type = classify_page_text(page_text)
+        classified_type = classify_page_text(page_text, classifier)
         classification_results[page_number] = classified_type
-        print(f"Classified {page_number} as {classified_type}")
+        logger.info("Classified %s as %s", page_number, classified_type)
 
     # Save page-wise classification result as JSON
-    os.makedirs(output_dir, exist_ok=True)
-    classification_result_path = os.path.join(output_dir, "classification_result.json")
-    with open(classification_result_path, "w", encoding="utf-8") as json_file:
-        json.dump(classification_results, json_file, indent=4)
-    print(f"Page-wise classification result saved to {classification_result_path}")
-
-    return classification_result_path
+    return save_classification_results(classification_results, output_dir)
 
 if __name__ == "__main__":
     # Example usage
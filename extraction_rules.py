@@ -0,0 +1,180 @@
+import json
+import os
+import re
+
+# Rules shipped with the project
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_rules.json")
+
+# Compiled rule sets, keyed by (path, modification time)
+_rule_cache = {}
+
+
+def label_part(pattern):
+    """
+    Return the part of a rule before its value group: the label the value follows.
+    """
+    escaped = in_class = False
+    for position, char in enumerate(pattern):
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(" and not pattern.startswith("(?", position):
+            return pattern[:position]
+    return pattern
+
+
+class RuleSet:
+    """
+    Compiled extraction rules of one document type.
+
+    Each rule is a regex whose first group holds the value of the field. All
+    rules are also combined into one alternation of lookaheads, with a named
+    group per field, so a page is scanned once for every position where any
+    field matches. Each field keeps its first match in the text, exactly as
+    if it had been searched for on its own.
+
+    The labels of the rules (see label_part) are combined the same way for
+    extract_from_index, which reads values next to their labels on the page.
+
+    Args:
+        rules (dict): Field name -> regex pattern.
+        flags (int): Regex flags applied to every rule.
+    """
+
+    def __init__(self, rules, flags=re.IGNORECASE):
+        self.fields = list(rules)
+        self.patterns = {field: re.compile(pattern, flags) for field, pattern in rules.items()}
+
+        # Field names may not be valid group names, so the groups are numbered
+        self.group_fields = {f"f{index}": field for index, field in enumerate(self.fields)}
+        self.combined = re.compile(
+            "|".join(
+                f"(?=(?P<f{index}>{rules[field]}))" for index, field in enumerate(self.fields)
+            ),
+            flags,
+        )
+
+        self.labels = {
+            field: re.compile(label_part(pattern), flags)
+            for field, pattern in rules.items() if label_part(pattern).strip()
+        }
+        self.any_label = re.compile(
+            "|".join(f"(?:{label.pattern})" for label in self.labels.values()), flags
+        ) if self.labels else None
+
+    def extract(self, page_text):
+        """
+        Return the value of every field found in the page text.
+        """
+        found = {}
+        if not self.fields:
+            return found
+
+        for match in self.combined.finditer(page_text):
+            position = match.start()
+
+            # The alternation reports one field per position; other fields
+            # starting at the same position are checked directly
+            winner = self.group_fields[match.lastgroup]
+            for field in [winner] + self.fields:
+                if field in found:
+                    continue
+                field_match = self.patterns[field].match(page_text, position)
+                if field_match:
+                    found[field] = field_match.group(1)
+
+            if len(found) == len(self.fields):
+                break
+
+        # Keep the declared field order
+        return {field: found[field] for field in self.fields if field in found}
+
+    def extract_from_index(self, index, page_text=None):
+        """
+        Return the value of every field, reading each value next to its label on the page.
+
+        ``index`` is a spatial_index.SpatialIndex of the page's OCR boxes. A
+        value is looked for after its label in the same box, then in the nearest
+        box to the right of the label, trying every box holding the label in
+        reading order, and only then in the nearest box below one. A value in a
+        neighbouring box must match the whole box. Fields whose value isn't
+        found that way fall back to extract on ``page_text``.
+        """
+        found = {}
+        if self.any_label is not None:
+            texts = [text.lower() for text in index.texts]
+
+            # Every box holding each field's label, from one scan per box
+            labelled = {field: [] for field in self.labels}
+            for box, text in enumerate(texts):
+                if not self.any_label.search(text):
+                    continue
+                for field, label in self.labels.items():
+                    label_match = label.search(text)
+                    if label_match:
+                        labelled[field].append((box, text[label_match.start():]))
+
+            # Values on the label's line win over values under a label, e.g. a column header
+            for field, boxes in labelled.items():
+                for find_neighbour in (index.right_of, index.below):
+                    for box, label_text in boxes:
+                        value = self._read_value(field, label_text, texts, find_neighbour(box))
+                        if value is not None:
+                            found[field] = value
+                            break
+                    if field in found:
+                        break
+
+        if len(found) < len(self.fields) and page_text is not None:
+            for field, value in self.extract(page_text).items():
+                found.setdefault(field, value)
+
+        return {field: found[field] for field in self.fields if field in found}
+
+    def _read_value(self, field, label_text, texts, neighbour):
+        """
+        Match a field's rule on its label's text, then on the label followed by a neighbouring box.
+
+        A value read from the neighbour must take up the whole box: a value
+        pattern that stops partway through it, like ``[\\w\\d]+`` on
+        "06 3167 10781391", would read a fragment the text search never did.
+        """
+        pattern = self.patterns[field]
+        match = pattern.match(label_text)
+        if match and match.group(1).strip():
+            return match.group(1)
+
+        if neighbour is not None:
+            candidate = f"{label_text} {texts[neighbour].strip()}"
+            match = pattern.match(candidate)
+            if match and match.group(1).strip() and match.end(1) == len(candidate):
+                return match.group(1)
+        return None
+
+
+def load_rules(rules_path=None):
+    """
+    Load and compile the extraction rules of every document type from a JSON file.
+
+    The file maps each document type to an object of field name -> regex.
+    Compiled rules are cached until the file changes.
+
+    Returns:
+        dict: Document type -> RuleSet.
+    """
+    rules_path = rules_path or DEFAULT_RULES_PATH
+    cache_key = (os.path.abspath(rules_path), os.path.getmtime(rules_path))
+
+    rule_sets = _rule_cache.get(cache_key)
+    if rule_sets is None:
+        with open(rules_path, "r", encoding="utf-8") as file:
+            rules = json.load(file)
+        rule_sets = {document_type: RuleSet(fields) for document_type, fields in rules.items()}
+        _rule_cache[cache_key] = rule_sets
+
+    return rule_sets
@@ -0,0 +1,86 @@
+from rapidfuzz import fuzz, process
+
+
+class FuzzyMatcher:
+    """
+    Checks which keywords of a fixed vocabulary fuzzily appear in a text.
+
+    A keyword appears in a text when its partial ratio against any word of
+    the text reaches the threshold. Scores are computed with rapidfuzz, for
+    all new words of a batch of texts in a single ``cdist`` call, and are
+    memoized per word and per text so repeated descriptions cost nothing.
+
+    Args:
+        keywords (list): Vocabulary to look for.
+        threshold (int): Minimum partial ratio (0-100) for a match.
+        max_cache_size (int): Number of words/texts kept in each memo before it is reset.
+    """
+
+    def __init__(self, keywords, threshold=80, max_cache_size=100000):
+        self.keywords = [keyword.lower() for keyword in keywords]
+        self.threshold = threshold
+        self.max_cache_size = max_cache_size
+        self._word_matches = {}
+        self._text_matches = {}
+
+    def _score_words(self, words):
+        """
+        Score the words that have not been seen yet against the whole vocabulary.
+        """
+        new_words = [word for word in dict.fromkeys(words) if word not in self._word_matches]
+        if not new_words:
+            return
+
+        if len(self._word_matches) + len(new_words) > self.max_cache_size:
+            self._word_matches.clear()
+
+        scores = process.cdist(
+            self.keywords, new_words, scorer=fuzz.partial_ratio, score_cutoff=self.threshold
+        )
+        for column, word in enumerate(new_words):
+            self._word_matches[word] = tuple(bool(score) for score in scores[:, column])
+
+    def match_many(self, texts):
+        """
+        Return, for each text, a tuple with one boolean per keyword telling whether it matched.
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        new_texts = [text for text in unique_texts if text not in self._text_matches]
+        if new_texts:
+            if len(self._text_matches) + len(new_texts) > self.max_cache_size:
+                self._text_matches.clear()
+                new_texts = unique_texts
+
+            text_words = {text: text.lower().split() for text in new_texts}
+            self._score_words([word for words in text_words.values() for word in words])
+
+            no_match = tuple(False for _ in self.keywords)
+            for text, words in text_words.items():
+                matches = no_match
+                for word in words:
+                    word_matches = self._word_matches.get(word)
+                    if word_matches is None:
+                        # The word memo was reset while scoring this batch
+                        self._score_words([word])
+                        word_matches = self._word_matches[word]
+                    matches = tuple(a or b for a, b in zip(matches, word_matches))
+                self._text_matches[text] = matches
+
+        return [self._text_matches[text] for text in texts]
+
+    def match(self, text):
+        """
+        Return a tuple with one boolean per keyword telling whether it matched the text.
+        """
+        return self.match_many([text])[0]
+
+
+def fuzzy_match(keyword, text, threshold=80):
+    """
+    Check if a keyword matches any word of the text with a minimum similarity threshold.
+    """
+    keyword = keyword.lower()
+    return any(
+        fuzz.partial_ratio(keyword, word.lower(), score_cutoff=threshold)
+        for word in text.split()
+    )
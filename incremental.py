@@ -0,0 +1,339 @@
+"""
+Incremental re-processing of documents.
+
+The pipeline stages form a small DAG:
+
+    page -> ocr ----> classify ----> key_values
+       |       |          |
+       |       +----------+--------> transactions -> validate
+       +--> tables
+
+Each stage result of each page is keyed by a fingerprint of its inputs (the
+page content or the outputs of the stages it depends on), the source of the
+modules implementing it and its configuration (keywords, extraction rules,
+zoom, language, ...). Fingerprints are kept in output_dir/.incremental/manifest.json.
+On a re-run only the stages whose fingerprint changed are recomputed, for the
+affected pages only, and the results are merged into the existing result files.
+Balance validation is cheap and depends on all previous pages, so it always runs.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import fitz
+
+import model_registry
+import ocr_cache
+from classify_document import DEFAULT_KEYWORDS, classify_page_text, load_keyword_config
+from checksum_validator import extract_transaction_rows, find_opening_balance
+from extraction_rules import DEFAULT_RULES_PATH
+from instrumentation import current_page, stage
+from key_value_extractor import extract_key_values_from_page
+from ocr import get_page_text, ocr_image
+from pdf_to_image import render_page
+from pipeline import STORAGE_FORMATS, collect_results, validate_in_order
+from preprocess import estimate_skew, extract_tables_adaptive, ocr_page_adaptive, ocr_preprocessed
+from result_store import OCR_STORE_NAME, TABLE_STORE_NAME, load_ocr_results, load_table_results
+from text_layer import extract_page_records
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+STATE_DIR_NAME = ".incremental"
+
+# Modules whose source is part of each stage's fingerprint
+STAGE_MODULES = {
+    "ocr": ["ocr.py", "text_layer.py", "pdf_to_image.py", "preprocess.py"],
+    "tables": ["table_extractor.py", "pdf_to_image.py", "preprocess.py"],
+    "classify": ["classify_document.py"],
+    "key_values": ["key_value_extractor.py", "extraction_rules.py", "spatial_index.py"],
+    "transactions": ["checksum_validator.py", "fuzzy_matching.py"],
+}
+
+STAGES = list(STAGE_MODULES)
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def fingerprint(*parts):
+    """
+    Hash any JSON-serialisable values into a short hex digest.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def _file_digest(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def code_versions():
+    """
+    Return a fingerprint of the source of the modules behind each stage.
+    """
+    return {
+        stage_name: fingerprint(*[_file_digest(os.path.join(_BASE_DIR, name)) for name in modules])
+        for stage_name, modules in STAGE_MODULES.items()
+    }
+
+
+def page_fingerprint(pdf_document, page):
+    """
+    Fingerprint what a page looks like: its content streams, images, size and rotation.
+    """
+    images = [pdf_document.xref_stream_raw(image[0]) or b"" for image in page.get_images(full=True)]
+    return fingerprint(page.read_contents(), *images, list(page.rect), page.rotation)
+
+
+def stage_configs(zoom, language, text_mode, quantize_tables, keywords_path, rules_path,
+                  render_mode="full", layout_zoom=1.0, deskew=False, binarize=False):
+    """
+    Return the configuration each stage's results depend on.
+    """
+    if keywords_path:
+        with open(keywords_path, "r", encoding="utf-8") as file:
+            keywords = json.load(file)
+    else:
+        keywords = DEFAULT_KEYWORDS
+    with open(rules_path or DEFAULT_RULES_PATH, "r", encoding="utf-8") as file:
+        rules = json.load(file)
+
+    # The layout zoom only matters to the adaptive render mode
+    layout = {"render_mode": render_mode, "layout_zoom": layout_zoom if render_mode == "adaptive" else None}
+    return {
+        "ocr": {"zoom": zoom, "language": language, "text_mode": text_mode, **layout,
+                "deskew": deskew, "binarize": binarize, "engine": model_registry.get_ocr_model_version()},
+        "tables": {"zoom": zoom, "quantize": quantize_tables, **layout},
+        "classify": {"keywords": keywords},
+        "key_values": {"rules": rules},
+        "transactions": {},
+    }
+
+
+def load_manifest(state_dir):
+    path = os.path.join(state_dir, "manifest.json")
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "pages": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "pages": {}}
+    return manifest
+
+
+def save_manifest(manifest, state_dir):
+    os.makedirs(state_dir, exist_ok=True)
+    path = os.path.join(state_dir, "manifest.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _load_existing(output_dir, storage_format):
+    """
+    Load the result files of a previous run, or empty dicts where they are missing.
+    """
+    def load_json(name):
+        path = os.path.join(output_dir, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def load_either(json_name, store_name, loader):
+        # Prefer whichever form the current run will write back
+        candidates = [store_name, json_name] if storage_format == "binary" else [json_name, store_name]
+        for name in candidates:
+            path = os.path.join(output_dir, name)
+            if os.path.exists(path):
+                return loader(path)
+        return {}
+
+    return {
+        "ocr": load_either("ocr_results.json", OCR_STORE_NAME, load_ocr_results),
+        "tables": load_either("table_extraction_result.json", TABLE_STORE_NAME, load_table_results),
+        "classify": load_json("classification_result.json"),
+        "key_values": load_json("key_value_extraction_result.json"),
+    }
+
+
+def process_document_incremental(pdf_path, output_dir="data", zoom=2, language="en",
+                                 extract_tables=True, text_mode="ocr", quantize_tables=False,
+                                 keywords_path=None, rules_path=None, storage_format="json",
+                                 force=(), render_mode="full", layout_zoom=1.0, deskew=False, binarize=False,
+                                 ocr_cache_dir=None):
+    """
+    Process a PDF, recomputing only the stages and pages whose inputs, code or configuration changed.
+
+    Results of unchanged stages are taken from the result files already in
+    ``output_dir``, and the merged results are written back there once the
+    generator has been consumed.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        output_dir (str): Directory holding the result files of previous runs.
+        keywords_path (str): Optional JSON file with custom classification keywords.
+        rules_path (str): Optional JSON file with custom extraction rules.
+        storage_format (str): "json", "binary" or "both", as in process_document.
+        force (iterable): Stage names to recompute regardless of their fingerprints.
+        render_mode, layout_zoom, deskew, binarize: As in process_document; they
+            are part of the OCR and table fingerprints.
+        ocr_cache_dir (str): Directory of the OCR result cache, or None to disable caching.
+
+    Yields:
+        dict: The results of each page, in page order, with the names of the
+        recomputed stages under "recomputed".
+    """
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unsupported storage format: {storage_format}")
+    unknown = set(force) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}")
+
+    state_dir = os.path.join(output_dir, STATE_DIR_NAME)
+    manifest = load_manifest(state_dir)
+    existing = _load_existing(output_dir, storage_format)
+    versions = code_versions()
+    configs = stage_configs(zoom, language, text_mode, quantize_tables, keywords_path, rules_path,
+                            render_mode, layout_zoom, deskew, binarize)
+    classifier = load_keyword_config(keywords_path) if keywords_path else None
+    model_registry.set_table_quantization(quantize_tables)
+    if ocr_cache_dir:
+        ocr_cache.enable(ocr_cache_dir)
+
+    stage_static = {name: fingerprint(versions[name], configs[name]) for name in STAGES}
+    counts = {name: 0 for name in STAGES}
+
+    def page_results():
+        pages = {}
+        with fitz.open(pdf_path) as pdf_document:
+            for page in pdf_document:
+                page_name = f"page_{page.number + 1}"
+                previous = manifest["pages"].get(page_name, {"keys": {}, "outputs": {}})
+                keys = {}
+                outputs = {}
+                recomputed = []
+
+                def is_fresh(stage_name, key, results=None):
+                    if stage_name in force or previous["keys"].get(stage_name) != key:
+                        return False
+                    if results is not None and page_name not in results:
+                        return False
+                    return True
+
+                with current_page(page_name):
+                    page_key = page_fingerprint(pdf_document, page)
+                    image = None
+                    layout_image = None
+
+                    # OCR (or text layer) and tables depend on the page itself
+                    keys["ocr"] = fingerprint(stage_static["ocr"], page_key)
+                    if is_fresh("ocr", keys["ocr"], existing["ocr"]):
+                        page_data = existing["ocr"][page_name]
+                        outputs["ocr"] = previous["outputs"]["ocr"]
+                    else:
+                        page_data = None
+                        if text_mode == "hybrid":
+                            page_data = extract_page_records(page, zoom, language)
+                        if page_data is None and render_mode == "adaptive":
+                            layout_image = render_page(page, layout_zoom)
+                            page_data = ocr_page_adaptive(page, layout_image, layout_zoom, zoom, language,
+                                                          deskew, binarize)
+                        elif page_data is None:
+                            image = render_page(page, zoom)
+                            if deskew or binarize:
+                                skew_angle = estimate_skew(image) if deskew else 0.0
+                                page_data = ocr_preprocessed(image, language, skew_angle, binarize)
+                            else:
+                                page_data = ocr_image(image, language)
+                        outputs["ocr"] = fingerprint(page_data)
+                        recomputed.append("ocr")
+
+                    tables = None
+                    if extract_tables:
+                        keys["tables"] = fingerprint(stage_static["tables"], page_key)
+                        if is_fresh("tables", keys["tables"], existing["tables"]):
+                            tables = existing["tables"][page_name]
+                        elif render_mode == "adaptive":
+                            if layout_image is None:
+                                layout_image = render_page(page, layout_zoom)
+                            tables = extract_tables_adaptive(page, layout_image, page_name, layout_zoom, zoom)
+                            recomputed.append("tables")
+                        else:
+                            from table_extractor import extract_tables_from_image
+
+                            if image is None:
+                                image = render_page(page, zoom)
+                            tables = extract_tables_from_image(image, page_name)
+                            recomputed.append("tables")
+                    image = layout_image = None
+
+                    # The text stages depend on the OCR output
+                    page_text = get_page_text(page_data)
+
+                    keys["classify"] = fingerprint(stage_static["classify"], outputs["ocr"])
+                    if is_fresh("classify", keys["classify"], existing["classify"]):
+                        document_type = existing["classify"][page_name]
+                    else:
+                        document_type = classify_page_text(page_text, classifier)
+                        recomputed.append("classify")
+
+                    keys["key_values"] = fingerprint(stage_static["key_values"], outputs["ocr"], document_type)
+                    if is_fresh("key_values", keys["key_values"], existing["key_values"]):
+                        key_values = existing["key_values"][page_name]
+                    else:
+                        key_values = extract_key_values_from_page(
+                            page_text, document_type, rules_path, page_records=page_data
+                        )
+                        recomputed.append("key_values")
+
+                    keys["transactions"] = fingerprint(stage_static["transactions"], outputs["ocr"], document_type)
+                    if is_fresh("transactions", keys["transactions"]) and "transactions" in previous["outputs"]:
+                        outputs["transactions"] = previous["outputs"]["transactions"]
+                    else:
+                        outputs["transactions"] = {"rows": None, "opening_balance": None}
+                        if document_type == "bank_statement":
+                            with stage("transactions") as record:
+                                outputs["transactions"] = {
+                                    "rows": extract_transaction_rows(page_text),
+                                    "opening_balance": find_opening_balance(page_text),
+                                }
+                                record["items"] = len(outputs["transactions"]["rows"])
+                        recomputed.append("transactions")
+
+                for stage_name in recomputed:
+                    counts[stage_name] += 1
+                pages[page_name] = {"keys": keys, "outputs": outputs}
+
+                yield {
+                    "page": page_name,
+                    "ocr": page_data,
+                    "classification": document_type,
+                    "key_values": key_values,
+                    "tables": tables,
+                    "transactions": outputs["transactions"]["rows"],
+                    "opening_balance": outputs["transactions"]["opening_balance"],
+                    "checksum_errors": None,
+                    "recomputed": recomputed,
+                }
+
+        # Only record the new fingerprints once every page went through
+        manifest["pages"] = pages
+        manifest["pdf"] = os.path.abspath(pdf_path)
+
+    results = collect_results(validate_in_order(page_results()), output_dir, extract_tables, storage_format)
+    yield from results
+
+    # The result files are written by now, so the manifest never points at missing outputs
+    save_manifest(manifest, state_dir)
+    logger.info("Recomputed pages per stage: %s", counts)
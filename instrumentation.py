@@ -0,0 +1,263 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Page currently being processed, attached to the stage records by default
+_current_page = contextvars.ContextVar("current_page", default=None)
+
+
+def _process_peak_rss_bytes():
+    """
+    Return the peak resident set size of the whole process so far, or None when unknown.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _summarize(stages, record):
+    """
+    Add one record to the per-stage totals in ``stages``.
+    """
+    stats = stages.setdefault(record["stage"], {
+        "calls": 0,
+        "items": 0,
+        "wall_seconds": 0.0,
+        "cpu_seconds": 0.0,
+        "max_wall_seconds": 0.0,
+        "process_peak_rss_bytes": 0,
+    })
+    stats["calls"] += 1
+    stats["items"] += record["items"] or 0
+    stats["wall_seconds"] += record["wall_seconds"]
+    stats["cpu_seconds"] += record["cpu_seconds"]
+    stats["max_wall_seconds"] = max(stats["max_wall_seconds"], record["wall_seconds"])
+    stats["process_peak_rss_bytes"] = max(stats["process_peak_rss_bytes"], record["process_peak_rss_bytes"] or 0)
+    if "python_peak_bytes" in record:
+        stats["python_peak_bytes"] = max(stats.get("python_peak_bytes", 0), record["python_peak_bytes"])
+
+
+class Profiler:
+    """
+    Records wall time, CPU time, peak memory and item counts of pipeline stages.
+
+    Each ``stage`` block produces one record. Records can be summarised per
+    stage, exported as JSON or Prometheus text, or written as a Chrome trace
+    (chrome://tracing, Perfetto) to see how the stages of each page overlap.
+
+    ``process_peak_rss_bytes`` is the peak resident memory of the whole
+    process up to the end of the stage, not of the stage itself, so it never
+    goes down once a big stage has run. ``python_peak_bytes`` (with
+    ``trace_python_memory``) is the peak Python heap usage of the stage alone.
+
+    Args:
+        trace_python_memory (bool): Also record the peak Python heap usage of
+            each stage with tracemalloc, which slows the pipeline down.
+        max_records (int): Records kept for reports and traces, None for all.
+            Older ones are folded into the per-stage summary, so long-running
+            processes keep their totals without growing.
+    """
+
+    def __init__(self, trace_python_memory=False, max_records=None):
+        self.enabled = True
+        self.trace_python_memory = trace_python_memory
+        self.max_records = max_records
+        self.records = []
+        # Summary of the records dropped to stay under max_records
+        self._folded = {}
+        self._lock = threading.Lock()
+
+        if trace_python_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name, page=None, items=0):
+        """
+        Time the enclosed block as one run of the stage ``name``.
+
+        The yielded record can be updated inside the block, e.g. to set the
+        number of items the stage processed.
+        """
+        record = {
+            "stage": name,
+            "page": page if page is not None else _current_page.get(),
+            "items": items,
+        }
+        if not self.enabled:
+            yield record
+            return
+
+        if self.trace_python_memory:
+            tracemalloc.reset_peak()
+
+        start_time = time.time()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - start_wall
+            record["cpu_seconds"] = time.process_time() - start_cpu
+            record["start_us"] = int(start_time * 1e6)
+            record["pid"] = os.getpid()
+            record["tid"] = threading.get_ident()
+            record["process_peak_rss_bytes"] = _process_peak_rss_bytes()
+            if self.trace_python_memory:
+                record["python_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+
+            with self._lock:
+                self._add(record)
+
+    def _add(self, *records):
+        self.records.extend(records)
+        if self.max_records is not None and len(self.records) > self.max_records:
+            # Fold the older half at once, so trimming stays cheap per record
+            folded = len(self.records) - self.max_records // 2
+            for record in self.records[:folded]:
+                _summarize(self._folded, record)
+            del self.records[:folded]
+
+    def merge(self, records):
+        """
+        Add records collected elsewhere, e.g. in a worker process.
+        """
+        with self._lock:
+            self._add(*records)
+
+    def snapshot(self):
+        """
+        Return a copy of the records collected so far, safe to read while stages are still running.
+        """
+        with self._lock:
+            return list(self.records)
+
+    def take_records(self):
+        """
+        Return the records collected so far and start over with an empty list.
+        """
+        with self._lock:
+            records, self.records = self.records, []
+        return records
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+            self._folded = {}
+
+    def summary(self):
+        """
+        Aggregate the records per stage.
+
+        Returns:
+            dict: Stage name -> calls, items, total wall/CPU seconds and peak memory.
+        """
+        with self._lock:
+            stages = {name: dict(stats) for name, stats in self._folded.items()}
+            records = list(self.records)
+
+        for record in records:
+            _summarize(stages, record)
+        return stages
+
+    def report(self):
+        """
+        Return the per-stage summary together with the per-page records.
+        """
+        return {"stages": self.summary(), "records": self.snapshot()}
+
+    def save_json(self, path):
+        """
+        Write the report as JSON and return its path.
+        """
+        with open(path, "w", encoding="utf-8") as json_file:
+            json.dump(self.report(), json_file, indent=4)
+        return path
+
+    def to_prometheus(self, prefix="document_pipeline"):
+        """
+        Return the per-stage summary in the Prometheus text exposition format.
+        """
+        metrics = [
+            ("stage_calls_total", "counter", "Number of times each stage ran", "calls"),
+            ("stage_items_total", "counter", "Number of items each stage processed", "items"),
+            ("stage_wall_seconds_total", "counter", "Wall time spent in each stage", "wall_seconds"),
+            ("stage_cpu_seconds_total", "counter", "CPU time spent in each stage", "cpu_seconds"),
+            ("stage_max_wall_seconds", "gauge", "Slowest single run of each stage", "max_wall_seconds"),
+            ("stage_process_peak_rss_bytes", "gauge", "Peak resident memory of the process at the end of each stage",
+             "process_peak_rss_bytes"),
+        ]
+        summary = self.summary()
+
+        lines = []
+        for name, metric_type, help_text, key in metrics:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            for stage_name, stats in summary.items():
+                lines.append(f'{prefix}_{name}{{stage="{stage_name}"}} {stats[key]}')
+        return "\n".join(lines) + "\n"
+
+    def save_prometheus(self, path):
+        """
+        Write the Prometheus text report and return its path.
+        """
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        return path
+
+    def save_chrome_trace(self, path):
+        """
+        Write the records as a Chrome trace file and return its path.
+        """
+        events = []
+        for record in self.snapshot():
+            events.append({
+                "name": record["stage"],
+                "cat": "pipeline",
+                "ph": "X",
+                "ts": record["start_us"],
+                "dur": int(record["wall_seconds"] * 1e6),
+                "pid": record["pid"],
+                "tid": record["tid"],
+                "args": {
+                    "page": record["page"],
+                    "items": record["items"],
+                    "cpu_seconds": record["cpu_seconds"],
+                },
+            })
+
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+        return path
+
+
+# Process-wide profiler used by the pipeline modules
+profiler = Profiler()
+
+
+def stage(name, page=None, items=0):
+    """
+    Time a block as a run of the stage ``name`` with the process-wide profiler.
+    """
+    return profiler.stage(name, page, items)
+
+
+@contextlib.contextmanager
+def current_page(page_name):
+    """
+    Attach the stage records of the enclosed block to the given page.
+    """
+    token = _current_page.set(page_name)
+    try:
+        yield
+    finally:
+        _current_page.reset(token)
@@ -1,43 +1,64 @@
+import logging
 import json
-import re
 import os
 
-def extract_key_values_from_page(page_text, document_type):
-    extracted_data = {}
-
-    # Define regular expression patterns for each document type
-    patterns = {
-        "bank_statement": {
-            "account_number": r"account number[:\s]*([\w\d]+)",
-            "total_balance": r"balance[:\s]*([\d,\.]+)",
-            "opening_balance": r"opening balance[:\s]*([\d,\.]+)"
-        },
-        "check": {
-            "check_number": r"check number[:\s]*([\w\d]+)",
-            "date": r"date[:\s]*([\w\d/]+)",
-            "payee": r"pay to the order of[:\s]*([\w\s]+)"
-        },
-        "salary_slip": {
-            "employee_name": r"employee[:\s]*([\w\s]+)",
-            "net_salary": r"net salary[:\s]*([\d,\.]+)",
-            "gross_salary": r"gross salary[:\s]*([\d,\.]+)",
-            "deductions": r"deductions[:\s]*([\d,\.]+)"
-        }
-    }
-
-    # Select the pattern set based on document type
-    if document_type in patterns:
-        for key, pattern in patterns[document_type].items():
-            match = re.search(pattern, page_text, re.IGNORECASE)
-            if match:
-                extracted_data[key] = match.group(1)
-
-    return extracted_data
-
-def extract_key_values(ocr_json_path, classification_json_path, output_dir="data"):
+from ocr import get_page_text
+from extraction_rules import load_rules
+from instrumentation import stage
+from result_store import OCRStore, load_ocr_results
+from spatial_index import SpatialIndex
+
+logger = logging.getLogger(__name__)
+
+def extract_key_values_from_page(page_text, document_type, rules_path=None, page_index=None, page_records=None):
+    """
+    Extract the fields defined for the document type from the page text.
+
+    The rules are read from ``rules_path`` (extraction_rules.json by default)
+    and compiled once. With a ``page_index`` (a SpatialIndex of the page's OCR
+    boxes, see index_page), values are read next to their labels on the page,
+    and only fields not found that way are searched for in the text. Passing
+    the page's OCR ``page_records`` instead builds the index only when the
+    document type has rules.
+    """
+    with stage("key_value") as record:
+        rule_set = load_rules(rules_path).get(document_type)
+        if rule_set is None:
+            return {}
+
+        if page_index is None and page_records is not None:
+            page_index = SpatialIndex.from_records(page_records)
+        if page_index is not None:
+            extracted_data = rule_set.extract_from_index(page_index, page_text)
+        else:
+            extracted_data = rule_set.extract(page_text)
+        record["items"] = len(extracted_data)
+        return extracted_data
+
+def index_page(ocr_results, page):
+    """
+    Build the SpatialIndex of one page of OCR results (a dict or an OCRStore).
+    """
+    if isinstance(ocr_results, OCRStore):
+        # Straight from the memory-mapped arrays, without building the records
+        return SpatialIndex.from_quads(ocr_results.boxes(page), ocr_results.page_texts(page))
+    return SpatialIndex.from_records(ocr_results[page])
+
+def save_key_value_results(key_value_results, output_dir="data"):
+    """
+    Save page-wise key-value pairs to key_value_extraction_result.json and return its path.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    key_value_result_path = os.path.join(output_dir, "key_value_extraction_result.json")
+    with open(key_value_result_path, "w", encoding="utf-8") as json_file:
+        json.dump(key_value_results, json_file, indent=4)
+    logger.info("Key-value extraction result saved to %s", key_value_result_path)
+
+    return key_value_result_path
+
+def extract_key_values(ocr_json_path, classification_json_path, output_dir="data", rules_path=None):
     # Load OCR data and classification results
-    with open(ocr_json_path, "r", encoding="utf-8") as file:
-        ocr_data = json.load(file)
+    ocr_data = load_ocr_results(ocr_json_path)
     
     with open(classification_json_path, "r", encoding="utf-8") as file:
         classification_data = json.load(file)
@@ -47,25 +68,20 @@ def extract_key_values(ocr_json_path, classification_json_path, output_dir="data
 
     for page_number, page_content in ocr_data.items():
         # Combine all text in the page
-        page_text = " ".join(item["text"].lower() for item in page_content)
+        page_text = get_page_text(page_content)
 
         # Get the document type for this page from classification results
         document_type = classification_data.get(page_number, "others")
 
-        # Extract key-value pairs based on document type
-        extracted_data = extract_key_values_from_page(page_text, document_type)
+        # Extract key-value pairs based on document type; pages without rules need no index
+        page_index = index_page(ocr_data, page_number) if document_type in load_rules(rules_path) else None
+        extracted_data = extract_key_values_from_page(page_text, document_type, rules_path, page_index)
         key_value_results[page_number] = extracted_data
 
-        print(f"Extracted data for {page_number}: {extracted_data}")
+        logger.info("Extracted data for %s: %s", page_number, extracted_data)
 
     # Save key-value extraction results as JSON
-    os.makedirs(output_dir, exist_ok=True)
-    key_value_result_path = os.path.join(output_dir, "key_value_extraction_result.json")
-    with open(key_value_result_path, "w", encoding="utf-8") as json_file:
-        json.dump(key_value_results, json_file, indent=4)
-    print(f"Key-value extraction result saved to {key_value_result_path}")
-
-    return key_value_result_path
+    return save_key_value_results(key_value_results, output_dir)
 
 if __name__ == "__main__":
     ocr_json_path = "data/ocr_results.json"  
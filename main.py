@@ -1,33 +1,79 @@
-from pdf_to_image import pdf_to_images
-from ocr import perform_ocr
-from classify_document import classify_document
-from key_value_extractor import extract_key_values
-import table_extractor
-import glob
-from checksum_validator import checksum_validator
+import argparse
+import logging
 
-pdf_path = "data/bank_statement.pdf"
-image_paths = pdf_to_images(pdf_path)
-print("Images generated:", image_paths)
-
-ocr_json_path = perform_ocr(input_dir="data")
-print("OCR results saved to:", ocr_json_path)
+from instrumentation import profiler
+from incremental import process_document_incremental
+from page_dedup import duplicate_documents
+from pipeline import process_document
+from table_prefilter import skip_report
 
-ocr_json_path = "data/ocr_results.json"
-document_type = classify_document(ocr_json_path)
-print("Document classified as:", document_type)
+pdf_path = "data/bank_statement.pdf"
 
-classification_json_path = "data/classification_result.json"
-key_value_json_path = extract_key_values(ocr_json_path, classification_json_path)
-print("Key-value extraction result saved to:", key_value_json_path)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process a document through the pipeline.")
+    parser.add_argument("pdf_path", nargs="?", default=pdf_path, help="PDF file to process")
+    parser.add_argument("--output-dir", default="data", help="directory for the result files and page images")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (0 for one per CPU core)")
+    parser.add_argument("--text-mode", choices=["ocr", "hybrid"], default="ocr",
+                        help="'hybrid' reads born-digital pages from the PDF text layer instead of running OCR")
+    parser.add_argument("--render-mode", choices=["full", "adaptive"], default="full",
+                        help="'adaptive' renders a low-resolution layout pass and re-renders only text blocks and tables")
+    parser.add_argument("--deskew", action="store_true", help="straighten skewed scans before OCR")
+    parser.add_argument("--binarize", action="store_true", help="binarize page images before OCR")
+    parser.add_argument("--table-prefilter", type=float, metavar="THRESHOLD",
+                        help="skip table detection on pages whose layout evidence of a table scores below THRESHOLD (0-1)")
+    parser.add_argument("--dedup-dir",
+                        help="index of processed pages; near-duplicates of indexed pages reuse their OCR and table results")
+    parser.add_argument("--storage-format", choices=["json", "binary", "both"], default="json",
+                        help="'binary' writes OCR and table results as memory-mappable columnar stores")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only recompute the stages and pages whose inputs, code or configuration changed since the last run")
+    parser.add_argument("--log-level", default="INFO", help="logging level, e.g. DEBUG or WARNING")
+    parser.add_argument("--profile", help="write a JSON report of per-stage timings to this file")
+    parser.add_argument("--metrics", help="write per-stage metrics in Prometheus text format to this file")
+    parser.add_argument("--trace", help="write a Chrome trace of the stages to this file")
+    args = parser.parse_args()
+    if args.incremental:
+        for flag, used in (("--workers", args.workers != 1),
+                           ("--table-prefilter", args.table_prefilter is not None),
+                           ("--dedup-dir", args.dedup_dir)):
+            if used:
+                parser.error(f"{flag} can't be combined with --incremental")
 
-# table_results = table_extractor.extract_tables_from_images(image_paths)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
-# Get all PNG and JPG files in the directory
-image_paths = glob.glob("data/*.png") + glob.glob("data/*.jpg")
+    # Stream the document page by page; result files are written to the output directory at the end
+    if args.incremental:
+        page_results = process_document_incremental(
+            args.pdf_path, output_dir=args.output_dir, text_mode=args.text_mode, storage_format=args.storage_format,
+            render_mode=args.render_mode, deskew=args.deskew, binarize=args.binarize,
+        )
+    else:
+        page_results = process_document(
+            args.pdf_path, output_dir=args.output_dir, save_images=True, workers=args.workers or None,
+            text_mode=args.text_mode, storage_format=args.storage_format,
+            render_mode=args.render_mode, deskew=args.deskew, binarize=args.binarize,
+            table_prefilter=args.table_prefilter, dedup_dir=args.dedup_dir,
+        )
+    processed = []
+    for page_result in page_results:
+        processed.append(page_result)
+        print(f"Processed {page_result['page']} as {page_result['classification']}")
+        if page_result.get("duplicate_of"):
+            print("Duplicate of", page_result["duplicate_of"])
+        print("Key-value pairs:", page_result["key_values"])
+        if page_result["checksum_errors"]:
+            print("Balance discrepancies:", page_result["checksum_errors"])
 
-table_results = table_extractor.extract_tables_from_images(image_paths)
- 
- 
-checksum_result_path = checksum_validator(ocr_json_path, classification_json_path)
-print("Checksum validation result saved to:", checksum_result_path)
+    if args.dedup_dir:
+        for source in duplicate_documents(processed):
+            logging.info("The whole document is a duplicate of %s", source)
+    if args.table_prefilter is not None:
+        logging.info("Table prefilter: %s", skip_report())
+    if args.profile:
+        profiler.save_json(args.profile)
+    if args.metrics:
+        profiler.save_prometheus(args.metrics)
+    if args.trace:
+        profiler.save_chrome_trace(args.trace)
@@ -0,0 +1,212 @@
+import functools
+import sys
+import threading
+
+# Hugging Face checkpoints used for table detection and structure recognition
+TABLE_DETECTION_CHECKPOINT = "microsoft/table-transformer-detection"
+TABLE_STRUCTURE_CHECKPOINT = "microsoft/table-transformer-structure-recognition"
+
+# Loaded models, keyed by name (and OCR language)
+_models = {}
+_lock = threading.Lock()
+
+# Number of CPU threads each model may use, None for the library defaults
+_cpu_threads = None
+
+# Whether the table-transformer models are dynamically quantized to int8
+_quantize_tables = False
+
+
+def set_cpu_threads(threads):
+    """
+    Limit the CPU threads used by the models, e.g. when several worker processes share a machine.
+
+    Applies to the OCR engines loaded afterwards and to torch immediately when it is imported.
+    """
+    global _cpu_threads
+    _cpu_threads = threads
+
+    if threads and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def set_table_quantization(enabled):
+    """
+    Use dynamic int8 quantization for the table-transformer models loaded from now on.
+
+    Quantized Linear layers run noticeably faster on CPU, at a small cost in accuracy.
+    """
+    global _quantize_tables
+    _quantize_tables = bool(enabled)
+
+
+def _prepare_table_model(model):
+    """
+    Put a table-transformer model in inference mode, quantizing it if configured.
+    """
+    import torch
+
+    model.eval()
+    if _quantize_tables:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def _get_or_load(key, loader):
+    """
+    Return the cached model stored under ``key``, loading it on first use.
+    """
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = loader()
+                _models[key] = model
+    return model
+
+
+def get_ocr(language="en"):
+    """
+    Return the shared PaddleOCR engine for the given language.
+    """
+    def load():
+        from paddleocr import PaddleOCR
+
+        options = {"cpu_threads": _cpu_threads} if _cpu_threads else {}
+        return PaddleOCR(
+            lang=language,
+            use_gpu=False,
+            show_log=False,
+            use_angle_cls=True,
+            **options,
+        )
+
+    return _get_or_load(("ocr", language), load)
+
+
+def get_table_image_processor():
+    """
+    Return the image processor of the table detection model.
+    """
+    def load():
+        from transformers import AutoImageProcessor
+
+        return AutoImageProcessor.from_pretrained(TABLE_DETECTION_CHECKPOINT)
+
+    return _get_or_load("table_image_processor", load)
+
+
+def get_table_detection_model():
+    """
+    Return the table-transformer model that finds tables on a page.
+    """
+    def load():
+        import torch
+        from transformers import TableTransformerForObjectDetection
+
+        if _cpu_threads:
+            torch.set_num_threads(_cpu_threads)
+        model = TableTransformerForObjectDetection.from_pretrained(TABLE_DETECTION_CHECKPOINT)
+        return _prepare_table_model(model)
+
+    return _get_or_load(("table_detection_model", _quantize_tables), load)
+
+
+def get_table_structure_model():
+    """
+    Return the table-transformer model that finds rows and columns in a table.
+    """
+    def load():
+        import torch
+        from transformers import TableTransformerForObjectDetection
+
+        if _cpu_threads:
+            torch.set_num_threads(_cpu_threads)
+        model = TableTransformerForObjectDetection.from_pretrained(TABLE_STRUCTURE_CHECKPOINT)
+        return _prepare_table_model(model)
+
+    return _get_or_load(("table_structure_model", _quantize_tables), load)
+
+
+def get_structure_feature_extractor():
+    """
+    Return the feature extractor used to prepare table crops for structure recognition.
+    """
+    def load():
+        from transformers import DetrFeatureExtractor
+
+        return DetrFeatureExtractor()
+
+    return _get_or_load("structure_feature_extractor", load)
+
+
+@functools.lru_cache(maxsize=None)
+def get_ocr_model_version():
+    """
+    Return a string identifying the installed OCR engine, used to key cached OCR results.
+    """
+    from importlib import metadata
+
+    versions = []
+    for package in ("paddleocr", "paddlepaddle"):
+        try:
+            versions.append(f"{package}=={metadata.version(package)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{package}==unknown")
+    return ";".join(versions)
+
+
+def warm_up(language="en", tables=True):
+    """
+    Load the models up front, e.g. when a worker process starts.
+    """
+    get_ocr(language)
+    if tables:
+        get_table_image_processor()
+        get_table_detection_model()
+        get_table_structure_model()
+        get_structure_feature_extractor()
+
+
+def register_ocr(engine, language="en"):
+    """
+    Use ``engine`` as the OCR engine for the given language, e.g. a stand-in for offline runs.
+
+    The engine must provide PaddleOCR's ``ocr(image, cls=...)`` method.
+    """
+    with _lock:
+        _models[("ocr", language)] = engine
+
+
+def register_table_models(image_processor, detection_model, structure_model, feature_extractor):
+    """
+    Use the given objects in place of the table-transformer models and their processors.
+
+    They must provide the same call and post-processing interface as the
+    Hugging Face classes they replace.
+    """
+    with _lock:
+        _models["table_image_processor"] = image_processor
+        _models["structure_feature_extractor"] = feature_extractor
+        for quantized in (False, True):
+            _models[("table_detection_model", quantized)] = detection_model
+            _models[("table_structure_model", quantized)] = structure_model
+
+
+def loaded_models():
+    """
+    Return the keys of the models currently held in memory.
+    """
+    return list(_models)
+
+
+def unload(key=None):
+    """
+    Drop one model (or all of them when ``key`` is None) so its memory can be freed.
+    """
+    with _lock:
+        if key is None:
+            _models.clear()
+        else:
+            _models.pop(key, None)
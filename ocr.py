@@ -1,17 +1,89 @@
-from paddleocr import PaddleOCR
+import logging
 import os
 import json
 import glob
 
-def perform_ocr(input_dir="data", output_dir="data", language="en"):
-    # Initialize PaddleOCR for the specified language
-    ocr = PaddleOCR(lang=language)
-    
+import numpy as np
+
+import model_registry
+import ocr_cache
+from instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+def ocr_image(image, language="en"):
+    """
+    Run OCR on a single page image and return its text records.
+
+    Args:
+        image: Path to an image file, a PIL image or an RGB NumPy array.
+        language (str): OCR language.
+
+    Returns:
+        list: One {"text", "confidence", "position"} record per detected line.
+    """
+    with stage("ocr") as record:
+        # Reuse the result of an identical image when the OCR cache is enabled
+        cache = ocr_cache.get_cache()
+        if cache is not None:
+            cache_key = cache.make_key(image, language)
+            page_data = cache.get(cache_key)
+            if page_data is not None:
+                record["items"] = len(page_data)
+                record["cache_hit"] = True
+                return page_data
+
+        ocr = model_registry.get_ocr(language)
+
+        # PaddleOCR expects a file path or a BGR array
+        if not isinstance(image, str):
+            image = np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+        result = ocr.ocr(image, cls=True)
+
+        page_data = []
+        for line in result[0] or []:  # Each line of the result
+            text_info = {
+                "text": line[1][0],      # Extracted text
+                "confidence": line[1][1],  # Confidence level
+                "position": line[0]       # Coordinates of the text box
+            }
+            page_data.append(text_info)
+
+        if cache is not None:
+            cache.put(cache_key, page_data)
+        record["items"] = len(page_data)
+
+    return page_data
+
+def get_page_text(page_content):
+    """
+    Join the OCR records of a page into one lower-cased string.
+    """
+    return " ".join(item["text"].lower() for item in page_content)
+
+def save_ocr_results(ocr_results, output_dir="data"):
+    """
+    Save page-wise OCR results to ocr_results.json and return its path.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    json_output_path = os.path.join(output_dir, "ocr_results.json")
+    with open(json_output_path, "w", encoding="utf-8") as json_file:
+        json.dump(ocr_results, json_file, indent=4, ensure_ascii=False)
+    logger.info("OCR results saved to %s", json_output_path)
+
+    return json_output_path
+
+def perform_ocr(input_dir="data", output_dir="data", language="en", cache_dir=None):
+    # Reuse OCR results of unchanged pages when a cache directory is given
+    if cache_dir:
+        ocr_cache.enable(cache_dir)
+
     # Find all PNG files in the input directory
     image_paths = sorted(glob.glob(os.path.join(input_dir, "*.png")))
     
     if not image_paths:
-        print("No PNG images found in the specified directory.")
+        logger.warning("No PNG images found in %s.", input_dir)
         return None
 
     # Dictionary to store OCR results organized by page
@@ -19,30 +91,18 @@ def perform_ocr(input_dir="data", output_dir="data", language="en"):
 
     for i, image_path in enumerate(image_paths):
         # Perform OCR on the image
-        result = ocr.ocr(image_path, cls=True)
-        
-        # Extracted text data for the current page
-        page_data = []
-        
-        for line in result[0]:  # Each line of the result
-            text_info = {
-                "text": line[1][0],      # Extracted text
-                "confidence": line[1][1],  # Confidence level
-                "position": line[0]       # Coordinates of the text box
-            }
-            page_data.append(text_info)
+        page_data = ocr_image(image_path, language)
         
         # Store the page's OCR data in the results dictionary
         ocr_results[f"page_{i + 1}"] = page_data
-        print(f"Processed OCR for {image_path}")
+        logger.info("Processed OCR for %s", image_path)
 
-    # Save OCR results to a JSON file
-    json_output_path = os.path.join(output_dir, "ocr_results.json")
-    with open(json_output_path, "w", encoding="utf-8") as json_file:
-        json.dump(ocr_results, json_file, indent=4, ensure_ascii=False)
-    print(f"OCR results saved to {json_output_path}")
+    cache = ocr_cache.get_cache()
+    if cache is not None:
+        logger.info("OCR cache: %s", cache.stats())
 
-    return json_output_path
+    # Save OCR results to a JSON file
+    return save_ocr_results(ocr_results, output_dir)
 
 if __name__ == "__main__":
     # Example usage
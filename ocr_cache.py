@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+import model_registry
+
+# Bump when the layout of the cached OCR records changes
+CACHE_FORMAT_VERSION = 1
+
+
+class OCRCache:
+    """
+    On-disk cache of OCR results, keyed by the hash of the page image.
+
+    Each entry is a small JSON file named after its key. The cache is bounded
+    by ``max_bytes``; when it grows beyond that, the least recently used
+    entries are removed. Hits refresh the entry's modification time, which is
+    what the LRU order is based on, so the order survives restarts.
+    """
+
+    def __init__(self, cache_dir=".ocr_cache", max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # key -> [size in bytes, last access time]
+        self._entries = {}
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith(".json"):
+                stat = os.stat(os.path.join(cache_dir, file_name))
+                self._entries[file_name[:-5]] = [stat.st_size, stat.st_mtime]
+        self._total_bytes = sum(size for size, _ in self._entries.values())
+
+    def make_key(self, image, language="en", kind="page"):
+        """
+        Build the cache key of an image for the given OCR language and kind of call.
+
+        Args:
+            image: Path to an image file, a PIL image or a NumPy array.
+            language (str): OCR language.
+            kind (str): Which OCR call the result belongs to, e.g. "page" or "table".
+        """
+        digest = hashlib.sha256()
+        if isinstance(image, str):
+            with open(image, "rb") as image_file:
+                digest.update(image_file.read())
+        else:
+            pixels = np.ascontiguousarray(np.asarray(image))
+            digest.update(str(pixels.shape).encode())
+            digest.update(pixels.tobytes())
+
+        digest.update(
+            f"|{kind}|{language}|{model_registry.get_ocr_model_version()}|{CACHE_FORMAT_VERSION}".encode()
+        )
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        Return the cached value for ``key``, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as cache_file:
+                value = json.load(cache_file)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries[key][1] = now
+        return value
+
+    def put(self, key, value):
+        """
+        Store ``value`` under ``key`` and evict old entries if the cache is too large.
+        """
+        path = self._path(key)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as cache_file:
+            cache_file.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous:
+                self._total_bytes -= previous[0]
+            self._entries[key] = [len(data), time.time()]
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._entries[key]
+            self._total_bytes -= size
+
+    def stats(self):
+        """
+        Return the hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+
+# Process-wide cache used by the OCR functions, None while caching is disabled
+_cache = None
+
+
+def enable(cache_dir=".ocr_cache", max_bytes=512 * 1024 * 1024):
+    """
+    Turn on OCR result caching for this process and return the cache.
+    """
+    global _cache
+    if _cache is None or _cache.cache_dir != cache_dir:
+        _cache = OCRCache(cache_dir, max_bytes)
+    else:
+        _cache.max_bytes = max_bytes
+    return _cache
+
+
+def disable():
+    """
+    Turn off OCR result caching for this process.
+    """
+    global _cache
+    _cache = None
+
+
+def get_cache():
+    """
+    Return the active OCR cache, or None when caching is disabled.
+    """
+    return _cache
@@ -0,0 +1,520 @@
+"""
+Near-duplicate page detection, so resubmitted and repeated pages reuse earlier results.
+
+Pages are looked up by a 64-bit perceptual hash (the signs of the lowest DCT
+frequencies of a 32x32 thumbnail). The index splits every hash into four
+16-bit bands. A hash within ``max_distance`` bits of the query is within
+``max_distance // 4`` bits of it in at least one band, so a lookup probes the
+few band values that close to the query's (a few hundred dict hits) instead
+of scanning all pages.
+
+Pages from the same template (the same bank's statements, say) hash alike
+even when their numbers differ, so a hash match is only a candidate. When both
+pages have a text layer, the text layers must be identical. The renders are
+then aligned, which absorbs the shift, rotation and scale of a rescan, and
+compared. A text box whose pixels changed at all is OCRed again on the new
+page, and the candidate is rejected unless it reads the same as the stored
+record, so a single changed digit can't slip through as scanner noise.
+
+    dedup_index/
+        index.jsonl         one line per page: id, hash, config, source, page, shape, text
+        pages/<id>.json     OCR records and tables of the page
+        pages/<id>.png      grayscale reference render of the page
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import uuid
+
+import cv2
+import fitz
+import numpy as np
+
+import model_registry
+from instrumentation import stage
+from pdf_to_image import render_page
+from text_layer import ocr_region
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+BAND_BITS = 16
+
+# Pages are hashed and compared on a render at this zoom, whatever zoom the results use
+REFERENCE_ZOOM = 1.0
+
+_BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _popcount(values):
+    """
+    Count the set bits of each value of a uint64 array.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    # NumPy < 2.0
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _gray(image):
+    array = np.asarray(image)
+    if array.ndim == 2:
+        return array
+    return cv2.cvtColor(np.ascontiguousarray(array[:, :, :3]), cv2.COLOR_RGB2GRAY)
+
+
+def page_hash(image):
+    """
+    Return the 64-bit perceptual hash of a page image (PIL image or array) as an int.
+    """
+    small = cv2.resize(_gray(image), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    frequencies = cv2.dct(small)[:8, :8].ravel()
+    # The DC term is left out of the median, it only measures overall brightness
+    bits = frequencies > np.median(frequencies[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dedup_config(zoom, language, text_mode="ocr", render_mode="full", deskew=False, binarize=False):
+    """
+    Fingerprint the settings that stored results depend on; pages only match entries with the same one.
+    """
+    settings = {
+        "zoom": zoom, "language": language, "text_mode": text_mode, "render_mode": render_mode,
+        "deskew": deskew, "binarize": binarize, "engine": model_registry.get_ocr_model_version(),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def align_pages(reference, image):
+    """
+    Find the affine transform that maps ``reference`` pixels onto ``image``, coarse to fine.
+
+    Both are grayscale arrays of the same shape. Returns a 2x3 matrix, or None
+    when the pages can't be aligned.
+    """
+    warp = np.eye(2, 3, dtype=np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-4)
+    for level_width in (150, 300, 600):
+        # Blurred small renders converge from far away; each level refines the previous one
+        scale = min(1.0, level_width / reference.shape[1])
+        reference_small = cv2.resize(reference, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        image_small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        level_warp = warp.copy()
+        level_warp[:, 2] *= scale
+        try:
+            _, level_warp = cv2.findTransformECC(
+                cv2.GaussianBlur(reference_small, (5, 5), 0).astype(np.float32),
+                cv2.GaussianBlur(image_small, (5, 5), 0).astype(np.float32),
+                level_warp, cv2.MOTION_AFFINE, criteria, None, 5,
+            )
+        except cv2.error:
+            return None
+        warp = level_warp.copy()
+        warp[:, 2] /= scale
+    return warp
+
+
+def _normalize(gray):
+    # Stretch the darkest ink to black and the paper to white, so faded or darkened
+    # rescans compare like the original. Ink is often under 1% of a page, so
+    # percentiles would land on the paper; a blurred minimum is robust to noise.
+    gray = gray.astype(np.float32)
+    low = float(cv2.GaussianBlur(gray, (3, 3), 0).min())
+    high = float(np.median(gray))
+    return np.clip((gray - low) / max(high - low, 1.0) * 255, 0, 255)
+
+
+def compare_pages(reference, image, boxes, tile=48, tolerance=1, contrast=100, box_contrast=64):
+    """
+    Align two renders of a page and find where they differ.
+
+    Outside the text boxes a pixel differs when it is darker by ``contrast``
+    than everything within ``tolerance`` pixels around it on the other render,
+    which ignores rescan noise on rulings and pictures. Inside a text box any
+    pixel that changes by ``box_contrast`` counts, because a digit changed at a
+    small font size may only move a handful of pixels.
+
+    Args:
+        reference: Grayscale array of the stored render.
+        image: Grayscale array of the new render, the same shape.
+        boxes: (N, 4) array of [x1, y1, x2, y2] text boxes in ``reference`` pixels.
+
+    Returns:
+        tuple: (warp mapping ``reference`` pixels onto ``image``, largest number of
+        differing pixels in any ``tile`` x ``tile`` tile outside the boxes, indices
+        of the boxes with any differing pixel), or None when the renders can't be aligned.
+    """
+    warp = align_pages(reference, image)
+    if warp is None:
+        return None
+    height, width = reference.shape
+    aligned = cv2.warpAffine(
+        image, warp, (width, height), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderValue=255
+    )
+
+    first = cv2.GaussianBlur(_normalize(reference), (3, 3), 0)
+    second = cv2.GaussianBlur(_normalize(aligned), (3, 3), 0)
+    kernel = np.ones((2 * tolerance + 1, 2 * tolerance + 1), np.uint8)
+    darker = np.maximum(cv2.erode(second, kernel) - first, cv2.erode(first, kernel) - second)
+    changed = (np.abs(first - second) > box_contrast).astype(np.uint8)
+
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    text_mask = np.zeros((height, width), np.uint8)
+    changed_boxes = []
+    if len(boxes):
+        # Summed-area table, so counting the changed pixels of a box costs four lookups
+        counts = cv2.integral(changed)
+        pad = max(2, int(0.25 * float(np.median(boxes[:, 3] - boxes[:, 1]))))
+        cells = np.round(boxes).astype(np.int64)
+        cells[:, :2] = np.maximum(cells[:, :2] - pad, 0)
+        cells[:, 2] = np.minimum(cells[:, 2] + pad, width)
+        cells[:, 3] = np.minimum(cells[:, 3] + pad, height)
+        for index, (x1, y1, x2, y2) in enumerate(cells.tolist()):
+            if x2 <= x1 or y2 <= y1:
+                continue
+            text_mask[y1:y2, x1:x2] = 1
+            if counts[y2, x2] - counts[y1, x2] - counts[y2, x1] + counts[y1, x1]:
+                changed_boxes.append(index)
+
+    diff = ((darker > contrast) & (text_mask == 0)).astype(np.int32)
+    rows, columns = height // tile, width // tile
+    tiles = diff[:rows * tile, :columns * tile].reshape(rows, tile, columns, tile).sum(axis=(1, 3))
+    return warp, int(tiles.max()) if tiles.size else 0, changed_boxes
+
+
+def _boxes(records, scale=1.0):
+    quads = np.asarray([record["position"] for record in records], dtype=np.float32).reshape(-1, 4, 2)
+    return np.concatenate([quads.min(axis=1), quads.max(axis=1)], axis=1) * scale
+
+
+def _transform(points, warp, x_scale, y_scale):
+    """
+    Map points of the reference render onto the new page: through ``warp``, then scaled.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    mapped = points @ warp[:, :2].T.astype(np.float64) + warp[:, 2].astype(np.float64)
+    return mapped * [x_scale, y_scale]
+
+
+def _same_text(first, second):
+    return "".join(first.split()).lower() == "".join(second.split()).lower()
+
+
+def text_digest(page):
+    """
+    Fingerprint the text layer of a page (its words, their rounded positions and the
+    page's images), or return None when it has no text layer.
+    """
+    words = [word for word in page.get_text("words") if word[4].strip()]
+    if not words:
+        return None
+    digest = hashlib.sha256()
+    for x1, y1, x2, y2, text, *_ in words:
+        digest.update(f"{round(x1)},{round(y1)},{round(x2)},{round(y2)},{text}\n".encode("utf-8"))
+    for info in page.get_image_info(hashes=True):
+        digest.update(info["digest"])
+    return digest.hexdigest()
+
+
+class PageIndex:
+    """
+    Persistent index of processed pages, queried for near-duplicates of new pages.
+
+    Several processes can share one index directory: entries are appended to
+    index.jsonl after their files are written, and every lookup first picks up
+    the entries other processes appended since.
+
+    Args:
+        index_dir (str): Directory of the index.
+        max_distance (int): Largest Hamming distance between hashes that makes a page a candidate.
+        max_tile_difference (int): Largest number of differing pixels per tile outside
+            the text boxes that still counts as the same page (see compare_pages).
+        max_candidates (int): Candidates verified per lookup, closest hash first.
+        max_reread (float): Largest fraction of a page's text boxes that are OCRed
+            again to verify a candidate; beyond that the page is processed from scratch.
+    """
+
+    def __init__(self, index_dir, max_distance=10, max_tile_difference=4, max_candidates=3, max_reread=0.5):
+        self.index_dir = index_dir
+        self.max_distance = max_distance
+        self.max_tile_difference = max_tile_difference
+        self.max_candidates = max_candidates
+        self.max_reread = max_reread
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._band_count = HASH_BITS // BAND_BITS
+        self._tables = [{} for _ in range(self._band_count)]
+        # Every band value within max_distance // bands bits of a band of the query is probed
+        radius = max_distance // self._band_count
+        self._flips = [
+            sum(1 << bit for bit in bits)
+            for flipped in range(radius + 1)
+            for bits in itertools.combinations(range(BAND_BITS), flipped)
+        ]
+        # Entries by row, with their hashes in a NumPy array for vectorised distances
+        self.entries = []
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        self._offset = 0
+
+        os.makedirs(os.path.join(index_dir, "pages"), exist_ok=True)
+        self.refresh()
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.index_dir, "index.jsonl")
+
+    def _band_keys(self, hash_value):
+        mask = (1 << BAND_BITS) - 1
+        for band in range(self._band_count):
+            yield (hash_value >> (band * BAND_BITS)) & mask
+
+    def _insert(self, entry):
+        row = len(self.entries)
+        if row == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[row] = entry["hash"]
+        self.entries.append(entry)
+        for table, key in zip(self._tables, self._band_keys(entry["hash"])):
+            table.setdefault(key, []).append(row)
+
+    def refresh(self):
+        """
+        Load the entries appended to the index since the last refresh.
+        """
+        try:
+            with open(self._index_path, "rb") as index_file:
+                index_file.seek(self._offset)
+                data = index_file.read()
+        except FileNotFoundError:
+            return
+
+        # A line still being written by another process is picked up next time
+        complete = data[:data.rfind(b"\n") + 1]
+        with self._lock:
+            for line in complete.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry["hash"] = int(entry["hash"], 16)
+                self._insert(entry)
+            self._offset += len(complete)
+
+    def candidates(self, hash_value, config):
+        """
+        Return the entries within ``max_distance`` bits of ``hash_value``, as sorted (distance, entry) pairs.
+        """
+        with self._lock:
+            rows = [
+                row
+                for table, key in zip(self._tables, self._band_keys(hash_value))
+                for flip in self._flips
+                for row in table.get(key ^ flip, ())
+            ]
+            if not rows:
+                return []
+            rows = np.asarray(rows, dtype=np.int64)
+            distances = _popcount(self._hashes[rows] ^ np.uint64(hash_value))
+
+            # A row can be reached through several bands
+            close = distances <= self.max_distance
+            close_rows = dict(zip(rows[close].tolist(), distances[close].tolist()))
+            matches = [
+                (int(distance), self.entries[row])
+                for row, distance in close_rows.items()
+                if self.entries[row]["config"] == config
+            ]
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+    def _path(self, entry_id, extension):
+        return os.path.join(self.index_dir, "pages", f"{entry_id}.{extension}")
+
+    def _reads_the_same(self, page, record, warp, x_scale, y_scale, zoom, language):
+        """
+        OCR the region of ``page`` that a stored record maps to and compare the texts.
+        """
+        box = _boxes([record], REFERENCE_ZOOM / zoom)[0]
+        corners = _transform([[box[0], box[1]], [box[2], box[1]], [box[2], box[3]], [box[0], box[3]]],
+                             warp, x_scale, y_scale)
+        # Pad by a fraction of the text height, whichever way the line runs on a rotated page
+        pad = 0.2 * min(box[2] - box[0], box[3] - box[1])
+        x1, y1 = corners.min(axis=0) - pad
+        x2, y2 = corners.max(axis=0) + pad
+        scale = 1 / REFERENCE_ZOOM
+        # Renders show the displayed page, which is the space ocr_region clips in
+        rect = fitz.Rect(x1, y1, x2, y2) * fitz.Matrix(scale, scale) & page.rect
+        if rect.is_empty:
+            return False
+        # Only the region is rendered at ``zoom``, the page itself never is
+        records = ocr_region(page, rect, zoom, language)
+        along = 0 if box[2] - box[0] >= box[3] - box[1] else 1
+        records.sort(key=lambda item: item["position"][0][along])
+        return _same_text(" ".join(item["text"] for item in records), record["text"])
+
+    def _verify(self, page, gray, entry, zoom, language):
+        """
+        Check a candidate against the page; return its results mapped onto the page, or None.
+        """
+        reference = cv2.imread(self._path(entry["id"], "png"), cv2.IMREAD_GRAYSCALE)
+        if reference is None:
+            return None
+        with open(self._path(entry["id"], "json"), "r", encoding="utf-8") as results_file:
+            results = json.load(results_file)
+        records = results["ocr"]
+
+        x_scale = gray.shape[1] / reference.shape[1]
+        y_scale = gray.shape[0] / reference.shape[0]
+        if gray.shape != reference.shape:
+            gray = cv2.resize(gray, reference.shape[::-1], interpolation=cv2.INTER_AREA)
+        comparison = compare_pages(reference, gray, _boxes(records, REFERENCE_ZOOM / zoom))
+        if comparison is None:
+            return None
+        warp, difference, changed = comparison
+        logger.debug("Candidate %s of %s: difference %d, %d of %d boxes changed",
+                     entry["page"], entry["source"], difference, len(changed), len(records))
+        if difference > self.max_tile_difference or len(changed) > self.max_reread * len(records):
+            return None
+
+        # Pixels of these boxes changed: a rescan, or different text. OCR decides.
+        for index in changed:
+            if not self._reads_the_same(page, records[index], warp, x_scale, y_scale, zoom, language):
+                logger.debug("Candidate %s of %s rejected: %r reads differently",
+                             entry["page"], entry["source"], records[index]["text"])
+                return None
+
+        scale = REFERENCE_ZOOM / zoom
+        mapped = [
+            {**record, "position": (_transform(np.asarray(record["position"]) * scale, warp, x_scale, y_scale)
+                                    / scale).tolist()}
+            for record in records
+        ]
+        return mapped, results["tables"], len(changed)
+
+    def find(self, page, config, zoom=2, language="en", image=None):
+        """
+        Look up an earlier page that ``page`` is a duplicate of.
+
+        A candidate whose text layer differs from the page's is rejected outright.
+        Otherwise the two renders are aligned and compared, and every text box
+        whose pixels changed at all is OCRed again on the new page; a single box
+        that reads differently rejects the candidate.
+
+        Args:
+            page (fitz.Page): The page.
+            config (str): dedup_config of the current settings.
+            zoom (float): Zoom the stored results were produced at.
+            language (str): OCR language, for the boxes read again.
+            image: The page already rendered at REFERENCE_ZOOM, when the caller has it.
+
+        Returns:
+            dict: {"source", "page", "distance", "ocr", "tables"} of the earlier page,
+            with OCR positions mapped onto this page, or None.
+        """
+        with stage("dedup") as record:
+            gray = _gray(image if image is not None else render_page(page, REFERENCE_ZOOM))
+            hash_value = page_hash(gray)
+            self.refresh()
+
+            match = None
+            candidates = self.candidates(hash_value, config)[:self.max_candidates]
+            digest = text_digest(page) if candidates else None
+            aspect = gray.shape[0] / gray.shape[1]
+            for distance, entry in candidates:
+                height, width = entry["shape"]
+                if abs(height / width - aspect) > 0.02 * aspect:
+                    continue
+                if digest is not None and entry.get("text") is not None and digest != entry["text"]:
+                    continue
+                verified = self._verify(page, gray, entry, zoom, language)
+                if verified is not None:
+                    match = (distance, entry) + verified
+                    break
+
+            record["items"] = 1 if match else 0
+            record["reread"] = match[4] if match else 0
+
+        with self._lock:
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if match is None:
+            return None
+
+        distance, entry, ocr_records, tables, _ = match
+        return {
+            "source": entry["source"],
+            "page": entry["page"],
+            "distance": distance,
+            "ocr": ocr_records,
+            "tables": tables,
+        }
+
+    def add(self, page, config, source, page_name, ocr_records, tables=None, zoom=2, image=None):
+        """
+        Add a processed page to the index and return its entry.
+
+        Args:
+            page (fitz.Page): The page.
+            source (str): Path of the document the page belongs to.
+            page_name (str): Name of the page in its results, e.g. "page_3".
+            ocr_records (list): OCR records of the page, in the pixels of the page at ``zoom``.
+            image: The page already rendered at REFERENCE_ZOOM, when the caller has it.
+        """
+        gray = _gray(image if image is not None else render_page(page, REFERENCE_ZOOM))
+        entry_id = uuid.uuid4().hex
+        with open(self._path(entry_id, "json"), "w", encoding="utf-8") as results_file:
+            json.dump({"ocr": ocr_records, "tables": tables}, results_file, ensure_ascii=False)
+        cv2.imwrite(self._path(entry_id, "png"), gray)
+
+        entry = {
+            "id": entry_id, "hash": f"{page_hash(gray):016x}", "config": config,
+            "source": source, "page": page_name, "shape": list(gray.shape), "text": text_digest(page),
+        }
+        # One write per line, so concurrent appends from several processes don't interleave
+        with open(self._index_path, "a", encoding="utf-8") as index_file:
+            index_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+            }
+
+
+# Indexes opened in this process, by directory
+_indexes = {}
+
+
+def open_index(index_dir, max_distance=10):
+    """
+    Return this process's PageIndex for ``index_dir``, opening it on first use.
+    """
+    index = _indexes.get(index_dir)
+    if index is None or index.max_distance != max_distance:
+        index = _indexes[index_dir] = PageIndex(index_dir, max_distance)
+    return index
+
+
+def duplicate_documents(page_results):
+    """
+    Return the documents that every page of ``page_results`` is a duplicate of
+    (usually one, when the whole document was submitted before).
+    """
+    sources = None
+    for page_result in page_results:
+        duplicate = page_result.get("duplicate_of")
+        if not duplicate:
+            return set()
+        sources = {duplicate["source"]} if sources is None else sources & {duplicate["source"]}
+    return sources or set()
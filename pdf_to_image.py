@@ -1,35 +1,133 @@
-import fitz  
+import fitz
+import logging
 import os
 
-def pdf_to_images(pdf_path, output_dir="data", zoom=2):
+import numpy as np
+from PIL import Image
+
+from instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+
+class PixmapArray(np.ndarray):
+    """
+    NumPy view over the samples of a fitz.Pixmap.
+
+    The array shares memory with the pixmap, so it keeps a reference to it
+    to make sure the pixel buffer outlives the array.
+    """
+    pixmap = None
+
+
+def pixmap_to_array(pix):
+    """
+    Wrap the pixel samples of a pixmap in a (height, width, channels) array without copying.
+    """
+    array = np.ndarray(
+        (pix.height, pix.width, pix.n),
+        dtype=np.uint8,
+        buffer=pix.samples_mv,
+        strides=(pix.stride, pix.n, 1),
+    ).view(PixmapArray)
+    array.pixmap = pix
+    return array
+
+
+def pixmap_to_pil(pix):
+    """
+    Convert an RGB pixmap into a PIL image.
+    """
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+def render_pixmap(page, zoom=2):
+    """
+    Render a PDF page to an RGB pixmap at the given zoom factor.
+    """
+    # Set the zoom factor for higher resolution
+    mat = fitz.Matrix(zoom, zoom)
+
+    with stage("render", page=f"page_{page.number + 1}"):
+        return page.get_pixmap(matrix=mat, alpha=False)
+
+
+def render_page(page, zoom=2, output="pil"):
+    """
+    Render a PDF page straight into memory as a PIL image ("pil") or a zero-copy RGB array ("numpy").
+    """
+    if output not in ("pil", "numpy"):
+        raise ValueError(f"Unsupported output format: {output}")
+
+    pix = render_pixmap(page, zoom)
+    return pixmap_to_array(pix) if output == "numpy" else pixmap_to_pil(pix)
+
+
+def iter_pixmaps(pdf_document, zoom=2, first_page=1, last_page=None):
+    """
+    Lazily render the pages of an open PDF document.
+
+    Page numbers are 1-based and ``last_page`` is inclusive.
+
+    Yields:
+        tuple: (page_number, fitz.Pixmap) for each rendered page.
+    """
+    last_page = pdf_document.page_count if last_page is None else min(last_page, pdf_document.page_count)
+
+    for page_num in range(first_page - 1, last_page):
+        # Render the page to a pixmap
+        yield page_num + 1, render_pixmap(pdf_document[page_num], zoom)
+
+
+def iter_page_images(pdf_path, zoom=2, first_page=1, last_page=None, output="pil"):
+    """
+    Lazily render PDF pages straight into memory, without writing image files.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        zoom (float): Zoom factor used for rendering.
+        first_page (int): First page to render (1-based).
+        last_page (int): Last page to render (inclusive), or None for the last page.
+        output (str): "pil" for PIL images or "numpy" for zero-copy RGB arrays.
+
+    Yields:
+        tuple: (page_number, image) for each rendered page.
+    """
+    if output not in ("pil", "numpy"):
+        raise ValueError(f"Unsupported output format: {output}")
+
+    pdf_document = fitz.open(pdf_path)
+    try:
+        for page_number, pix in iter_pixmaps(pdf_document, zoom, first_page, last_page):
+            if output == "numpy":
+                yield page_number, pixmap_to_array(pix)
+            else:
+                yield page_number, pixmap_to_pil(pix)
+    finally:
+        pdf_document.close()
+
+
+def pdf_to_images(pdf_path, output_dir="data", zoom=2, first_page=1, last_page=None):
 
     # Ensure the output directory exists
     os.makedirs(output_dir, exist_ok=True)
-    
+
     # Open the PDF file
     pdf_document = fitz.open(pdf_path)
     image_paths = []
 
     # Iterate through each page
-    for page_num in range(pdf_document.page_count):
-        page = pdf_document[page_num]
-        
-        # Set the zoom factor for higher resolution
-        mat = fitz.Matrix(zoom, zoom)
-        
-        # Render the page to a pixmap
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        
+    for page_number, pix in iter_pixmaps(pdf_document, zoom, first_page, last_page):
         # Save the page as a PNG image
-        image_path = os.path.join(output_dir, f"page_{page_num + 1}.png")
+        image_path = os.path.join(output_dir, f"page_{page_number}.png")
         pix.save(image_path)
         image_paths.append(image_path)
-        print(f"Saved {image_path}")
+        logger.info("Saved %s", image_path)
 
     pdf_document.close()
     return image_paths
 
 if __name__ == "__main__":
-    pdf_path = "data/bank_statement.pdf"  
+    pdf_path = "data/bank_statement.pdf"
     images = pdf_to_images(pdf_path)
     print("Generated images:", images)
@@ -0,0 +1,419 @@
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+import model_registry
+import ocr_cache
+from instrumentation import current_page, profiler, stage
+from pdf_to_image import render_page
+from text_layer import extract_page_records
+from table_prefilter import TablePrefilter
+from page_dedup import REFERENCE_ZOOM, dedup_config, open_index
+from preprocess import estimate_skew, extract_tables_adaptive, ocr_page_adaptive, ocr_preprocessed
+from result_store import save_ocr_store, save_table_store
+from ocr import ocr_image, get_page_text, save_ocr_results
+from classify_document import classify_page_text, save_classification_results
+from key_value_extractor import extract_key_values_from_page, save_key_value_results
+from checksum_validator import (
+    extract_transaction_rows,
+    find_opening_balance,
+    validate_transactions,
+    save_checksum_results,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def process_page(page_name, image, language="en", extract_tables=True, page_data=None, tables=None,
+                 table_prefilter=None, table_extractor=None):
+    """
+    Run OCR, classification, key-value extraction, table extraction and
+    transaction extraction on one page image.
+
+    When ``page_data`` (OCR-style records, e.g. from the PDF text layer) is
+    given, OCR is skipped, and when ``tables`` is given, table extraction is.
+    With a ``table_prefilter`` (see table_prefilter.TablePrefilter), table
+    detection only runs on pages the prefilter doesn't rule out.
+    ``table_extractor(image, page_name)`` replaces extract_tables_from_image,
+    e.g. to cut the tables out of a re-render in adaptive mode.
+
+    Returns:
+        dict: The page results, in the same shapes as the per-stage JSON files.
+        "checksum_errors" is filled in by validate_in_order.
+    """
+    if page_data is None:
+        page_data = ocr_image(image, language)
+    page_text = get_page_text(page_data)
+
+    document_type = classify_page_text(page_text)
+    # Values are read next to their labels on the page, not just from the joined text
+    key_values = extract_key_values_from_page(page_text, document_type, page_records=page_data)
+
+    if not extract_tables:
+        tables = None
+    elif table_prefilter is not None and tables is None \
+            and not table_prefilter.should_detect(image, page_data, document_type):
+        tables = ""
+    elif tables is None and table_extractor is not None:
+        tables = table_extractor(image, page_name)
+    elif tables is None:
+        # Imported here so pipelines without tables never load the transformer stack
+        from table_extractor import extract_tables_from_image
+
+        tables = extract_tables_from_image(image, page_name)
+
+    # Balances are validated in page order later, so a page can continue from the previous one
+    transactions = None
+    opening_balance = None
+    if document_type == "bank_statement":
+        with stage("transactions") as record:
+            transactions = extract_transaction_rows(page_text)
+            opening_balance = find_opening_balance(page_text)
+            record["items"] = len(transactions)
+
+    return {
+        "page": page_name,
+        "ocr": page_data,
+        "classification": document_type,
+        "key_values": key_values,
+        "tables": tables,
+        "transactions": transactions,
+        "opening_balance": opening_balance,
+        "checksum_errors": None,
+    }
+
+
+def validate_page_result(page_result, carried_balance=None):
+    """
+    Fill in the checksum errors of one page result and return the balance to carry to the next page.
+    """
+    if page_result["classification"] != "bank_statement":
+        return carried_balance
+
+    with current_page(page_result["page"]):
+        errors, carried_balance = validate_transactions(
+            page_result["transactions"], page_result["opening_balance"], carried_balance
+        )
+    if errors is None:
+        logger.warning("Opening balance not found on page %s", page_result["page"])
+    page_result["checksum_errors"] = errors
+    return carried_balance
+
+
+def validate_in_order(page_results):
+    """
+    Validate the running balance of bank statement pages in page order.
+
+    The closing balance of each statement page is carried over as the opening
+    balance of the next one when that page doesn't state its own.
+    """
+    carried_balance = None
+    for page_result in page_results:
+        carried_balance = validate_page_result(page_result, carried_balance)
+        yield page_result
+
+
+STORAGE_FORMATS = ("json", "binary", "both")
+
+
+def collect_results(page_results, output_dir=None, extract_tables=True, storage_format="json"):
+    """
+    Pass page results through unchanged, saving the per-stage result files at the end.
+
+    With ``storage_format`` "binary" the OCR and table results are written as
+    memory-mappable columnar stores (see result_store) instead of JSON, and
+    with "both" in both forms. When ``output_dir`` is None nothing is kept or written.
+    """
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unsupported storage format: {storage_format}")
+
+    ocr_results = {}
+    classification_results = {}
+    key_value_results = {}
+    table_results = {}
+    errors_summary = {}
+
+    for page_result in page_results:
+        if output_dir:
+            page_name = page_result["page"]
+            ocr_results[page_name] = page_result["ocr"]
+            classification_results[page_name] = page_result["classification"]
+            key_value_results[page_name] = page_result["key_values"]
+            if extract_tables:
+                table_results[page_name] = page_result["tables"]
+            if page_result["checksum_errors"]:
+                errors_summary[page_name] = page_result["checksum_errors"]
+
+        yield page_result
+
+    if output_dir:
+        if storage_format != "binary":
+            save_ocr_results(ocr_results, output_dir)
+        if storage_format != "json":
+            save_ocr_store(ocr_results, output_dir)
+        save_classification_results(classification_results, output_dir)
+        save_key_value_results(key_value_results, output_dir)
+        if extract_tables:
+            if storage_format != "binary":
+                from table_extractor import save_table_results
+
+                save_table_results(table_results, output_dir)
+            if storage_format != "json":
+                save_table_store(table_results, output_dir)
+        save_checksum_results(errors_summary, output_dir)
+
+
+def make_options(output_dir=None, zoom=2, language="en", extract_tables=True,
+                 save_images=False, text_mode="ocr", render_mode="full", layout_zoom=1.0,
+                 deskew=False, binarize=False, table_prefilter=None, dedup_dir=None, dedup_distance=10):
+    """
+    Bundle the per-page processing options passed to the page loops and worker processes.
+    """
+    if text_mode not in ("ocr", "hybrid"):
+        raise ValueError(f"Unsupported text mode: {text_mode}")
+    if render_mode not in ("full", "adaptive"):
+        raise ValueError(f"Unsupported render mode: {render_mode}")
+
+    return {
+        "output_dir": output_dir,
+        "zoom": zoom,
+        "language": language,
+        "extract_tables": extract_tables,
+        "save_images": save_images,
+        "text_mode": text_mode,
+        "render_mode": render_mode,
+        "layout_zoom": layout_zoom,
+        "deskew": deskew,
+        "binarize": binarize,
+        "table_prefilter": table_prefilter,
+        "dedup_dir": dedup_dir,
+        "dedup_distance": dedup_distance,
+    }
+
+
+def _iter_pages(pdf_path, first_page, last_page, options):
+    """
+    Process the pages one after the other in the current process.
+    """
+    output_dir = options["output_dir"]
+    zoom = options["zoom"]
+    language = options["language"]
+    extract_tables = options["extract_tables"]
+    prefilter = None
+    if extract_tables and options["table_prefilter"] is not None:
+        prefilter = TablePrefilter(options["table_prefilter"])
+
+    dedup = None
+    if options["dedup_dir"]:
+        dedup = open_index(options["dedup_dir"], options["dedup_distance"])
+        dedup_key = dedup_config(zoom, language, options["text_mode"], options["render_mode"],
+                                 options["deskew"], options["binarize"])
+
+    with fitz.open(pdf_path) as pdf_document:
+        last_page = pdf_document.page_count if last_page is None else min(last_page, pdf_document.page_count)
+
+        for page_num in range(first_page - 1, last_page):
+            page = pdf_document[page_num]
+            page_name = f"page_{page_num + 1}"
+
+            with current_page(page_name):
+                page_data = None
+                tables = None
+                reference = None
+                duplicate = None
+                if dedup is not None:
+                    # Duplicates are matched on a small fixed-zoom render, never the page at ``zoom``
+                    reference = render_page(page, REFERENCE_ZOOM)
+                    duplicate = dedup.find(page, dedup_key, zoom, language, reference)
+                if duplicate is not None:
+                    page_data = duplicate["ocr"]
+                    tables = duplicate["tables"] if extract_tables else None
+                elif options["text_mode"] == "hybrid":
+                    # Born-digital pages are read from the text layer instead of OCR
+                    page_data = extract_page_records(page, zoom, language)
+
+                save_image = bool(output_dir and options["save_images"])
+                needs_tables = extract_tables and tables is None
+                image = None
+                table_extractor = None
+                if options["render_mode"] == "adaptive":
+                    # A cheap layout pass; only inked regions and tables are rendered at full zoom
+                    if page_data is None or needs_tables:
+                        if reference is not None and options["layout_zoom"] == REFERENCE_ZOOM:
+                            image = reference
+                        else:
+                            image = render_page(page, options["layout_zoom"])
+                    if page_data is None:
+                        page_data = ocr_page_adaptive(
+                            page, image, options["layout_zoom"], zoom, language,
+                            options["deskew"], options["binarize"],
+                        )
+                    if needs_tables:
+                        # Left to process_page, so the prefilter sees the page's classification
+                        table_extractor = functools.partial(extract_tables_adaptive, page,
+                                                            layout_zoom=options["layout_zoom"], zoom=zoom)
+                else:
+                    # Only render when something still needs the pixels
+                    if page_data is None or needs_tables or save_image:
+                        image = render_page(page, zoom)
+                    if page_data is None and (options["deskew"] or options["binarize"]):
+                        skew_angle = estimate_skew(image) if options["deskew"] else 0.0
+                        page_data = ocr_preprocessed(image, language, skew_angle, options["binarize"])
+
+                if save_image:
+                    # Saved at ``zoom`` so the image lines up with the OCR positions
+                    if options["render_mode"] == "adaptive":
+                        saved_image = render_page(page, zoom)
+                    else:
+                        saved_image = image
+                    os.makedirs(output_dir, exist_ok=True)
+                    saved_image.save(os.path.join(output_dir, f"{page_name}.png"))
+
+                page_result = process_page(page_name, image, language, extract_tables, page_data, tables, prefilter,
+                                           table_extractor)
+
+                if dedup is not None:
+                    if duplicate is not None:
+                        page_result["duplicate_of"] = {
+                            key: duplicate[key] for key in ("source", "page", "distance")
+                        }
+                    else:
+                        dedup.add(page, dedup_key, os.path.abspath(pdf_path), page_name,
+                                  page_result["ocr"], page_result["tables"], zoom, reference)
+                        page_result["duplicate_of"] = None
+
+            yield page_result
+
+
+def init_worker(options, cpu_threads, cache_dir, quantize_tables):
+    """
+    Load the models once when a worker process starts.
+    """
+    model_registry.set_table_quantization(quantize_tables)
+    if cache_dir:
+        ocr_cache.enable(cache_dir)
+    model_registry.set_cpu_threads(cpu_threads)
+    model_registry.warm_up(options["language"], tables=options["extract_tables"])
+
+
+def process_page_task(pdf_path, page_number, options):
+    """
+    Render and process a single page inside a worker process.
+
+    Returns the page result together with the profiling records of the page.
+    """
+    page_results = _iter_pages(pdf_path, page_number, page_number, options)
+    try:
+        page_result = next(page_results)
+    finally:
+        # Closes the PDF the suspended generator still holds open
+        page_results.close()
+    return page_result, profiler.take_records()
+
+
+def _iter_pages_parallel(pdf_path, first_page, last_page, options, workers, cache_dir,
+                         quantize_tables):
+    """
+    Process whole pages in a pool of worker processes, yielding results in page order.
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        page_count = pdf_document.page_count
+    last_page = page_count if last_page is None else min(last_page, page_count)
+    page_numbers = range(first_page, last_page + 1)
+
+    # Share the cores between the workers so the models don't oversubscribe the CPU
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(options, cpu_threads, cache_dir, quantize_tables),
+    ) as executor:
+        futures = [
+            executor.submit(process_page_task, pdf_path, page_number, options)
+            for page_number in page_numbers
+        ]
+        for future in futures:
+            page_result, records = future.result()
+            profiler.merge(records)
+            yield page_result
+
+
+def process_document(pdf_path, output_dir=None, zoom=2, language="en",
+                     extract_tables=True, save_images=False, first_page=1, last_page=None,
+                     workers=1, ocr_cache_dir=None, quantize_tables=False, text_mode="ocr",
+                     storage_format="json", render_mode="full", layout_zoom=1.0, deskew=False,
+                     binarize=False, table_prefilter=None, dedup_dir=None, dedup_distance=10):
+    """
+    Process a PDF page by page, yielding each page's results as soon as it is done.
+
+    Every page flows through render -> OCR -> classify -> extract -> validate in
+    memory, so only one page image is held at a time. When ``output_dir`` is
+    given, the usual result files (ocr_results.json, classification_result.json,
+    ...) are written there once the generator has been consumed; with
+    ``save_images`` the rendered pages are also saved as page_N.png.
+
+    Table detection therefore runs one page at a time here. Batching pages
+    through the detection model is left to extract_tables_from_images and
+    extract_tables_from_batch in table_extractor, which get all pages at once.
+
+    With ``workers`` > 1 the pages are spread over a pool of processes, each
+    holding its own warmed-up models; results are still yielded in page order.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        output_dir (str): Directory for the result files, or None to skip writing.
+        zoom (float): Render zoom factor.
+        language (str): OCR language.
+        extract_tables (bool): Whether to run table extraction.
+        save_images (bool): Whether to save the rendered page images.
+        first_page (int): First page to process (1-based).
+        last_page (int): Last page to process (inclusive), or None for the last page.
+        workers (int): Number of worker processes, or None for one per CPU core.
+        ocr_cache_dir (str): Directory of the OCR result cache, or None to disable caching.
+        quantize_tables (bool): Whether to use int8-quantized table-transformer models.
+        text_mode (str): "ocr" to OCR every page, or "hybrid" to read born-digital
+            pages from the PDF text layer and OCR only scanned pages and images.
+        storage_format (str): "json", "binary" (columnar OCR and table stores) or "both".
+        render_mode (str): "full" to render every page at ``zoom``, or "adaptive" to
+            render a layout pass at ``layout_zoom`` and re-render only the text
+            blocks and tables, at a zoom matched to the text size.
+        layout_zoom (float): Zoom of the adaptive layout pass.
+        deskew (bool): Whether to straighten skewed scans before OCR.
+        binarize (bool): Whether to binarize page images before OCR.
+        table_prefilter (float): Evidence threshold (0-1) of the cheap table-presence
+            checks run before table detection, or None to detect tables on every page.
+        dedup_dir (str): Directory of a near-duplicate page index (see page_dedup). Pages
+            matching a page processed before reuse its OCR and table results and carry
+            "duplicate_of"; other pages are added to the index.
+        dedup_distance (int): Largest perceptual-hash Hamming distance of a duplicate candidate.
+
+    Yields:
+        dict: The results of each page, in page order.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if ocr_cache_dir:
+        ocr_cache.enable(ocr_cache_dir)
+    model_registry.set_table_quantization(quantize_tables)
+
+    options = make_options(output_dir, zoom, language, extract_tables, save_images, text_mode,
+                           render_mode, layout_zoom, deskew, binarize, table_prefilter,
+                           dedup_dir, dedup_distance)
+    if workers > 1:
+        page_results = _iter_pages_parallel(pdf_path, first_page, last_page, options, workers,
+                                            ocr_cache_dir, quantize_tables)
+    else:
+        page_results = _iter_pages(pdf_path, first_page, last_page, options)
+
+    page_results = validate_in_order(page_results)
+    yield from collect_results(page_results, output_dir, extract_tables, storage_format)
+
+
+if __name__ == "__main__":
+    for page_result in process_document("data/bank_statement.pdf", output_dir="data"):
+        print(f"Processed {page_result['page']} as {page_result['classification']}")
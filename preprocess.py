@@ -0,0 +1,281 @@
+"""
+Adaptive rendering and image preprocessing for OCR.
+
+Instead of rendering the whole page at a fixed zoom, the adaptive mode renders
+a cheap low-resolution layout pass, finds the blocks of ink on it and the
+tables, and re-renders only those regions at a zoom chosen from the size of
+the text. Most of a page is whitespace, and OCR and transformer cost grow with
+the number of pixels.
+"""
+import logging
+
+import cv2
+import fitz
+import numpy as np
+
+from instrumentation import stage
+from ocr import ocr_image
+from pdf_to_image import pixmap_to_pil
+
+logger = logging.getLogger(__name__)
+
+# Text line height (pixels) that OCR is tuned for; about 10pt text at zoom 2
+TARGET_LINE_HEIGHT = 24
+
+
+def to_gray(image):
+    """
+    Convert a PIL image or an RGB array to a grayscale array.
+    """
+    array = np.asarray(image)
+    if array.ndim == 2:
+        return array
+    return cv2.cvtColor(np.ascontiguousarray(array[:, :, :3]), cv2.COLOR_RGB2GRAY)
+
+
+def ink_mask(gray):
+    """
+    Return a binary mask (255 = ink) of the dark pixels of a grayscale image.
+    """
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return mask
+
+
+def estimate_skew(image, max_angle=10.0):
+    """
+    Estimate the skew of the text on an image, in degrees (positive = counter-clockwise).
+
+    The text lines are smeared into blobs and the angle is the median angle of
+    the elongated blobs. ``rotate(image, -angle)`` straightens the image.
+    Returns 0.0 when no reliable estimate can be made.
+    """
+    mask = ink_mask(to_gray(image))
+    if not mask.any():
+        return 0.0
+
+    # Join the characters of each line into one long blob
+    height, width = mask.shape
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, width // 50), 1))
+    lines = cv2.dilate(mask, kernel)
+
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    angles = []
+    for contour in contours:
+        corners = cv2.boxPoints(cv2.minAreaRect(contour))
+        edges = [corners[1] - corners[0], corners[2] - corners[1]]
+        long_edge, short_edge = sorted(edges, key=lambda edge: -np.hypot(*edge))
+        length, thickness = np.hypot(*long_edge), np.hypot(*short_edge)
+        # Only long, thin blobs are text lines
+        if length < width / 10 or length < 4 * thickness:
+            continue
+        # Image y points down, so a line rising to the right has a negative dy
+        angle = np.degrees(np.arctan2(-long_edge[1], long_edge[0]))
+        if angle > 90:
+            angle -= 180
+        elif angle <= -90:
+            angle += 180
+        angles.append(angle)
+
+    if not angles:
+        return 0.0
+    angle = float(np.median(angles))
+    return angle if abs(angle) <= max_angle else 0.0
+
+
+def rotate(image, angle):
+    """
+    Rotate an image about its centre on a white background.
+
+    Returns:
+        tuple: (rotated RGB array, 2x3 affine matrix mapping rotated pixels back to the original image).
+    """
+    array = np.ascontiguousarray(np.asarray(image))
+    height, width = array.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    rotated = cv2.warpAffine(
+        array, matrix, (width, height), flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255),
+    )
+    return rotated, cv2.invertAffineTransform(matrix)
+
+
+def binarize(image, block_size=31, offset=15):
+    """
+    Turn an image into black text on white with an adaptive threshold, as an RGB array.
+
+    Helps on scans with uneven lighting, stains or coloured backgrounds.
+    """
+    gray = to_gray(image)
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block_size, offset
+    )
+    return cv2.cvtColor(binary, cv2.COLOR_GRAY2RGB)
+
+
+def ocr_preprocessed(image, language="en", skew_angle=0.0, binarize_image=False):
+    """
+    OCR an image after optional deskewing and binarization.
+
+    ``skew_angle`` is the skew to undo, as returned by estimate_skew.
+    Positions are mapped back to the pixels of the original image.
+    """
+    inverse = None
+    with stage("preprocess"):
+        if skew_angle:
+            image, inverse = rotate(image, -skew_angle)
+        if binarize_image:
+            image = binarize(image)
+
+    records = ocr_image(image, language)
+    if inverse is not None:
+        for record in records:
+            points = np.asarray(record["position"], dtype=np.float64)
+            mapped = points @ inverse[:, :2].T + inverse[:, 2]
+            record["position"] = mapped.tolist()
+    return records
+
+
+def find_text_regions(image, margin=4, min_size=3):
+    """
+    Find the blocks of ink on a (low-resolution) page image.
+
+    Returns:
+        tuple: (list of [x1, y1, x2, y2] blocks in image pixels, median text line
+        height in pixels or None when the page is blank).
+    """
+    mask = ink_mask(to_gray(image))
+    height, width = mask.shape
+
+    # Words -> lines, to measure the text size
+    line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, width // 60), 1))
+    lines = cv2.dilate(mask, line_kernel)
+    count, _, line_stats, _ = cv2.connectedComponentsWithStats(lines)
+    line_heights = [
+        h for _, _, w, h, _ in line_stats[1:]
+        if h >= min_size and w >= 2 * h
+    ]
+    if count <= 1 or not line_heights:
+        return [], None
+
+    # Lines -> blocks, so each OCR call covers a whole paragraph or column
+    line_height = float(np.median(line_heights))
+    block_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(3, width // 30), max(3, int(line_height)))
+    )
+    blocks = cv2.dilate(lines, block_kernel)
+    count, _, block_stats, _ = cv2.connectedComponentsWithStats(blocks)
+
+    regions = []
+    for x, y, w, h, _ in block_stats[1:]:
+        if w < min_size or h < min_size:
+            continue
+        regions.append([
+            int(max(0, x - margin)), int(max(0, y - margin)),
+            int(min(width, x + w + margin)), int(min(height, y + h + margin)),
+        ])
+    return regions, line_height
+
+
+def choose_ocr_zoom(line_height, layout_zoom, min_zoom=1.0, max_zoom=4.0):
+    """
+    Pick the render zoom that brings the text lines to the height OCR works best at.
+    """
+    if not line_height:
+        return min_zoom
+    zoom = layout_zoom * TARGET_LINE_HEIGHT / line_height
+    return float(min(max(zoom, min_zoom), max_zoom))
+
+
+def _image_rect_to_page(page, box, zoom):
+    """
+    Convert a box in the pixels of a page rendered at ``zoom`` to a rectangle on the displayed page.
+
+    Renders show the page with its rotation applied, so the rectangle is in the
+    same space as page.rect and the ``clip`` of get_pixmap.
+    """
+    return fitz.Rect(box) * fitz.Matrix(1 / zoom, 1 / zoom)
+
+
+def render_region(page, rect, zoom):
+    """
+    Render one region of the displayed page as a PIL image.
+
+    Returns:
+        tuple: (image, top-left corner of the region in the pixels of the full page at ``zoom``).
+    """
+    with stage("render", items=1):
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=rect, alpha=False)
+    origin = rect.top_left * zoom
+    return pixmap_to_pil(pix), origin
+
+
+def ocr_page_adaptive(page, layout_image, layout_zoom=1.0, zoom=2, language="en",
+                      deskew=False, binarize_image=False, max_region_fraction=0.6):
+    """
+    OCR only the inked regions of a page, each rendered at a zoom matched to its text size.
+
+    Args:
+        page (fitz.Page): The page.
+        layout_image: The page rendered at ``layout_zoom``.
+        zoom (float): Zoom whose pixel coordinates the returned positions use,
+            so records line up with full-page OCR at that zoom.
+        deskew (bool): Whether to straighten skewed scans before OCR.
+        binarize_image (bool): Whether to binarize the regions before OCR.
+        max_region_fraction (float): When the regions cover more of the page
+            than this, the page is OCRed in one piece instead.
+
+    Returns:
+        list: OCR records of the page, top to bottom.
+    """
+    with stage("layout") as record:
+        regions, line_height = find_text_regions(layout_image)
+        skew_angle = estimate_skew(layout_image) if deskew else 0.0
+        record["items"] = len(regions)
+    if not regions:
+        return []
+
+    ocr_zoom = choose_ocr_zoom(line_height, layout_zoom)
+    width, height = layout_image.size
+    covered = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+    if covered > max_region_fraction * width * height:
+        regions = [[0, 0, width, height]]
+    logger.debug("OCR of %d regions at zoom %.2f (skew %.2f)", len(regions), ocr_zoom, skew_angle)
+
+    # Positions are reported in the pixels of the page rendered at ``zoom``
+    scale = zoom / ocr_zoom
+    records = []
+    for box in regions:
+        rect = _image_rect_to_page(page, box, layout_zoom) & page.rect
+        if rect.is_empty:
+            continue
+        image, origin = render_region(page, rect, ocr_zoom)
+        for item in ocr_preprocessed(image, language, skew_angle, binarize_image):
+            item["position"] = [
+                [(x + origin.x) * scale, (y + origin.y) * scale] for x, y in item["position"]
+            ]
+            records.append(item)
+
+    records.sort(key=lambda item: (item["position"][0][1], item["position"][0][0]))
+    return records
+
+
+def extract_tables_adaptive(page, layout_image, page_name, layout_zoom=1.0, zoom=2, padding=10):
+    """
+    Detect tables on the low-resolution layout image and extract each one from a re-render at ``zoom``.
+
+    Returns:
+        str: JSON records of the extracted table, or "" when no table is detected.
+    """
+    from table_extractor import add_padding, detect_table_boxes, extract_tables_from_crops
+
+    boxes = detect_table_boxes([layout_image], [page_name])[0]
+
+    padded_tables = []
+    for box in boxes:
+        rect = _image_rect_to_page(page, box, layout_zoom)
+        # Same margin around the table as crop_table, measured in pixels at ``zoom``
+        rect = (rect + (-padding / zoom, -padding / zoom, padding / zoom, padding / zoom)) & page.rect
+        image, _ = render_region(page, rect, zoom)
+        padded_tables.append(add_padding(image, 20))
+
+    return extract_tables_from_crops(padded_tables, [0] * len(padded_tables), [page_name])[0]
@@ -0,0 +1,325 @@
+"""
+Compact columnar storage for OCR and table results.
+
+A store is a directory of NumPy arrays plus one small JSON index, so
+readers can memory-map it and touch only the pages they need instead of
+parsing a whole JSON file:
+
+    ocr_results/
+        index.json          page names and format version
+        page_offsets.npy    int64 (pages + 1)  first record of each page
+        boxes.npy           float32 (records, 4, 2)  quad of each record
+        confidences.npy     float32 (records,)
+        text_offsets.npy    int64 (records + 1)  byte range of each text
+        text.bin            UTF-8 texts, back to back
+
+    table_results/
+        index.json          page names and format version
+        tables.npy          int64 (tables, 4)  page index, rows, columns, first cell
+        confidences.npy     float32 (cells,)
+        text_offsets.npy    int64 (cells + 1)
+        text.bin            UTF-8 cell texts, back to back (empty for empty cells)
+"""
+import json
+import logging
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+OCR_STORE_NAME = "ocr_results"
+TABLE_STORE_NAME = "table_results"
+
+
+def _replace_file(path, data):
+    """
+    Write a file through a temporary file, so existing memory maps of it stay valid.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        if isinstance(data, np.ndarray):
+            np.save(file, data)
+        else:
+            file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_texts(store_dir, texts):
+    """
+    Write texts as one UTF-8 blob plus an offsets array.
+    """
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+
+    _replace_file(os.path.join(store_dir, "text.bin"), b"".join(encoded))
+    _replace_file(os.path.join(store_dir, "text_offsets.npy"), offsets)
+
+
+def _write_index(store_dir, pages, kind):
+    index = {"format": kind, "version": FORMAT_VERSION, "pages": pages}
+    _replace_file(os.path.join(store_dir, "index.json"), json.dumps(index, indent=4).encode("utf-8"))
+
+
+def _read_index(store_dir, kind):
+    with open(os.path.join(store_dir, "index.json"), "r", encoding="utf-8") as index_file:
+        index = json.load(index_file)
+    if index.get("format") != kind or index.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{store_dir} is not a version {FORMAT_VERSION} {kind} store")
+    return index
+
+
+class _TextColumn:
+    """
+    Memory-mapped texts stored by _write_texts.
+    """
+
+    def __init__(self, store_dir):
+        self.offsets = np.load(os.path.join(store_dir, "text_offsets.npy"), mmap_mode="r")
+        text_path = os.path.join(store_dir, "text.bin")
+        # np.memmap can't map empty files
+        if os.path.getsize(text_path):
+            self.blob = np.memmap(text_path, dtype=np.uint8, mode="r")
+        else:
+            self.blob = np.zeros(0, dtype=np.uint8)
+
+    def get(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes().decode("utf-8")
+
+    def get_range(self, start, stop):
+        """
+        Decode the texts ``start`` to ``stop`` with a single read of the blob.
+        """
+        data = self.blob[self.offsets[start]:self.offsets[stop]].tobytes()
+        base = self.offsets[start]
+        return [
+            data[self.offsets[i] - base:self.offsets[i + 1] - base].decode("utf-8")
+            for i in range(start, stop)
+        ]
+
+
+def save_ocr_store(ocr_results, output_dir="data"):
+    """
+    Save page-wise OCR results as a columnar store in output_dir/ocr_results and return its path.
+    """
+    store_dir = os.path.join(output_dir, OCR_STORE_NAME)
+    os.makedirs(store_dir, exist_ok=True)
+
+    pages = list(ocr_results)
+    records = [record for page in pages for record in ocr_results[page]]
+
+    page_offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+    np.cumsum([len(ocr_results[page]) for page in pages], out=page_offsets[1:])
+    boxes = np.asarray([record["position"] for record in records], dtype=np.float32).reshape(-1, 4, 2)
+    confidences = np.asarray([record["confidence"] for record in records], dtype=np.float32)
+
+    _replace_file(os.path.join(store_dir, "page_offsets.npy"), page_offsets)
+    _replace_file(os.path.join(store_dir, "boxes.npy"), boxes)
+    _replace_file(os.path.join(store_dir, "confidences.npy"), confidences)
+    _write_texts(store_dir, [record["text"] for record in records])
+    _write_index(store_dir, pages, "ocr")
+
+    logger.info("OCR store saved to %s", store_dir)
+    return store_dir
+
+
+class OCRStore(Mapping):
+    """
+    Read-only, memory-mapped view of an OCR store.
+
+    Behaves like the dict loaded from ocr_results.json (page name -> list of
+    records), but records are only decoded for the pages that are accessed.
+    Boxes and confidences are also available as NumPy arrays per page.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.pages = _read_index(store_dir, "ocr")["pages"]
+        self._page_index = {page: index for index, page in enumerate(self.pages)}
+        self.page_offsets = np.load(os.path.join(store_dir, "page_offsets.npy"), mmap_mode="r")
+        self.all_boxes = np.load(os.path.join(store_dir, "boxes.npy"), mmap_mode="r")
+        self.all_confidences = np.load(os.path.join(store_dir, "confidences.npy"), mmap_mode="r")
+        self.texts = _TextColumn(store_dir)
+
+    def _range(self, page):
+        index = self._page_index[page]
+        return int(self.page_offsets[index]), int(self.page_offsets[index + 1])
+
+    def boxes(self, page):
+        """
+        Return the quads of a page's records as a (records, 4, 2) array.
+        """
+        start, stop = self._range(page)
+        return self.all_boxes[start:stop]
+
+    def confidences(self, page):
+        start, stop = self._range(page)
+        return self.all_confidences[start:stop]
+
+    def page_texts(self, page):
+        """
+        Return the texts of a page's records without building the record dicts.
+        """
+        start, stop = self._range(page)
+        return self.texts.get_range(start, stop)
+
+    def __getitem__(self, page):
+        boxes = self.boxes(page).tolist()
+        confidences = self.confidences(page).tolist()
+        return [
+            {"text": text, "confidence": confidence, "position": box}
+            for text, confidence, box in zip(self.page_texts(page), confidences, boxes)
+        ]
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __len__(self):
+        return len(self.pages)
+
+
+def _parse_table_json(table_json):
+    """
+    Split the JSON records written by build_table_json into cell texts and confidences.
+
+    Returns:
+        tuple: (rows, columns, texts, confidences) with the cells in row-major order.
+    """
+    records = json.loads(table_json)
+    if not records:
+        return 0, 0, [], []
+
+    data_keys = [key for key in records[0] if key.startswith("('Data'")]
+    confidence_keys = [key for key in records[0] if key.startswith("('Confidence'")]
+    texts = [record[key] for record in records for key in data_keys]
+    confidences = [record[key] for record in records for key in confidence_keys]
+    return len(records), len(data_keys), texts, confidences
+
+
+def _format_table_json(rows, columns, texts, confidences):
+    """
+    Rebuild the JSON records of build_table_json from the cells of a table.
+    """
+    records = []
+    for row in range(rows):
+        record = {}
+        cells = range(row * columns, (row + 1) * columns)
+        for column, cell in enumerate(cells):
+            record[f"('Data', {column})"] = texts[cell]
+        for column, cell in enumerate(cells):
+            record[f"('Confidence', {column})"] = confidences[cell]
+        records.append(record)
+    return json.dumps(records, ensure_ascii=False)
+
+
+def save_table_store(all_tables, output_dir="data"):
+    """
+    Save page-wise table results as a columnar store in output_dir/table_results and return its path.
+
+    Args:
+        all_tables (dict): Page name -> JSON records (or TableResult) of the page's table,
+            or "" when the page has none.
+    """
+    store_dir = os.path.join(output_dir, TABLE_STORE_NAME)
+    os.makedirs(store_dir, exist_ok=True)
+
+    pages = list(all_tables)
+    tables = []
+    texts = []
+    confidences = []
+    for page_index, page in enumerate(pages):
+        if not all_tables[page]:
+            continue
+        table = all_tables[page]
+        if isinstance(table, str):
+            rows, columns, cell_texts, cell_confidences = _parse_table_json(table)
+        else:
+            # A table_extractor.TableResult
+            rows, columns = table.shape
+            cell_texts = table.texts.ravel().tolist()
+            cell_confidences = table.confidences.ravel().tolist()
+        tables.append([page_index, rows, columns, len(texts)])
+        texts.extend(text or "" for text in cell_texts)
+        confidences.extend(cell_confidences)
+
+    _replace_file(os.path.join(store_dir, "tables.npy"), np.asarray(tables, dtype=np.int64).reshape(-1, 4))
+    _replace_file(os.path.join(store_dir, "confidences.npy"), np.asarray(confidences, dtype=np.float32))
+    _write_texts(store_dir, texts)
+    _write_index(store_dir, pages, "tables")
+
+    logger.info("Table store saved to %s", store_dir)
+    return store_dir
+
+
+class TableStore(Mapping):
+    """
+    Read-only, memory-mapped view of a table store.
+
+    Behaves like the dict loaded from table_extraction_result.json (page name ->
+    JSON records, or "" for pages without a table). ``grid`` returns a table as
+    arrays without going through JSON.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.pages = _read_index(store_dir, "tables")["pages"]
+        self.tables = np.load(os.path.join(store_dir, "tables.npy"), mmap_mode="r")
+        self.all_confidences = np.load(os.path.join(store_dir, "confidences.npy"), mmap_mode="r")
+        self.texts = _TextColumn(store_dir)
+
+        # The last table of a page wins, as in table_extraction_result.json
+        self._page_table = {self.pages[int(page_index)]: row for row, page_index in enumerate(self.tables[:, 0])}
+
+    def grid(self, page):
+        """
+        Return a page's table as (texts, confidences) arrays of shape (rows, columns), or None.
+        """
+        row = self._page_table.get(page)
+        if row is None:
+            return None
+
+        _, rows, columns, start = (int(value) for value in self.tables[row])
+        stop = start + rows * columns
+        texts = np.array([text or None for text in self.texts.get_range(start, stop)], dtype=object)
+        return texts.reshape(rows, columns), self.all_confidences[start:stop].reshape(rows, columns)
+
+    def __getitem__(self, page):
+        if page not in self.pages:
+            raise KeyError(page)
+        table = self.grid(page)
+        if table is None:
+            return ""
+        texts, confidences = table
+        return _format_table_json(texts.shape[0], texts.shape[1], texts.ravel().tolist(), confidences.ravel().tolist())
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __len__(self):
+        return len(self.pages)
+
+
+def load_ocr_results(path):
+    """
+    Load OCR results from ocr_results.json or from an OCR store directory.
+
+    Returns:
+        Mapping: Page name -> list of {"text", "confidence", "position"} records.
+    """
+    if os.path.isdir(path):
+        return OCRStore(path)
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def load_table_results(path):
+    """
+    Load table results from table_extraction_result.json or from a table store directory.
+    """
+    if os.path.isdir(path):
+        return TableStore(path)
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
@@ -0,0 +1,550 @@
+"""
+Long-running ingestion service.
+
+Documents are accepted over a small HTTP API or by dropping PDFs into a
+watched directory. Pages are processed in a pool of worker processes that
+load their models once, behind bounded queues: when the document queue is
+full, uploads are rejected with 503 instead of piling up in memory.
+
+HTTP API:
+    POST /documents              body = PDF bytes -> 202 {"id": ...}
+    GET  /documents/<id>         status and the page results so far
+    GET  /documents/<id>/stream  page results as NDJSON, streamed as they complete
+    GET  /health                 queue and worker status
+
+Example:
+    python service.py --port 8080 --workers 4 --queue-size 16 --watch inbox
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+from instrumentation import profiler
+from pipeline import (
+    collect_results,
+    init_worker,
+    make_options,
+    process_page_task,
+    validate_page_result,
+)
+
+logger = logging.getLogger(__name__)
+
+# Largest accepted upload
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+# Uploads are written to disk in chunks of this size instead of being held in memory
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+def _count_pages(pdf_path):
+    with fitz.open(pdf_path) as pdf_document:
+        return pdf_document.page_count
+
+
+class Job:
+    """
+    State of one submitted document.
+    """
+
+    def __init__(self, job_id, pdf_path, output_dir=None, cleanup=False):
+        self.id = job_id
+        self.pdf_path = pdf_path
+        self.output_dir = output_dir
+        self.cleanup = cleanup
+        self.status = "queued"
+        self.error = None
+        self.page_count = None
+        self.results = []
+        self.finished_at = None
+        # Notified whenever a page result is added or the job finishes
+        self.updated = asyncio.Condition()
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "page_count": self.page_count,
+            "pages_done": len(self.results),
+        }
+
+
+class DocumentService:
+    """
+    Processes submitted documents concurrently with bounded memory.
+
+    Args:
+        workers (int): Worker processes holding the models.
+        queue_size (int): Documents that may wait for processing before new ones are rejected.
+        max_concurrent_documents (int): Documents processed at the same time.
+        max_pages_in_flight (int): Pages submitted to the workers at the same time, across documents.
+        output_root (str): Directory under which each document's result files are written, or None.
+        options (dict): Page processing options, see pipeline.make_options.
+        ocr_cache_dir (str): Directory of the OCR result cache, or None.
+        quantize_tables (bool): Whether the workers use int8-quantized table models.
+        finished_job_ttl (float): Seconds a finished job and its results stay available.
+        max_finished_jobs (int): Finished jobs kept at most; the oldest are forgotten first.
+        max_profile_records (int): Profiling records kept in memory, see Profiler.
+    """
+
+    def __init__(self, workers=2, queue_size=16, max_concurrent_documents=2,
+                 max_pages_in_flight=None, output_root=None, options=None,
+                 ocr_cache_dir=None, quantize_tables=False, finished_job_ttl=3600,
+                 max_finished_jobs=100, max_profile_records=10000):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_concurrent_documents = max_concurrent_documents
+        self.max_pages_in_flight = max_pages_in_flight or workers * 2
+        self.output_root = output_root
+        self.options = options or make_options()
+        self.ocr_cache_dir = ocr_cache_dir
+        self.quantize_tables = quantize_tables
+        self.finished_job_ttl = finished_job_ttl
+        self.max_finished_jobs = max_finished_jobs
+        self.max_profile_records = max_profile_records
+
+        self.jobs = {}
+        # Finished jobs, oldest first
+        self._finished = collections.deque()
+        self._queue = None
+        # Queue slots held by uploads that are still being received
+        self._reserved = 0
+        self._page_slots = None
+        self._executor = None
+        self._dispatchers = []
+        self._upload_dir = tempfile.mkdtemp(prefix="document_service_")
+
+    async def start(self):
+        """
+        Start the worker pool (models are loaded once per worker) and the dispatchers.
+        """
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._page_slots = asyncio.Semaphore(self.max_pages_in_flight)
+        # Worker records are merged here for as long as the service runs
+        profiler.max_records = self.max_profile_records
+
+        cpu_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=(self.options, cpu_threads, self.ocr_cache_dir, self.quantize_tables),
+        )
+        self._dispatchers = [
+            asyncio.create_task(self._dispatch()) for _ in range(self.max_concurrent_documents)
+        ]
+        logger.info("Document service started with %d workers", self.workers)
+
+    async def stop(self):
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self._executor.shutdown(wait=True, cancel_futures=True)
+            )
+        shutil.rmtree(self._upload_dir, ignore_errors=True)
+
+    def _has_room(self):
+        return self._queue.qsize() + self._reserved < self.queue_size
+
+    def reserve(self):
+        """
+        Hold a queue slot for an upload before its body is read.
+
+        Returns:
+            bool: False when the queue is full. Otherwise the slot must be passed
+            on with ``submit_file(..., reserved=True)`` or given back with release().
+        """
+        if not self._has_room():
+            return False
+        self._reserved += 1
+        return True
+
+    def release(self):
+        self._reserved -= 1
+
+    def submit_file(self, pdf_path, output_name=None, cleanup=False, reserved=False):
+        """
+        Queue a PDF on disk for processing.
+
+        Args:
+            reserved (bool): Whether the caller holds a slot from reserve(), which the job takes.
+
+        Returns:
+            Job: The queued job, or None when the queue is full.
+        """
+        self._evict_finished()
+        if reserved:
+            self.release()
+        elif not self._has_room():
+            return None
+
+        job_id = uuid.uuid4().hex
+        output_dir = None
+        if self.output_root:
+            output_dir = os.path.join(self.output_root, output_name or job_id)
+
+        job = Job(job_id, pdf_path, output_dir, cleanup)
+        self._queue.put_nowait(job)
+        self.jobs[job_id] = job
+        return job
+
+    def submit_bytes(self, pdf_bytes):
+        """
+        Queue uploaded PDF bytes for processing, or return None when the queue is full.
+        """
+        if not self._has_room():
+            return None
+
+        pdf_path = os.path.join(self._upload_dir, f"{uuid.uuid4().hex}.pdf")
+        with open(pdf_path, "wb") as pdf_file:
+            pdf_file.write(pdf_bytes)
+
+        job = self.submit_file(pdf_path, cleanup=True)
+        if job is None:
+            os.remove(pdf_path)
+        return job
+
+    async def receive_upload(self, reader, length):
+        """
+        Write a request body of ``length`` bytes to a file in chunks and return its path.
+        """
+        pdf_path = os.path.join(self._upload_dir, f"{uuid.uuid4().hex}.pdf")
+        try:
+            with open(pdf_path, "wb") as pdf_file:
+                remaining = length
+                while remaining:
+                    chunk = await reader.read(min(remaining, UPLOAD_CHUNK_BYTES))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b"", remaining)
+                    pdf_file.write(chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            os.remove(pdf_path)
+            raise
+        return pdf_path
+
+    async def _dispatch(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            except Exception as error:
+                logger.exception("Processing of document %s failed", job.id)
+                job.status = "failed"
+                job.error = str(error)
+            finally:
+                if job.cleanup:
+                    try:
+                        os.remove(job.pdf_path)
+                    except OSError:
+                        pass
+                async with job.updated:
+                    job.updated.notify_all()
+                job.finished_at = time.monotonic()
+                self._finished.append(job)
+                self._evict_finished()
+                self._queue.task_done()
+
+    def _evict_finished(self):
+        """
+        Forget finished jobs past their time to live, and the oldest beyond max_finished_jobs.
+        """
+        expiry = time.monotonic() - self.finished_job_ttl
+        while self._finished and (len(self._finished) > self.max_finished_jobs
+                                  or self._finished[0].finished_at < expiry):
+            job = self._finished.popleft()
+            # Streams still reading the job keep their own reference to it
+            self.jobs.pop(job.id, None)
+
+    async def _run_job(self, job):
+        loop = asyncio.get_running_loop()
+        job.status = "running"
+        job.page_count = await loop.run_in_executor(None, _count_pages, job.pdf_path)
+
+        options = dict(self.options, output_dir=job.output_dir)
+        pending = asyncio.Queue()
+
+        async def submit_pages():
+            # Bounded by the page slots, so a large document can't flood the workers
+            for page_number in range(1, job.page_count + 1):
+                await self._page_slots.acquire()
+                try:
+                    future = loop.run_in_executor(
+                        self._executor, process_page_task, job.pdf_path, page_number, options
+                    )
+                except BaseException:
+                    self._page_slots.release()
+                    raise
+                future.add_done_callback(self._release_page_slot)
+                await pending.put(future)
+
+        async def next_page():
+            # Wait for the submitter too: if it fails (e.g. the pool broke) no page will ever come
+            getter = asyncio.ensure_future(pending.get())
+            await asyncio.wait({getter, submitter}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done() and submitter.exception() is not None:
+                getter.cancel()
+                raise submitter.exception()
+            return await getter
+
+        submitter = asyncio.create_task(submit_pages())
+        try:
+            carried_balance = None
+            for _ in range(job.page_count):
+                future = await next_page()
+                page_result, records = await future
+                profiler.merge(records)
+
+                # Pages are consumed in order, so balances carry over between pages
+                carried_balance = validate_page_result(page_result, carried_balance)
+                async with job.updated:
+                    job.results.append(page_result)
+                    job.updated.notify_all()
+        finally:
+            submitter.cancel()
+            while not pending.empty():
+                pending.get_nowait().cancel()
+
+        if job.output_dir:
+            await loop.run_in_executor(None, self._save_results, job)
+        job.status = "done"
+        logger.info("Processed document %s (%d pages)", job.id, job.page_count)
+
+    def _release_page_slot(self, future):
+        self._page_slots.release()
+        # Failures of abandoned pages are not reported to anyone else
+        if not future.cancelled():
+            future.exception()
+
+    def _save_results(self, job):
+        for _ in collect_results(job.results, job.output_dir, self.options["extract_tables"]):
+            pass
+
+    async def stream(self, job):
+        """
+        Yield the page results of a job as they become available.
+        """
+        sent = 0
+        while True:
+            async with job.updated:
+                await job.updated.wait_for(
+                    lambda: len(job.results) > sent or job.status in ("done", "failed")
+                )
+                new_results = job.results[sent:]
+                finished = job.status in ("done", "failed")
+            for page_result in new_results:
+                yield page_result
+            sent += len(new_results)
+            if finished and sent == len(job.results):
+                return
+
+    def health(self):
+        return {
+            "queued": self._queue.qsize(),
+            "queue_size": self.queue_size,
+            "workers": self.workers,
+            "jobs": {status: sum(1 for job in self.jobs.values() if job.status == status)
+                     for status in ("queued", "running", "done", "failed")},
+        }
+
+
+async def _write_response(writer, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    headers = [
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ]
+    if status == 503:
+        headers.append("Retry-After: 5")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def _stream_response(writer, service, job):
+    writer.write((
+        "HTTP/1.1 200 OK\r\n"
+        "Content-Type: application/x-ndjson\r\n"
+        "Transfer-Encoding: chunked\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode("latin-1"))
+
+    async def send_chunk(data):
+        writer.write(f"{len(data):X}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    async for page_result in service.stream(job):
+        await send_chunk(json.dumps(page_result).encode("utf-8") + b"\n")
+    await send_chunk(json.dumps({"done": True, **job.summary()}).encode("utf-8") + b"\n")
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def handle_http(service, reader, writer):
+    """
+    Serve one HTTP request.
+    """
+    try:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return
+        method, path, _ = request_line.split(" ", 2)
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        parts = [part for part in path.split("?")[0].split("/") if part]
+
+        if parts == ["health"] and method == "GET":
+            await _write_response(writer, 200, service.health())
+        elif parts == ["documents"] and method == "POST":
+            length = int(headers.get("content-length", 0))
+            if length <= 0:
+                await _write_response(writer, 400, {"error": "Empty body"})
+            elif length > MAX_UPLOAD_BYTES:
+                await _write_response(writer, 413, {"error": "Document too large"})
+            elif not service.reserve():
+                # Rejected before the body is read, so a full queue costs no memory or disk
+                await _write_response(writer, 503, {"error": "Queue full, retry later"})
+            else:
+                try:
+                    pdf_path = await service.receive_upload(reader, length)
+                except BaseException:
+                    service.release()
+                    raise
+                job = service.submit_file(pdf_path, cleanup=True, reserved=True)
+                await _write_response(writer, 202, job.summary())
+        elif len(parts) in (2, 3) and parts[0] == "documents" and method == "GET":
+            job = service.jobs.get(parts[1])
+            if job is None:
+                await _write_response(writer, 404, {"error": "Unknown document"})
+            elif len(parts) == 3 and parts[2] == "stream":
+                await _stream_response(writer, service, job)
+            elif len(parts) == 2:
+                await _write_response(writer, 200, {**job.summary(), "results": job.results})
+            else:
+                await _write_response(writer, 404, {"error": "Not found"})
+        else:
+            await _write_response(writer, 405 if parts else 404, {"error": "Not supported"})
+    except (ValueError, asyncio.IncompleteReadError) as error:
+        await _write_response(writer, 400, {"error": str(error)})
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def watch_directory(service, input_dir, poll_interval=2.0):
+    """
+    Submit every new PDF that appears in ``input_dir``.
+
+    A file is only submitted once its size and modification time are the same
+    on two polls in a row, so PDFs still being copied in are left alone. Files
+    are retried while the queue is full, which slows the intake down to the
+    pace of the workers.
+    """
+    seen = set()
+    # Size and modification time of the files not submitted yet, at the previous poll
+    last_seen = {}
+    while True:
+        for file_name in sorted(os.listdir(input_dir)):
+            pdf_path = os.path.join(input_dir, file_name)
+            if file_name in seen or not file_name.lower().endswith(".pdf"):
+                continue
+            try:
+                stat = os.stat(pdf_path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if not stat.st_size or last_seen.get(file_name) != signature:
+                last_seen[file_name] = signature
+                continue
+
+            job = service.submit_file(pdf_path, output_name=os.path.splitext(file_name)[0])
+            if job is None:
+                break  # Queue full, try again on the next poll
+            seen.add(file_name)
+            del last_seen[file_name]
+            logger.info("Queued %s as document %s", pdf_path, job.id)
+
+        await asyncio.sleep(poll_interval)
+
+
+async def serve(args):
+    options = make_options(
+        extract_tables=not args.no_tables, text_mode=args.text_mode, render_mode=args.render_mode,
+    )
+    service = DocumentService(
+        workers=args.workers,
+        queue_size=args.queue_size,
+        max_concurrent_documents=args.concurrent_documents,
+        output_root=args.output_root,
+        options=options,
+        ocr_cache_dir=args.ocr_cache_dir,
+        finished_job_ttl=args.job_ttl,
+    )
+    await service.start()
+
+    tasks = []
+    server = None
+    if args.port:
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_http(service, reader, writer), args.host, args.port
+        )
+        logger.info("Listening on http://%s:%d", args.host, args.port)
+        tasks.append(asyncio.create_task(server.serve_forever()))
+    if args.watch:
+        tasks.append(asyncio.create_task(watch_directory(service, args.watch)))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if server is not None:
+            server.close()
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the document processing service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="HTTP port, 0 to disable the HTTP API")
+    parser.add_argument("--watch", help="directory to watch for new PDFs")
+    parser.add_argument("--output-root", help="directory for per-document result files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--queue-size", type=int, default=16, help="documents waiting before uploads are rejected")
+    parser.add_argument("--concurrent-documents", type=int, default=2, help="documents processed at once")
+    parser.add_argument("--text-mode", choices=["ocr", "hybrid"], default="ocr")
+    parser.add_argument("--render-mode", choices=["full", "adaptive"], default="full")
+    parser.add_argument("--no-tables", action="store_true", help="skip table extraction")
+    parser.add_argument("--ocr-cache-dir", help="directory of the OCR result cache")
+    parser.add_argument("--job-ttl", type=float, default=3600,
+                        help="seconds the results of a finished document stay available")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    if args.watch and not args.output_root:
+        args.output_root = os.path.join(args.watch, "results")
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(serve(args))
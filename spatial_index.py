@@ -0,0 +1,147 @@
+"""
+Spatial index over the OCR boxes of a page.
+
+The index keeps the axis-aligned bounding box of every OCR record in a uniform
+grid of square cells a few text lines high. Geometric queries (the text right
+of or below a label, every box inside a region) only visit the cells they
+cover, so their cost depends on how crowded that part of the page is rather
+than on the number of boxes on the page.
+"""
+import numpy as np
+
+
+class SpatialIndex:
+    """
+    Uniform-grid index over text boxes.
+
+    Args:
+        boxes: (N, 4) array of [x1, y1, x2, y2] boxes, in reading order.
+        texts (list): The text of each box.
+        cell_size (float): Side of the grid cells; four median box heights by default.
+    """
+
+    def __init__(self, boxes, texts, cell_size=None):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.texts = list(texts)
+        if cell_size is None:
+            heights = self.boxes[:, 3] - self.boxes[:, 1]
+            cell_size = 4 * max(float(np.median(heights)) if len(heights) else 1.0, 1.0)
+        self.cell_size = cell_size
+
+        # Every box is listed in each cell it overlaps
+        self._cells = {}
+        cells = np.floor(self.boxes / cell_size).astype(np.int64)
+        for index, (cx1, cy1, cx2, cy2) in enumerate(cells.tolist()):
+            for cy in range(cy1, cy2 + 1):
+                for cx in range(cx1, cx2 + 1):
+                    self._cells.setdefault((cx, cy), []).append(index)
+        self._max_cell = cells[:, 2:].max(axis=0).tolist() if len(cells) else [0, 0]
+
+    @classmethod
+    def from_quads(cls, quads, texts, cell_size=None):
+        """
+        Build the index from (N, 4, 2) quads, like the "position" of OCR records.
+        """
+        quads = np.asarray(quads, dtype=np.float32).reshape(-1, 4, 2)
+        boxes = np.concatenate([quads.min(axis=1), quads.max(axis=1)], axis=1)
+        return cls(boxes, texts, cell_size)
+
+    @classmethod
+    def from_records(cls, records, cell_size=None):
+        """
+        Build the index from a page's OCR records.
+        """
+        return cls.from_quads([record["position"] for record in records],
+                              [record["text"] for record in records], cell_size)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _cell(self, value):
+        return int(np.floor(value / self.cell_size))
+
+    def _in_cells(self, x1, y1, x2, y2):
+        """
+        Return the indices of the boxes listed in the cells covering a region, in reading order.
+        """
+        found = set()
+        for cy in range(self._cell(y1), self._cell(y2) + 1):
+            for cx in range(self._cell(x1), self._cell(x2) + 1):
+                found.update(self._cells.get((cx, cy), ()))
+        return sorted(found)
+
+    def inside(self, region, min_fraction=0.5):
+        """
+        Return the indices of the boxes with at least ``min_fraction`` of their area inside a region.
+
+        Args:
+            region: [x1, y1, x2, y2] in the same pixels as the boxes.
+        """
+        x1, y1, x2, y2 = region
+        candidates = self._in_cells(x1, y1, x2, y2)
+        if not candidates:
+            return []
+        boxes = self.boxes[candidates]
+        width = np.clip(np.minimum(boxes[:, 2], x2) - np.maximum(boxes[:, 0], x1), 0, None)
+        height = np.clip(np.minimum(boxes[:, 3], y2) - np.maximum(boxes[:, 1], y1), 0, None)
+        areas = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1e-6)
+        keep = width * height / areas >= min_fraction
+        return [index for index, kept in zip(candidates, keep.tolist()) if kept]
+
+    def _nearest(self, index, axis, max_gap, min_overlap):
+        """
+        Find the nearest box after box ``index`` along ``axis`` (0 = right, 1 = down)
+        that overlaps it across the other axis by ``min_overlap`` of the smaller box.
+        """
+        box = self.boxes[index]
+        across = 1 - axis
+        end = box[axis + 2]
+        # OCR boxes often overlap their neighbours a little, so a box only has to
+        # start past the centre of this one and end past its edge
+        centre = (box[axis] + end) / 2
+        limit = self._max_cell[axis] if max_gap is None else self._cell(end + max_gap)
+        across_cells = range(self._cell(box[across]), self._cell(box[across + 2]) + 1)
+
+        best = None
+        best_gap = None
+        for cell in range(self._cell(end), limit + 1):
+            for across_cell in across_cells:
+                key = (cell, across_cell) if axis == 0 else (across_cell, cell)
+                for candidate in self._cells.get(key, ()):
+                    other = self.boxes[candidate]
+                    gap = other[axis] - end
+                    if candidate == index or other[axis] <= centre or other[axis + 2] <= end:
+                        continue
+                    if max_gap is not None and gap > max_gap:
+                        continue
+                    overlap = min(box[across + 2], other[across + 2]) - max(box[across], other[across])
+                    smaller = min(box[across + 2] - box[across], other[across + 2] - other[across])
+                    if overlap < min_overlap * smaller:
+                        continue
+                    if best is None or gap < best_gap or (gap == best_gap and candidate < best):
+                        best, best_gap = candidate, gap
+
+            # Boxes not seen yet all start beyond this cell
+            if best is not None and self.boxes[best][axis] < (cell + 1) * self.cell_size:
+                break
+        return best
+
+    def right_of(self, index, max_gap=None, min_overlap=0.5):
+        """
+        Return the index of the nearest box to the right of box ``index`` on the same line, or None.
+
+        Args:
+            max_gap (float): Largest horizontal gap between the boxes, in pixels.
+            min_overlap (float): Vertical overlap needed, as a fraction of the shorter box's height.
+        """
+        return self._nearest(index, 0, max_gap, min_overlap)
+
+    def below(self, index, max_gap=None, min_overlap=0.3):
+        """
+        Return the index of the nearest box below box ``index`` in the same column, or None.
+
+        Args:
+            max_gap (float): Largest vertical gap between the boxes, in pixels.
+            min_overlap (float): Horizontal overlap needed, as a fraction of the narrower box's width.
+        """
+        return self._nearest(index, 1, max_gap, min_overlap)
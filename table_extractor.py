@@ -1,111 +1,147 @@
-from transformers import AutoImageProcessor, TableTransformerForObjectDetection
-from transformers import DetrFeatureExtractor
-import torch
+import logging
 from PIL import Image
 import cv2
 import numpy as np
-from paddleocr import PaddleOCR
 import pandas as pd
 import os
 import json
+from dataclasses import dataclass
 
-ocr = PaddleOCR(
-    lang="en",
-    use_gpu=False,
-    show_log=False,
-    use_angle_cls=False,
-)
+import model_registry
+import ocr_cache
+from instrumentation import stage
 
-image_processor = AutoImageProcessor.from_pretrained(
-    "microsoft/table-transformer-detection"
-)
-model = TableTransformerForObjectDetection.from_pretrained(
-    "microsoft/table-transformer-detection"
-)
+logger = logging.getLogger(__name__)
 
-model_structure = TableTransformerForObjectDetection.from_pretrained(
-    "microsoft/table-transformer-structure-recognition"
-)
 
+def _split_structure_results(table_struct_results, label2id):
+    """
+    Split the post-processed structure detections into rows, columns and headers.
+    """
+    labels = table_struct_results["labels"]
+    boxes = table_struct_results["boxes"]
+    scores = table_struct_results["scores"]
 
-def get_row_col_bounds(table, ts_thresh=0.7, plot=False):
-    feature_extractor = DetrFeatureExtractor()
-    table_encoding = feature_extractor(table, return_tensors="pt")
-
-    # predict table structure
-    with torch.no_grad():
-        outputs = model_structure(**table_encoding)
-
-    # visualize table structure
-    target_sizes = [table.size[::-1]]
-    table_struct_results = feature_extractor.post_process_object_detection(
-        outputs, threshold=ts_thresh, target_sizes=target_sizes
-    )[0]
-
-    row_boxes = table_struct_results["boxes"][
-        table_struct_results["labels"] == model_structure.config.label2id["table row"]
-    ]
-
-    row_scores = table_struct_results["scores"][
-        table_struct_results["labels"] == model_structure.config.label2id["table row"]
-    ]
-
-    col_boxes = table_struct_results["boxes"][
-        table_struct_results["labels"]
-        == model_structure.config.label2id["table column"]
-    ]
-
-    col_scores = table_struct_results["scores"][
-        table_struct_results["labels"]
-        == model_structure.config.label2id["table column"]
-    ]
+    row_mask = labels == label2id["table row"]
+    col_mask = labels == label2id["table column"]
+    header_mask = labels == label2id["table column header"]
 
-    table_header_box = table_struct_results["boxes"][
-        table_struct_results["labels"]
-        == model_structure.config.label2id["table column header"]
-    ]
-    table_header_score = table_struct_results["scores"][
-        table_struct_results["labels"]
-        == model_structure.config.label2id["table column header"]
-    ]
-
-    print(f"Num rows initially detected: {len(row_boxes)}")
-    print(f"Num cols initially detected: {len(col_boxes)}")
-    print(f"Num table header detected: {len(table_header_box)}")
+    logger.debug("Num rows initially detected: %d", int(row_mask.sum()))
+    logger.debug("Num cols initially detected: %d", int(col_mask.sum()))
+    logger.debug("Num table header detected: %d", int(header_mask.sum()))
 
     return (
-        row_boxes,
-        row_scores,
-        col_boxes,
-        col_scores,
-        table_header_box,
-        table_header_score,
+        boxes[row_mask],
+        scores[row_mask],
+        boxes[col_mask],
+        scores[col_mask],
+        boxes[header_mask],
+        scores[header_mask],
     )
 
-def sort_row_col_boxes(row_boxes, col_boxes):
-    row_boxes = row_boxes.tolist()
-    col_boxes = col_boxes.tolist()
-    row_boxes.sort(key=lambda x: x[1])  # [top_x, top_y, bottom_x, bottom_y]
-    col_boxes.sort(key=lambda x: x[0])
+def get_row_col_bounds_batch(tables, ts_thresh=0.7, batch_size=8):
+    """
+    Recognise the rows, columns and headers of several table images.
+
+    The tables are padded into batches of ``batch_size`` and run through the
+    structure model under inference mode.
+
+    Returns:
+        list: One (row_boxes, row_scores, col_boxes, col_scores, header_boxes,
+        header_scores) tuple per table, in the order of ``tables``.
+    """
+    import torch
+
+    feature_extractor = model_registry.get_structure_feature_extractor()
+    model_structure = model_registry.get_table_structure_model()
+    label2id = model_structure.config.label2id
+
+    structures = []
+    for start in range(0, len(tables), batch_size):
+        batch = tables[start:start + batch_size]
+        # predict table structure
+        with stage("table_structure", items=len(batch)), torch.inference_mode():
+            table_encoding = feature_extractor(batch, return_tensors="pt")
+            outputs = model_structure(**table_encoding)
+
+        target_sizes = [table.size[::-1] for table in batch]
+        batch_results = feature_extractor.post_process_object_detection(
+            outputs, threshold=ts_thresh, target_sizes=target_sizes
+        )
+        structures.extend(
+            _split_structure_results(table_struct_results, label2id)
+            for table_struct_results in batch_results
+        )
+
+    return structures
+
+def get_row_col_bounds(table, ts_thresh=0.7, plot=False):
+    return get_row_col_bounds_batch([table], ts_thresh)[0]
+
+def suppress_overlapping_boxes(boxes, scores=None, axis=1, overlap_threshold=0.5):
+    """
+    Drop duplicate row (axis=1) or column (axis=0) boxes with non-maximum suppression.
+
+    Two boxes are duplicates when their extents along ``axis`` overlap by more
+    than ``overlap_threshold`` of the shorter one; the higher-scoring box is kept.
+
+    Returns:
+        np.ndarray: Indices of the kept boxes.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    scores = np.ones(len(boxes), dtype=np.float32) if scores is None else np.asarray(scores, dtype=np.float32)
+
+    start, end = boxes[:, axis], boxes[:, axis + 2]
+    overlap = np.minimum(end[:, None], end[None, :]) - np.maximum(start[:, None], start[None, :])
+    length = end - start
+    shorter = np.maximum(np.minimum(length[:, None], length[None, :]), 1e-6)
+    duplicates = overlap / shorter > overlap_threshold
+
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for index in np.argsort(-scores, kind="stable"):
+        if suppressed[index]:
+            continue
+        keep.append(index)
+        suppressed |= duplicates[index]
+    return np.sort(np.asarray(keep, dtype=np.int64))
+
+def sort_row_col_boxes(row_boxes, col_boxes, row_scores=None, col_scores=None, overlap_threshold=0.5):
+    """
+    De-duplicate the row and column boxes and sort rows top to bottom and columns left to right.
+
+    Returns:
+        tuple: (row_boxes, col_boxes) as (N, 4) arrays of [x1, y1, x2, y2].
+    """
+    row_boxes = np.asarray(row_boxes, dtype=np.float32).reshape(-1, 4)
+    col_boxes = np.asarray(col_boxes, dtype=np.float32).reshape(-1, 4)
+
+    row_boxes = row_boxes[suppress_overlapping_boxes(row_boxes, row_scores, 1, overlap_threshold)]
+    col_boxes = col_boxes[suppress_overlapping_boxes(col_boxes, col_scores, 0, overlap_threshold)]
+
+    row_boxes = row_boxes[np.argsort(row_boxes[:, 1], kind="stable")]  # [top_x, top_y, bottom_x, bottom_y]
+    col_boxes = col_boxes[np.argsort(col_boxes[:, 0], kind="stable")]
     return row_boxes, col_boxes
 
-def get_cells_by_intersecting_rows_and_cols(row_boxes, col_boxes, padding=(0, 0)):
-    cells = []
-    for row_box in row_boxes:
-        for col_box in col_boxes:
-            cell_left_upper_x = col_box[0]
-            cell_left_upper_y = row_box[1]
-            cell_right_lower_x = col_box[2]
-            cell_right_lower_y = row_box[3]
-            cells.append(
-                [
-                    cell_left_upper_x,
-                    cell_left_upper_y,
-                    cell_right_lower_x,
-                    cell_right_lower_y,
-                ]
-            )
-    return cells
+def get_cells_by_intersecting_rows_and_cols(row_boxes, col_boxes):
+    """
+    Build the cell grid from the row and column boxes.
+
+    Returns:
+        np.ndarray: (rows * cols, 4) cell boxes in row-major order, spanning the
+        column's x extent and the row's y extent.
+    """
+    row_boxes = np.asarray(row_boxes, dtype=np.float32).reshape(-1, 4)
+    col_boxes = np.asarray(col_boxes, dtype=np.float32).reshape(-1, 4)
+
+    cells = np.empty((len(row_boxes), len(col_boxes), 4), dtype=np.float32)
+    cells[:, :, 0] = col_boxes[None, :, 0]
+    cells[:, :, 1] = row_boxes[:, None, 1]
+    cells[:, :, 2] = col_boxes[None, :, 2]
+    cells[:, :, 3] = row_boxes[:, None, 3]
+    return cells.reshape(-1, 4)
 
 
 def PIL_to_cv(pil_img):
@@ -119,110 +155,347 @@ def add_padding(image, padding_width, color=(255, 255, 255)):
     new_image.paste(image, (padding_width, padding_width))
     return new_image
 
-def extract_tables_from_images(image_paths):
-    all_tables = {}
+def assign_text_boxes_to_cells(text_boxes, cells, min_overlap=0.5):
+    """
+    Map each OCR text box to the cell it overlaps the most.
+
+    Overlap is measured as the intersection area divided by the text box area,
+    so a word that slightly spills over a column border still lands in the
+    cell holding most of it. Boxes below ``min_overlap`` are dropped.
+    Returns a list with the index of the matching cell (or -1) per text box.
+    """
+    if len(text_boxes) == 0 or len(cells) == 0:
+        return [-1] * len(text_boxes)
+
+    boxes = np.asarray(text_boxes, dtype=np.float32)[:, None, :]  # (T, 1, 4)
+    grid = np.asarray(cells, dtype=np.float32)[None, :, :]  # (1, C, 4)
+
+    inter_w = np.minimum(boxes[..., 2], grid[..., 2]) - np.maximum(boxes[..., 0], grid[..., 0])
+    inter_h = np.minimum(boxes[..., 3], grid[..., 3]) - np.maximum(boxes[..., 1], grid[..., 1])
+    intersection = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)  # (T, C)
+
+    box_area = (boxes[..., 2] - boxes[..., 0]) * (boxes[..., 3] - boxes[..., 1])
+    overlap = intersection / np.maximum(box_area, 1e-6)
+
+    best_cell = overlap.argmax(axis=1)
+    best_overlap = overlap[np.arange(len(best_cell)), best_cell]
+    return [int(c) if o >= min_overlap else -1 for c, o in zip(best_cell, best_overlap)]
+
+def ocr_table_cells(table_image, cells, min_overlap=0.5):
+    """
+    Recognise the text of every cell with a single OCR pass over the table.
+
+    The whole table image is run through PaddleOCR once and each detected
+    text box is assigned to a cell by geometric overlap, instead of running
+    detection and recognition separately for every cell crop.
+    Returns the cell texts (None for empty cells) and their confidence scores,
+    both in the same order as ``cells``.
+    """
+    with stage("cell_ocr", items=len(cells)):
+        cache = ocr_cache.get_cache()
+        lines = None
+        if cache is not None:
+            cache_key = cache.make_key(table_image, kind="table")
+            lines = cache.get(cache_key)
+
+        if lines is None:
+            ocr = model_registry.get_ocr()
+            result = ocr.ocr(PIL_to_cv(table_image), cls=False)
+            lines = result[0] if result and result[0] else []
+            if cache is not None:
+                cache.put(cache_key, lines)
+
+    # Convert the OCR quads to axis-aligned [x1, y1, x2, y2] boxes
+    text_boxes = []
+    for line in lines:
+        xs = [point[0] for point in line[0]]
+        ys = [point[1] for point in line[0]]
+        text_boxes.append([min(xs), min(ys), max(xs), max(ys)])
+
+    assignments = assign_text_boxes_to_cells(text_boxes, cells, min_overlap)
+
+    # Group the text boxes belonging to each cell
+    cell_lines = [[] for _ in cells]
+    for line, box, cell_index in zip(lines, text_boxes, assignments):
+        if cell_index >= 0:
+            cell_lines[cell_index].append((box, line[1][0], line[1][1]))
+
+    extracted_data = []
+    confidence_scores = []
+    for entries in cell_lines:
+        if not entries:
+            extracted_data.append(None)  # Append None if no text in the cell
+            confidence_scores.append(0)  # Append 0 for confidence score
+            continue
+
+        # Join multi-line cells in reading order (top to bottom, left to right)
+        entries.sort(key=lambda entry: (entry[0][1], entry[0][0]))
+        extracted_data.append(" ".join(text for _, text, _ in entries))
+        confidence_scores.append(float(np.mean([score for _, _, score in entries])))
+
+    return extracted_data, confidence_scores
+
+def detect_tables(images, threshold=0.9, batch_size=4):
+    """
+    Run table detection on several page images in padded batches.
+
+    Returns:
+        list: The post-processed detections ({"scores", "labels", "boxes"}) of each image.
+    """
+    import torch
+
+    image_processor = model_registry.get_table_image_processor()
+    model = model_registry.get_table_detection_model()
+
+    detections = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+
+        # Detect tables in the images
+        with stage("table_detect", items=len(batch)), torch.inference_mode():
+            inputs = image_processor(images=batch, return_tensors="pt")
+            outputs = model(**inputs)
+        target_sizes = torch.tensor([image.size[::-1] for image in batch])
+        detections.extend(
+            image_processor.post_process_object_detection(
+                outputs, threshold=threshold, target_sizes=target_sizes
+            )
+        )
+
+    return detections
+
+@dataclass
+class TableResult:
+    """
+    A table extracted from a page.
+
+    ``texts`` holds the cell texts (None for empty cells) and ``confidences``
+    their OCR confidence (0 for empty cells), both of shape (rows, columns).
+    Boxes are in the pixels of the padded table image.
+    """
+
+    texts: np.ndarray
+    confidences: np.ndarray
+    row_boxes: np.ndarray
+    col_boxes: np.ndarray
+
+    @property
+    def shape(self):
+        return self.texts.shape
+
+    def to_dataframe(self):
+        """
+        Return the cells and confidences side by side, under "Data" and "Confidence" column groups.
+        """
+        num_rows, num_cols = self.shape
+        columns = pd.MultiIndex.from_product([["Data", "Confidence"], range(num_cols)])
+        values = np.empty((num_rows, 2 * num_cols), dtype=object)
+        values[:, :num_cols] = self.texts
+        values[:, num_cols:] = self.confidences
+        # Keep object columns, so empty cells stay None rather than becoming NaN strings
+        return pd.DataFrame(values, columns=columns, dtype=object)
+
+    def to_json(self):
+        """
+        Return the table as JSON records, the format stored in table_extraction_result.json.
+        """
+        return self.to_dataframe().to_json(orient="records")
+
+def build_table_result(padded_image, table_structure_outs):
+    """
+    OCR the cells of a recognised table and return them as a TableResult.
+    """
+    row_boxes, row_scores, col_boxes, col_scores = table_structure_outs[:4]
+    sorted_rows, sorted_cols = sort_row_col_boxes(row_boxes, col_boxes, row_scores, col_scores)
+    cells = get_cells_by_intersecting_rows_and_cols(sorted_rows, sorted_cols)
+
+    # Extract cell data using OCR
+    extracted_data, confidence_scores = ocr_table_cells(padded_image, cells)
+
+    shape = (len(sorted_rows), len(sorted_cols))
+    texts = np.empty(len(extracted_data), dtype=object)
+    texts[:] = extracted_data
+    return TableResult(
+        texts=texts.reshape(shape),
+        confidences=np.asarray(confidence_scores, dtype=np.float64).reshape(shape),
+        row_boxes=sorted_rows,
+        col_boxes=sorted_cols,
+    )
 
-    # Iterate over all image paths in the list
-    for image_path in image_paths:
-        if image_path.endswith(".png") or image_path.endswith(".jpg"):
-            # Load and preprocess image
-            image = Image.open(image_path).convert("RGB")
+def build_table_json(padded_image, table_structure_outs):
+    """
+    OCR the cells of a recognised table and return them as JSON records.
+    """
+    return build_table_result(padded_image, table_structure_outs).to_json()
+
+def detect_table_boxes(images, page_names, batch_size=4):
+    """
+    Detect the tables of several page images.
+
+    Returns:
+        list: For each image, the [x1, y1, x2, y2] boxes of its tables in image pixels.
+    """
+    detections = detect_tables(images, batch_size=batch_size)
+
+    page_boxes = []
+    for page_name, results in zip(page_names, detections):
+        # Check if any tables were detected
+        if results["scores"].numel() == 0:  # If no scores, no tables detected
+            logger.info("No table detected for %s.", page_name)
+        page_boxes.append([[round(i, 2) for i in box.tolist()] for box in results["boxes"]])
+    return page_boxes
+
+def crop_table(image, box, padding=10):
+    """
+    Cut a detected table out of its page image, with a margin and a white border.
+    """
+    box = [
+        box[0] - padding,
+        box[1] - padding,
+        box[2] + padding,
+        box[3] + padding,
+    ]
+    return add_padding(image.crop(box), 20)
+
+def extract_tables_from_crops(padded_tables, table_pages, page_names, batch_size=4, output="json"):
+    """
+    Recognise the structure of cropped tables and OCR their cells.
+
+    Args:
+        padded_tables (list): Table images, as returned by crop_table.
+        table_pages (list): Index into ``page_names`` of the page each table belongs to.
+        page_names (list): Name of each page, used in log messages.
+        batch_size (int): Number of images per model call.
+        output (str): "json" for JSON records or "result" for TableResult objects.
+
+    Returns:
+        list: For each page, its extracted table, or "" ("json") / None ("result") when it has none.
+    """
+    if output not in ("json", "result"):
+        raise ValueError(f"Unsupported output format: {output}")
+
+    # Structure detection for all tables of the batch
+    structures = get_row_col_bounds_batch(padded_tables, batch_size=batch_size)
+
+    # No table for pages without one; the last table of a page wins
+    page_tables = [None] * len(page_names)
+    for page_index, padded_image, table_structure_outs in zip(table_pages, padded_tables, structures):
+        page_tables[page_index] = build_table_result(padded_image, table_structure_outs)
+        logger.info("Extracted table from %s", page_names[page_index])
+
+    if output == "json":
+        return [table.to_json() if table is not None else "" for table in page_tables]
+    return page_tables
+
+def extract_tables_from_batch(images, page_names, batch_size=4, output="json"):
+    """
+    Detect and extract the tables of several page images at once.
+
+    Detection runs on padded batches of pages, and structure recognition on
+    padded batches of all the tables found in those pages.
+
+    Args:
+        images (list): RGB page images, as PIL images or NumPy arrays.
+        page_names (list): Name of each page, used in log messages.
+        batch_size (int): Number of images per model call.
+        output (str): "json" for JSON records or "result" for TableResult objects.
+
+    Returns:
+        list: For each page, its extracted table, or "" ("json") / None ("result") when no table is detected.
+    """
+    images = [Image.fromarray(image) if isinstance(image, np.ndarray) else image for image in images]
+    page_boxes = detect_table_boxes(images, page_names, batch_size)
+
+    # Crop every detected table
+    table_pages = []
+    padded_tables = []
+    for page_index, (image, boxes) in enumerate(zip(images, page_boxes)):
+        for box in boxes:
+            table_pages.append(page_index)
+            padded_tables.append(crop_table(image, box))
+
+    return extract_tables_from_crops(padded_tables, table_pages, page_names, batch_size, output)
+
+def extract_tables_from_image(image, page_name="page", output="json"):
+    """
+    Detect the tables on one page image and extract their cell contents.
+
+    Args:
+        image: RGB page image, as a PIL image or a NumPy array.
+        page_name (str): Name of the page, used in log messages.
+        output (str): "json" for JSON records or "result" for a TableResult.
+
+    Returns:
+        The extracted table, or "" ("json") / None ("result") when no table is detected.
+    """
+    return extract_tables_from_batch([image], [page_name], output=output)[0]
+
+def save_table_results(all_tables, output_dir="data"):
+    """
+    Save all extracted tables to table_extraction_result.json and return its path.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    all_tables_output_path = os.path.join(output_dir, "table_extraction_result.json")
+    with open(all_tables_output_path, "w") as all_tables_file:
+        json.dump(all_tables, all_tables_file, ensure_ascii=False, indent=4)
 
-            # Detect tables in the image
-            inputs = image_processor(images=image, return_tensors="pt")
-            outputs = model(**inputs)
-            target_sizes = torch.tensor([image.size[::-1]])
-            results = image_processor.post_process_object_detection(
-                outputs, threshold=0.9, target_sizes=target_sizes
-            )[0]
-
-            # Check if any tables were detected
-            if results["scores"].numel() == 0:  # If no scores, no tables detected
-                # Extract page number from the image file name
-                page_num = os.path.splitext(os.path.basename(image_path))[0].split("_")[-1]
-                all_tables[f"page_{page_num}"] = ""  # Assign empty string for no table
-                print(f"No table detected for {image_path}.")
-                continue  # Skip to the next image
-
-            # Process each detected table
-            for score, label, box in zip(
-                results["scores"], results["labels"], results["boxes"]
-            ):
-                box = [round(i, 2) for i in box.tolist()]
-                padding = 10
-                box = [
-                    box[0] - padding,
-                    box[1] - padding,
-                    box[2] + padding,
-                    box[3] + padding,
-                ]
-                table_image = image.crop(box)
-
-                # Structure detection and extraction
-                padded_image = add_padding(table_image, 20)
-                table_structure_outs = get_row_col_bounds(padded_image)
-                sorted_rows, sorted_cols = sort_row_col_boxes(
-                    table_structure_outs[0], table_structure_outs[2]
-                )
-                cells = get_cells_by_intersecting_rows_and_cols(
-                    sorted_rows, sorted_cols
-                )
+    logger.info("All extracted tables saved to %s", all_tables_output_path)
 
-                # Extract cell data using OCR
-                num_rows = len(sorted_rows)
-                num_cols = len(sorted_cols)
-                extracted_data = []
-                confidence_scores = []  # List to store confidence scores
-
-                for cell in cells:
-                    cell_image = padded_image.crop(cell)
-                    result = ocr.ocr(PIL_to_cv(cell_image))
-
-                    # Check if result is valid and extract confidence score
-                    if result and result[0]:
-                        value = result[0][0][1][0]  # Extracted text
-                        confidence = result[0][0][1][1]  # Confidence score
-                        extracted_data.append(value)
-                        confidence_scores.append(confidence)
-                    else:
-                        extracted_data.append(None)  # Append None if no result
-                        confidence_scores.append(0)  # Append 0 for confidence score
-
-                # Create a DataFrame with extracted data and confidence scores
-                df = pd.DataFrame(index=range(num_rows), columns=range(num_cols))
-
-                for i, data in enumerate(extracted_data):
-                    df.iloc[i // num_cols, i % num_cols] = data
-
-                # Add confidence scores to the DataFrame
-                confidence_df = pd.DataFrame(
-                    index=range(num_rows), columns=range(num_cols)
-                )
-                for i, score in enumerate(confidence_scores):
-                    confidence_df.iloc[i // num_cols, i % num_cols] = score
+    return all_tables_output_path
 
-                # Combine extracted data and confidence scores into a single DataFrame
-                combined_df = pd.concat(
-                    [df, confidence_df], axis=1, keys=["Data", "Confidence"]
+def extract_tables_from_images(image_paths, batch_size=4, prefilter=None, ocr_results=None, classifications=None):
+    """
+    Extract the tables of page images saved as page_<n>.png/.jpg and save them to table_extraction_result.json.
+
+    With a ``prefilter`` (see table_prefilter.TablePrefilter), pages it rules out
+    get "" without going through the detection model. ``ocr_results`` and
+    ``classifications`` (page name -> OCR records / document type) give it more to go on.
+    """
+    def page_name(image_path):
+        # Extract page number from the image file name
+        page_num = os.path.splitext(os.path.basename(image_path))[0].split("_")[-1]
+        return f"page_{page_num}"
+
+    all_tables = {}
+
+    # Only keep image files
+    image_paths = [
+        image_path for image_path in image_paths
+        if image_path.endswith(".png") or image_path.endswith(".jpg")
+    ]
+    output_dir = (os.path.dirname(image_paths[0]) or ".") if image_paths else "."
+    page_order = [page_name(image_path) for image_path in image_paths]
+
+    if prefilter is not None:
+        kept_paths = []
+        for image_path in image_paths:
+            name = page_name(image_path)
+            with Image.open(image_path) as image:
+                detect = prefilter.should_detect(
+                    image.convert("RGB"), (ocr_results or {}).get(name), (classifications or {}).get(name)
                 )
+            if detect:
+                kept_paths.append(image_path)
+            else:
+                all_tables[name] = ""
+        image_paths = kept_paths
 
-                # Convert DataFrame to JSON format
-                json_output = combined_df.to_json(orient="records")
+    # Process the images in batches
+    for start in range(0, len(image_paths), batch_size):
+        batch_paths = image_paths[start:start + batch_size]
 
-                # Extract page number from the image file name
-                page_num = os.path.splitext(os.path.basename(image_path))[0].split("_")[-1]
+        # Load and preprocess images
+        images = [Image.open(image_path).convert("RGB") for image_path in batch_paths]
+        page_tables = extract_tables_from_batch(images, batch_paths, batch_size)
 
-                # Store the extracted table in the dictionary
-                all_tables[f"page_{page_num}"] = json_output
+        for image_path, json_output in zip(batch_paths, page_tables):
+            # Store the extracted table in the dictionary
+            all_tables[page_name(image_path)] = json_output
 
-                print(f"Extracted table from {image_path}")
+    # Keep the pages in their original order, skipped or not
+    all_tables = {name: all_tables[name] for name in page_order}
 
     # Save all extracted tables to a single JSON file
-    all_tables_output_path = os.path.join(os.path.dirname(image_paths[0]), "table_extraction_result.json")
-    with open(all_tables_output_path, "w") as all_tables_file:
-        json.dump(all_tables, all_tables_file, ensure_ascii=False, indent=4)
-
-    print(f"All extracted tables saved to {all_tables_output_path}")
+    save_table_results(all_tables, output_dir)
 
     return all_tables
-
@@ -0,0 +1,218 @@
+"""
+Cheap checks that skip table detection on pages that obviously have no table.
+
+The cascade runs its stages from cheapest to most expensive and stops at the
+first one that decides:
+
+    classification   page types that never hold tables (e.g. "others") are skipped
+    ocr_layout       text boxes of the OCR output lined up in columns -> run detection
+    ruling_lines     long horizontal/vertical lines on a downscaled image -> run detection
+    image_layout     ink blobs lined up in columns (only when there is no OCR output)
+
+A page that none of the stages sends to detection is skipped. Each stage
+scores its evidence between 0 and 1, and a page is sent to detection as soon
+as a score reaches ``threshold``: lower thresholds trade speed for recall,
+and 0 never skips a page on layout grounds.
+"""
+import logging
+
+import cv2
+import numpy as np
+
+from instrumentation import profiler, stage
+
+logger = logging.getLogger(__name__)
+
+
+def downscale_gray(image, max_side=800):
+    """
+    Convert a PIL image or RGB array to grayscale, shrunk so its longer side is at most ``max_side``.
+    """
+    array = np.asarray(image)
+    gray = array if array.ndim == 2 else cv2.cvtColor(np.ascontiguousarray(array[:, :, :3]), cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+    scale = max_side / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def count_ruling_lines(gray, min_length_fraction=0.25):
+    """
+    Count the long horizontal and vertical lines of a grayscale page image.
+
+    Returns:
+        tuple: (horizontal lines, vertical lines).
+    """
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    height, width = mask.shape
+
+    # An opening with a long thin kernel keeps only lines at least that long
+    horizontal = cv2.morphologyEx(
+        mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, int(width * min_length_fraction)), 1))
+    )
+    vertical = cv2.morphologyEx(
+        mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(3, int(height * min_length_fraction / 4))))
+    )
+    horizontal_count = cv2.connectedComponents(horizontal)[0] - 1
+    vertical_count = cv2.connectedComponents(vertical)[0] - 1
+    return horizontal_count, vertical_count
+
+
+def count_aligned_rows(boxes, tolerance=0.01, min_columns=2):
+    """
+    Count the text lines whose boxes line up with the boxes of other lines in at least ``min_columns`` columns.
+
+    Args:
+        boxes: (N, 4) array of [x1, y1, x2, y2] boxes.
+        tolerance (float): Column alignment tolerance, as a fraction of the page width.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) < 2 * min_columns:
+        return 0
+
+    width = max(float(boxes[:, 2].max() - boxes[:, 0].min()), 1.0)
+    heights = boxes[:, 3] - boxes[:, 1]
+    line_height = max(float(np.median(heights)), 1.0)
+
+    # Group the boxes into text lines by their vertical centre
+    centres = (boxes[:, 1] + boxes[:, 3]) / 2
+    order = np.argsort(centres, kind="stable")
+    line_ids = np.zeros(len(boxes), dtype=np.int64)
+    line_ids[order] = np.cumsum(np.diff(centres[order], prepend=centres[order[0]]) > line_height / 2)
+
+    # Quantise left and right edges into alignment bins
+    bin_size = tolerance * width
+    edges = np.concatenate([
+        np.stack([line_ids, np.round(boxes[:, 0] / bin_size).astype(np.int64), np.zeros(len(boxes), np.int64)], 1),
+        np.stack([line_ids, np.round(boxes[:, 2] / bin_size).astype(np.int64), np.ones(len(boxes), np.int64)], 1),
+    ])
+    edges = np.unique(edges, axis=0)
+
+    # A column edge is shared by at least three lines
+    _, edge_ids, edge_counts = np.unique(edges[:, 1:], axis=0, return_inverse=True, return_counts=True)
+    shared = edge_counts[edge_ids.ravel()] >= 3
+
+    # Rows with boxes in several shared columns
+    columns_per_line = np.bincount(edges[shared, 0], minlength=line_ids.max() + 1)
+    boxes_per_line = np.bincount(line_ids)
+    return int(np.count_nonzero((columns_per_line >= min_columns) & (boxes_per_line >= min_columns)))
+
+
+def _ocr_boxes(ocr_records):
+    boxes = []
+    for record in ocr_records:
+        xs = [point[0] for point in record["position"]]
+        ys = [point[1] for point in record["position"]]
+        boxes.append([min(xs), min(ys), max(xs), max(ys)])
+    return boxes
+
+
+def _ink_boxes(gray):
+    """
+    Boxes of the phrases of a downscaled page image.
+
+    Gaps up to a few characters wide are closed, so a line of running text is
+    one box while table cells separated by wide gaps stay apart, like OCR lines.
+    """
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    words = cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_RECT, (max(5, gray.shape[1] // 80), 1)))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(words)
+    return [[x, y, x + w, y + h] for x, y, w, h, _ in stats[1:] if h >= 3]
+
+
+class TablePrefilter:
+    """
+    Decides whether a page is worth running table detection on.
+
+    Args:
+        threshold (float): Evidence score (0-1) at which a page is sent to detection.
+        skip_document_types (iterable): Page classifications that are never sent to detection.
+        max_side (int): Longer side of the downscaled image used by the image stages.
+        rows_for_table (int): Aligned rows (or ruling lines) that count as full evidence of a table.
+    """
+
+    def __init__(self, threshold=0.5, skip_document_types=("others",), max_side=800, rows_for_table=6):
+        self.threshold = threshold
+        self.skip_document_types = set(skip_document_types)
+        self.max_side = max_side
+        self.rows_for_table = rows_for_table
+
+    def _score(self, count):
+        return min(1.0, count / self.rows_for_table)
+
+    def check(self, image=None, ocr_records=None, document_type=None):
+        """
+        Run the cascade on one page.
+
+        Args:
+            image: The page image (PIL image or RGB array), or None.
+            ocr_records (list): The page's OCR records, or None.
+            document_type (str): The page's classification, or None.
+
+        Returns:
+            tuple: (run detection?, name of the deciding stage, score).
+        """
+        with stage("table_prefilter") as record:
+            detect, decided_by, score = self._run(image, ocr_records, document_type)
+            record["decided_by"] = decided_by
+            record["skipped"] = not detect
+        logger.debug("Table prefilter: %s by %s (score %.2f)", "detect" if detect else "skip", decided_by, score)
+        return detect, decided_by, score
+
+    def should_detect(self, image=None, ocr_records=None, document_type=None):
+        return self.check(image, ocr_records, document_type)[0]
+
+    def _run(self, image, ocr_records, document_type):
+        if document_type is not None and document_type in self.skip_document_types:
+            return False, "classification", 0.0
+
+        best = 0.0
+        if ocr_records:
+            score = self._score(count_aligned_rows(_ocr_boxes(ocr_records)))
+            if score >= self.threshold:
+                return True, "ocr_layout", score
+            best = max(best, score)
+
+        if image is None:
+            # Nothing cheaper to go on; leave the decision to the model
+            return True, "no_image", best
+
+        gray = downscale_gray(image, self.max_side)
+        horizontal, vertical = count_ruling_lines(gray)
+        score = self._score(horizontal + vertical / 2)
+        if score >= self.threshold:
+            return True, "ruling_lines", score
+        best = max(best, score)
+
+        if not ocr_records:
+            score = self._score(count_aligned_rows(_ink_boxes(gray)))
+            if score >= self.threshold:
+                return True, "image_layout", score
+            best = max(best, score)
+
+        return False, "layout", best
+
+
+def skip_report(records=None):
+    """
+    Count the pages each prefilter stage skipped or sent to detection.
+
+    Works on the profiler records, so it includes pages processed in worker processes.
+
+    Returns:
+        dict: {"pages", "skipped", "detected", "skipped_by": {stage: n}, "detected_by": {stage: n}}.
+    """
+    if records is None:
+        # A copy, since stages of other threads may be adding records meanwhile
+        records = profiler.snapshot()
+    report = {"pages": 0, "skipped": 0, "detected": 0, "skipped_by": {}, "detected_by": {}}
+    for record in records:
+        if record.get("stage") != "table_prefilter":
+            continue
+        report["pages"] += 1
+        key = "skipped" if record["skipped"] else "detected"
+        report[key] += 1
+        by = report[f"{key}_by"]
+        by[record["decided_by"]] = by.get(record["decided_by"], 0) + 1
+    return report
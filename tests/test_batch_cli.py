@@ -0,0 +1,96 @@
+import json
+
+import fitz
+import pytest
+
+import batch_cli
+from instrumentation import profiler, stage
+
+
+def make_pdf(path, pages=1):
+    with fitz.open() as document:
+        for _ in range(pages):
+            document.new_page()
+        document.save(str(path))
+    return str(path)
+
+
+def fake_process_document(pdf_path, output_dir=None, **options):
+    with fitz.open(pdf_path) as document:
+        for number in range(document.page_count):
+            with stage("ocr", page=f"page_{number + 1}"):
+                pass
+            yield {"page": f"page_{number + 1}", "classification": "bank_statement",
+                   "checksum_errors": [], "duplicate_of": None}
+
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    monkeypatch.setattr(batch_cli, "process_document", fake_process_document)
+    profiler.reset()
+    yield
+    profiler.reset()
+
+
+def test_single_worker_keeps_the_profile(tmp_path, fake_pipeline):
+    pdf_path = make_pdf(tmp_path / "statement.pdf", pages=3)
+    profile_path = tmp_path / "profile.json"
+
+    assert batch_cli.main([pdf_path, "--output", str(tmp_path / "out"), "--workers", "1",
+                           "--profile", str(profile_path)]) == 0
+    with open(profile_path, encoding="utf-8") as profile_file:
+        report = json.load(profile_file)
+    assert report["stages"]["ocr"]["calls"] == 3
+    assert len(report["records"]) == 3
+
+
+def test_missing_document_fails_without_aborting_the_batch(tmp_path, fake_pipeline):
+    pdf_path = make_pdf(tmp_path / "statement.pdf")
+    list_path = tmp_path / "documents.txt"
+    list_path.write_text("missing.pdf\nstatement.pdf\n", encoding="utf-8")
+    output_root = str(tmp_path / "out")
+
+    assert batch_cli.main([str(list_path), "--output", output_root]) == 1
+    documents = batch_cli.load_manifest(output_root)["documents"]
+    assert documents[str(tmp_path / "missing.pdf")]["status"] == "failed"
+    assert "No such file" in documents[str(tmp_path / "missing.pdf")]["error"]
+    assert documents[pdf_path]["status"] == "done"
+
+
+def test_rerun_skips_done_documents_and_resumes_changed_ones(tmp_path, fake_pipeline):
+    first = make_pdf(tmp_path / "first.pdf", pages=2)
+    second = make_pdf(tmp_path / "second.pdf", pages=1)
+    output_root = str(tmp_path / "out")
+
+    manifest = batch_cli.run_batch([first, second], output_root)
+    assert [entry["status"] for entry in manifest["documents"].values()] == ["done", "done"]
+    assert batch_cli.plan_documents([first, second], batch_cli.load_manifest(output_root), output_root) == []
+
+    make_pdf(tmp_path / "second.pdf", pages=4)
+    manifest = batch_cli.load_manifest(output_root)
+    # Changed documents are processed again, largest first
+    assert batch_cli.plan_documents([first, second], manifest, output_root) == [second]
+
+
+@pytest.mark.parametrize("flags", [["--save-images"], ["--table-prefilter", "0.5"], ["--dedup-dir", "index"]])
+def test_incremental_rejects_options_it_cant_honour(tmp_path, flags):
+    with pytest.raises(SystemExit) as error:
+        batch_cli.main([str(tmp_path), "--incremental", *flags])
+    assert error.value.code == 2
+
+
+def test_incremental_passes_the_render_options_on(tmp_path, monkeypatch, fake_pipeline):
+    import incremental
+
+    received = {}
+
+    def fake_incremental(pdf_path, output_dir=None, **options):
+        received.update(options)
+        return fake_process_document(pdf_path, output_dir)
+
+    monkeypatch.setattr(incremental, "process_document_incremental", fake_incremental)
+    pdf_path = make_pdf(tmp_path / "statement.pdf")
+    assert batch_cli.main([pdf_path, "--output", str(tmp_path / "out"), "--incremental",
+                           "--render-mode", "adaptive", "--ocr-cache-dir", str(tmp_path / "cache")]) == 0
+    assert received["render_mode"] == "adaptive"
+    assert received["ocr_cache_dir"] == str(tmp_path / "cache")
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+import model_registry
+from benchmarks import run_benchmarks as benchmarks
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    """
+    Keep the stand-in models registered by the benchmarks out of the other tests.
+    """
+    monkeypatch.setattr(model_registry, "_models", {})
+
+
+def test_run_benchmarks_with_stand_ins():
+    results = benchmarks.run_benchmarks(["bank_statement"], pages=1, table_density=1.0, repeat=1)
+
+    stages = results["bank_statement"]
+    expected = [stage for stage in benchmarks.STAGES if stage in stages]
+    assert expected == list(stages)
+    assert {"pdf_to_images", "perform_ocr", "classify_document", "extract_key_values",
+            "checksum_validator"} <= set(stages)
+
+    for stats in stages.values():
+        assert stats["runs"] == 1
+        assert stats["p50_seconds"] > 0
+        assert stats["pages_per_second"] > 0
+
+
+def test_main_writes_results_and_compares_with_baseline(tmp_path):
+    output_path = tmp_path / "results.json"
+    argv = ["--kinds", "check", "--pages", "1", "--repeat", "1", "--skip-tables", "--output", str(output_path)]
+
+    assert benchmarks.main(argv) == 0
+
+    report = json.loads(output_path.read_text(encoding="utf-8"))
+    assert report["config"]["stand_ins"] is True
+    assert "extract_tables_from_images" not in report["results"]["check"]
+
+    # A baseline that was far faster flags every stage as a regression
+    baseline = {"results": {"check": {
+        stage: dict(stats, p50_seconds=stats["p50_seconds"] / 100)
+        for stage, stats in report["results"]["check"].items()
+    }}}
+    baseline_path = tmp_path / "baseline.json"
+    baseline_path.write_text(json.dumps(baseline), encoding="utf-8")
+
+    assert benchmarks.main(argv + ["--baseline", str(baseline_path)]) == 1
@@ -0,0 +1,169 @@
+import re
+import time
+
+import pytest
+
+from checksum_validator import (
+    TransactionRowParser,
+    extract_transaction_rows,
+    extract_transaction_rows_from_lines,
+    to_cents,
+    tokenize,
+    validate_balance,
+    validate_transactions,
+)
+from pipeline import validate_in_order
+
+# The pattern extract_transaction_rows used before the row parser
+LEGACY_PATTERN = re.compile(
+    r"(\d{2}/\d{2}/\d{4})\s+([A-Za-z\s]+)\s+([\d,\.]+)?\s+([\d,\.]+)?\s+([\d,\.]+)", re.IGNORECASE
+)
+
+
+def legacy_rows(page_text):
+    return [
+        (date, description.strip(), amount1, balance)
+        for date, description, amount1, _, balance in LEGACY_PATTERN.findall(page_text)
+    ]
+
+
+def parsed_rows(page_text):
+    return [
+        (date, description, amounts[0], amounts[-1])
+        for date, description, amounts in TransactionRowParser().feed(page_text).close()
+    ]
+
+
+SAMPLE_ROWS = [
+    "01/01/2024 opening deposit credit 1,000.00 0.00 1,000.00",
+    "05/01/2024 salary credit 3,500.00 0.00 4,500.00",
+    "09/01/2024 grocery store debit 415.20 0.00 4,084.80",
+    "15/01/2024 utility bill debit 250.30 0.00 3,834.50",
+    "20/01/2024 atm withdrawal debit 1,000 0 2,834.50",
+]
+
+
+@pytest.mark.parametrize("separator", ["\n", " "])
+def test_parser_matches_the_legacy_regex_on_three_amount_rows(separator):
+    page_text = "statement of account\n" + separator.join(SAMPLE_ROWS) + "\nclosing balance 2,834.50"
+    assert parsed_rows(page_text) == legacy_rows(page_text)
+    assert len(parsed_rows(page_text)) == len(SAMPLE_ROWS)
+
+
+def test_transactions_match_the_legacy_regex():
+    page_text = "\n".join(SAMPLE_ROWS)
+    transactions = extract_transaction_rows(page_text)
+    assert [(t["date"], t["description"], t["credit"], t["debit"], t["balance"]) for t in transactions] == [
+        ("01/01/2024", "opening deposit credit", 1000.0, 0.0, 1000.0),
+        ("05/01/2024", "salary credit", 3500.0, 0.0, 4500.0),
+        ("09/01/2024", "grocery store debit", 0.0, 415.2, 4084.8),
+        ("15/01/2024", "utility bill debit", 0.0, 250.3, 3834.5),
+        ("20/01/2024", "atm withdrawal debit", 0.0, 1000.0, 2834.5),
+    ]
+
+
+def test_two_amount_rows_take_the_whole_next_token():
+    # The legacy regex took "03" from the next row's date as the balance of the first row
+    page_text = "02/01/2024 salary credit 100.00 1,100.00\n03/01/2024 card payment debit 10.00 1,090.00"
+    assert legacy_rows(page_text)[0][3] == "03"
+    assert parsed_rows(page_text) == [
+        ("02/01/2024", "salary credit", "100.00", "1,100.00"),
+        ("03/01/2024", "card payment debit", "10.00", "1,090.00"),
+    ]
+
+
+def test_balance_only_and_negative_rows():
+    transactions = extract_transaction_rows(
+        "01/02/2024 balance forward 500.00\n02/02/2024 card payment debit 600.00 -100.00"
+    )
+    assert transactions[0] == {"date": "01/02/2024", "description": "balance forward",
+                               "credit": 0.0, "debit": 0.0, "balance": 500.0}
+    assert transactions[1]["debit"] == 600.0
+    assert transactions[1]["balance"] == -100.0
+
+
+def test_partial_tokens_are_not_amounts():
+    assert [kind for kind, _ in tokenize("01/02/2024 ref#12 1,000.00 12abc -5")] == [
+        "date", "other", "amount", "other", "amount"
+    ]
+    # A token that isn't part of a row ends it
+    assert parsed_rows("01/02/2024 salary credit ref#12 100.00 200.00") == []
+
+
+def test_lines_and_joined_text_give_the_same_rows():
+    lines = ["05/01/2024 salary", "credit 3,500.00 0.00", "4,500.00", "09/01/2024 grocery debit 15.20 0.00 4,484.80"]
+    assert extract_transaction_rows_from_lines(lines) == extract_transaction_rows(" ".join(lines))
+
+
+def test_whitespace_heavy_text_parses_in_linear_time():
+    row = "01/01/2024 " + "word " * 50 + " " * 2000 + "1.00"
+    start = time.perf_counter()
+    rows = extract_transaction_rows("\n".join([row] * 100))
+    assert time.perf_counter() - start < 2.0
+    assert len(rows) == 100
+
+
+def transaction(credit=0.0, debit=0.0, balance=0.0, date="01/01/2024", description="row"):
+    return {"date": date, "description": description, "credit": credit, "debit": debit, "balance": balance}
+
+
+@pytest.mark.parametrize("amount, cents", [
+    ("1,234.56", 123456), (0.1 + 0.2, 30), ("2.675", 268), (-0.005, -1), (1000, 100000), ("0", 0),
+])
+def test_to_cents_is_exact(amount, cents):
+    assert to_cents(amount) == cents
+
+
+def test_many_small_amounts_add_up_exactly():
+    # Float sums drift after a few hundred rows of 0.10; cent arithmetic does not
+    transactions = []
+    balance = 0
+    for _ in range(1000):
+        balance += 10
+        transactions.append(transaction(credit=0.1, balance=balance / 100))
+    assert validate_balance(transactions, 0.0) == []
+
+
+def test_every_mismatching_row_is_reported():
+    transactions = [
+        transaction(credit=100.0, balance=200.0),
+        transaction(debit=50.0, balance=140.0),
+        transaction(debit=40.0, balance=100.0),
+        transaction(credit=10.0, balance=120.0),
+    ]
+    errors = validate_balance(transactions, 100.0)
+    # The running balance is computed from the amounts, not from the stated balances
+    assert [(error["row"], error["calculated_balance"]) for error in errors] == [(2, 150.0), (3, 110.0)]
+
+
+def test_balance_carries_over_to_pages_without_an_opening_balance():
+    first = [transaction(credit=100.0, balance=1100.0), transaction(debit=50.0, balance=1050.0)]
+    second = [transaction(debit=25.5, balance=1024.5)]
+
+    errors, closing = validate_transactions(first, 1000.0)
+    assert (errors, closing) == ([], 1050.0)
+    assert validate_transactions(second, None, closing) == ([], 1024.5)
+    # A stated opening balance wins over the carried one
+    errors, _ = validate_transactions(second, 2000.0, closing)
+    assert [error["row"] for error in errors] == [1]
+
+
+def test_pages_without_any_balance_still_carry_their_last_balance():
+    assert validate_transactions([transaction(balance=75.0)], None, None) == (None, 75.0)
+    assert validate_transactions([], None, None) == (None, None)
+    assert validate_transactions([], 10.0) == ([], 10.0)
+
+
+def test_pages_are_validated_in_order():
+    pages = [
+        {"page": "page_1", "classification": "bank_statement", "opening_balance": 1000.0,
+         "transactions": [transaction(credit=100.0, balance=1100.0)]},
+        {"page": "page_2", "classification": "others", "opening_balance": None, "transactions": None},
+        {"page": "page_3", "classification": "bank_statement", "opening_balance": None,
+         "transactions": [transaction(debit=100.0, balance=1000.0)]},
+        {"page": "page_4", "classification": "bank_statement", "opening_balance": None,
+         "transactions": [transaction(debit=1.0, balance=998.0)]},
+    ]
+    results = list(validate_in_order(pages))
+    assert [result.get("checksum_errors") for result in results[:3]] == [[], None, []]
+    assert [error["row"] for error in results[3]["checksum_errors"]] == [1]
@@ -0,0 +1,76 @@
+import json
+import os
+import random
+import re
+
+import pytest
+
+from classify_document import DEFAULT_KEYWORDS, KeywordClassifier, classify_page_text, load_keyword_config
+from ocr import get_page_text
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def baseline_scores(page_text, keywords=DEFAULT_KEYWORDS):
+    """
+    The classifier before KeywordClassifier: one regex search per keyword.
+    """
+    return {
+        category: sum(len(re.findall(r"\b" + re.escape(word) + r"\b", page_text)) for word in words)
+        for category, words in keywords.items()
+    }
+
+
+def baseline_classify(page_text, keywords=DEFAULT_KEYWORDS):
+    scores = baseline_scores(page_text, keywords)
+    if all(count == 0 for count in scores.values()):
+        return "others"
+    return max(scores, key=scores.get)
+
+
+def test_sample_document_matches_the_baseline():
+    with open(os.path.join(DATA_DIR, "ocr_results.json"), encoding="utf-8") as ocr_file:
+        pages = json.load(ocr_file)
+    classifier = KeywordClassifier(DEFAULT_KEYWORDS)
+    for page in pages.values():
+        page_text = get_page_text(page)
+        assert classifier.score(page_text) == baseline_scores(page_text)
+        assert classify_page_text(page_text) == baseline_classify(page_text)
+
+
+def test_random_texts_match_the_baseline():
+    keywords = {
+        **DEFAULT_KEYWORDS,
+        # Keywords that overlap or contain each other
+        "overlapping": ["account", "account number number", "pay", "salary slip", "slip"],
+    }
+    vocabulary = [word for words in keywords.values() for keyword in words for word in keyword.split()]
+    vocabulary += ["the", "accounts", "payee", "netsalary", "number", "-", "statement's", "\n"]
+    classifier = KeywordClassifier(keywords)
+    rng = random.Random(7)
+    for _ in range(300):
+        page_text = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 60)))
+        assert classifier.score(page_text) == baseline_scores(page_text, keywords), page_text
+        assert classifier.classify(page_text) == baseline_classify(page_text, keywords)
+
+
+def test_weighted_keywords(tmp_path):
+    config_path = tmp_path / "keywords.json"
+    config_path.write_text(json.dumps({
+        "invoice": {"invoice number": 3, "amount due": 1},
+        "bank_statement": ["balance", "statement"],
+    }), encoding="utf-8")
+    classifier = load_keyword_config(str(config_path))
+    assert classifier.score("invoice number 12 balance statement balance") == {"invoice": 3.0, "bank_statement": 3.0}
+    assert classifier.classify("invoice number 12, amount due, balance") == "invoice"
+    assert classifier.classify("nothing relevant") == "others"
+
+
+@pytest.mark.parametrize("page_text, category", [
+    ("account number 123 statement of transaction balance", "bank_statement"),
+    ("pay to the order of john memo authorized signature", "check"),
+    ("net salary gross salary employee employer", "salary_slip"),
+    ("", "others"),
+])
+def test_default_categories(page_text, category):
+    assert classify_page_text(page_text) == category
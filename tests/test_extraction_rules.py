@@ -0,0 +1,151 @@
+import json
+import os
+import random
+import re
+
+import pytest
+
+from extraction_rules import DEFAULT_RULES_PATH, RuleSet, label_part, load_rules
+from key_value_extractor import extract_key_values_from_page
+from ocr import get_page_text
+from spatial_index import SpatialIndex
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+with open(DEFAULT_RULES_PATH, encoding="utf-8") as rules_file:
+    DEFAULT_RULES = json.load(rules_file)
+
+
+def baseline_extract(rules, page_text):
+    """
+    Extraction before RuleSet: one re.search per field, keeping its first match.
+    """
+    found = {}
+    for field, pattern in rules.items():
+        match = re.search(pattern, page_text, re.IGNORECASE)
+        if match:
+            found[field] = match.group(1)
+    return found
+
+
+@pytest.mark.parametrize("document_type", sorted(DEFAULT_RULES))
+def test_sample_document_matches_the_baseline(document_type):
+    with open(os.path.join(DATA_DIR, "ocr_results.json"), encoding="utf-8") as ocr_file:
+        pages = json.load(ocr_file)
+    rule_set = RuleSet(DEFAULT_RULES[document_type])
+    for page in pages.values():
+        page_text = get_page_text(page)
+        assert rule_set.extract(page_text) == baseline_extract(DEFAULT_RULES[document_type], page_text)
+
+
+@pytest.mark.parametrize("document_type", sorted(DEFAULT_RULES))
+def test_random_texts_match_the_baseline(document_type):
+    rules = DEFAULT_RULES[document_type]
+    rule_set = RuleSet(rules)
+    vocabulary = ["opening", "balance", "account", "number", "check", "date", "pay", "to", "the", "order",
+                  "of", "employee", "net", "gross", "salary", "deductions", ":", "1,234.50", "12/01/2024",
+                  "abc123", "\n", "-", "x"]
+    rng = random.Random(document_type)
+    for _ in range(300):
+        page_text = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 40)))
+        assert rule_set.extract(page_text) == baseline_extract(rules, page_text), page_text
+
+
+def test_each_field_keeps_its_first_match():
+    rule_set = RuleSet(DEFAULT_RULES["bank_statement"])
+    # "balance" first matches inside "opening balance", as a plain search would
+    assert rule_set.extract("opening balance 100.00 closing balance 250.00 account number 42") == {
+        "account_number": "42", "total_balance": "100.00", "opening_balance": "100.00",
+    }
+    assert list(rule_set.extract("balance 1 account number 2")) == ["account_number", "total_balance"]
+
+
+def test_fields_starting_at_the_same_position():
+    rule_set = RuleSet({"short": r"total[:\s]*(\d+)", "long": r"total due[:\s]*(\d+)", "any": r"(t\w+)"})
+    assert rule_set.extract("total due 30 total 40") == {"short": "40", "long": "30", "any": "total"}
+
+
+@pytest.mark.parametrize("pattern, label", [
+    (r"net salary[:\s]*([\d,\.]+)", r"net salary[:\s]*"),
+    (r"(?:opening|closing) balance[:\s]*([\d,\.]+)", r"(?:opening|closing) balance[:\s]*"),
+    (r"total \(usd\)[:\s]*([\d,\.]+)", r"total \(usd\)[:\s]*"),
+    (r"date[(:]\s*([\w/]+)", r"date[(:]\s*"),
+    (r"([\d,\.]+) due", ""),
+])
+def test_label_part(pattern, label):
+    assert label_part(pattern) == label
+
+
+def test_load_rules_is_cached_until_the_file_changes(tmp_path):
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(json.dumps({"invoice": {"number": r"invoice no[:\s]*(\d+)"}}), encoding="utf-8")
+    first = load_rules(str(rules_path))
+    assert load_rules(str(rules_path)) is first
+
+    rules_path.write_text(json.dumps({"invoice": {"total": r"total[:\s]*(\d+)"}}), encoding="utf-8")
+    os.utime(rules_path, (os.path.getmtime(rules_path) + 5,) * 2)
+    assert load_rules(str(rules_path))["invoice"].fields == ["total"]
+
+
+def page(*boxes):
+    """
+    Build a SpatialIndex and the joined page text from (text, [x1, y1, x2, y2]) boxes.
+    """
+    texts = [text for text, _ in boxes]
+    index = SpatialIndex([box for _, box in boxes], texts)
+    return index, " ".join(text.lower() for text in texts)
+
+
+def test_value_right_of_its_label():
+    # Two label/value columns: the joined text puts the second label before the first value
+    index, page_text = page(("Net Salary", [0, 0, 100, 20]), ("Gross Salary", [300, 0, 400, 20]),
+                            ("4,100.00", [120, 0, 200, 20]), ("5,000.00", [420, 0, 500, 20]))
+    rule_set = RuleSet(DEFAULT_RULES["salary_slip"])
+    assert rule_set.extract(page_text) == {"gross_salary": "4,100.00"}
+    assert rule_set.extract_from_index(index, page_text) == {"net_salary": "4,100.00", "gross_salary": "5,000.00"}
+
+
+def test_value_below_its_label():
+    index, page_text = page(("Opening Balance", [0, 0, 120, 20]), ("Account Number", [300, 0, 420, 20]),
+                            ("2,000.00", [0, 24, 80, 44]), ("0123456789", [300, 24, 400, 44]))
+    assert RuleSet(DEFAULT_RULES["bank_statement"]).extract_from_index(index, page_text) == {
+        "account_number": "0123456789", "total_balance": "2,000.00", "opening_balance": "2,000.00",
+    }
+
+
+def test_value_in_the_label_box_wins():
+    index, page_text = page(("Net Salary: 4,100.00", [0, 0, 200, 20]), ("9,999.99", [220, 0, 300, 20]))
+    assert RuleSet(DEFAULT_RULES["salary_slip"]).extract_from_index(index, page_text) == {"net_salary": "4,100.00"}
+
+
+@pytest.mark.parametrize("neighbour", ["06 3167 10781391", "$401.22 CR", "1,000.00 due"])
+def test_neighbour_must_be_the_whole_value(neighbour):
+    index, page_text = page(("Account Number", [0, 0, 120, 20]), ("Balance", [0, 40, 120, 60]),
+                            (neighbour, [200, 0, 320, 20]), (neighbour, [200, 40, 320, 60]))
+    rule_set = RuleSet(DEFAULT_RULES["bank_statement"])
+    # Nothing is read from a box the value pattern only covers part of; the text search still runs
+    assert rule_set.extract_from_index(index, page_text) == rule_set.extract(page_text)
+
+
+def test_sample_pages_only_read_whole_boxes():
+    with open(os.path.join(DATA_DIR, "ocr_results.json"), encoding="utf-8") as ocr_file:
+        pages = json.load(ocr_file)
+    rule_set = RuleSet(DEFAULT_RULES["bank_statement"])
+    texts = {page_name: [record["text"].lower() for record in records] for page_name, records in pages.items()}
+    for page_name, records in pages.items():
+        page_text = get_page_text(records)
+        from_text = rule_set.extract(page_text)
+        for field, value in rule_set.extract_from_index(SpatialIndex.from_records(records), page_text).items():
+            assert value == from_text.get(field) or value in texts[page_name], (page_name, field, value)
+
+    # The account number of page 4 is followed by a spaced number the rule can't read whole
+    page_text = get_page_text(pages["page_4"])
+    assert "account_number" not in rule_set.extract_from_index(SpatialIndex.from_records(pages["page_4"]), page_text)
+
+
+def test_pages_without_rules_build_no_index(monkeypatch):
+    built = []
+    monkeypatch.setattr(SpatialIndex, "from_records", classmethod(lambda cls, records: built.append(records)))
+    records = [{"text": "Net Salary", "confidence": 1.0, "position": [[0, 0], [1, 0], [1, 1], [0, 1]]}]
+    assert extract_key_values_from_page("net salary", "others", page_records=records) == {}
+    assert not built
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+from fuzzy_matching import FuzzyMatcher, fuzzy_match
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+KEYWORDS = ["credit", "debit", "Balance", "withdrawal"]
+
+
+def baseline_match(keywords, text, threshold):
+    """
+    The matching before FuzzyMatcher: one scalar fuzzy_match per keyword.
+    """
+    return tuple(fuzzy_match(keyword, text, threshold) for keyword in keywords)
+
+
+def mutate(rng, word):
+    """
+    Misspell a word the way OCR does: drop, swap or replace a character, or glue a neighbour on.
+    """
+    characters = list(word)
+    position = rng.randrange(len(characters))
+    operation = rng.choice(["drop", "replace", "swap", "glue", "keep"])
+    if operation == "drop" and len(characters) > 1:
+        del characters[position]
+    elif operation == "replace":
+        characters[position] = rng.choice("abcdeilmortx019")
+    elif operation == "swap" and position + 1 < len(characters):
+        characters[position], characters[position + 1] = characters[position + 1], characters[position]
+    elif operation == "glue":
+        characters.append(rng.choice(["s", "ed", "/", "2024"]))
+    return "".join(characters)
+
+
+def random_texts(seed, count=300):
+    rng = random.Random(seed)
+    vocabulary = KEYWORDS + ["card", "payment", "salary", "transfer", "store", "deposit", "cr", "dr", "1,234.50"]
+    return [
+        " ".join(mutate(rng, rng.choice(vocabulary)) for _ in range(rng.randint(0, 6))).upper()
+        if rng.random() < 0.1 else
+        " ".join(mutate(rng, rng.choice(vocabulary)) for _ in range(rng.randint(0, 6)))
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("threshold", [0, 50, 70, 80, 90, 100])
+def test_matches_the_scalar_baseline(threshold):
+    texts = random_texts(threshold)
+    matcher = FuzzyMatcher(KEYWORDS, threshold)
+    # Texts one at a time and in batches, repeated so the memos are used
+    assert [matcher.match(text) for text in texts] == [baseline_match(KEYWORDS, text, threshold) for text in texts]
+    assert matcher.match_many(texts + texts[::-1]) == [baseline_match(KEYWORDS, text, threshold)
+                                                       for text in texts + texts[::-1]]
+
+
+def test_scores_equal_to_the_cutoff_match():
+    words = {mutate(random.Random(seed), keyword) for seed in range(500) for keyword in KEYWORDS}
+    ties = [(keyword, word) for keyword in KEYWORDS for word in words
+            if fuzz.partial_ratio(keyword.lower(), word) == 80]
+    assert ties
+    matcher = FuzzyMatcher(KEYWORDS, 80)
+    for keyword, word in ties:
+        assert fuzzy_match(keyword, word, 80)
+        assert matcher.match(word)[KEYWORDS.index(keyword)]
+
+
+def test_memo_resets_keep_the_results():
+    texts = random_texts(1)
+    expected = [baseline_match(KEYWORDS, text, 80) for text in texts]
+    assert FuzzyMatcher(KEYWORDS, 80, max_cache_size=5).match_many(texts) == expected
+
+    matcher = FuzzyMatcher(KEYWORDS, 80, max_cache_size=5)
+    for text, matches in zip(texts, expected):
+        assert matcher.match(text) == matches
+        # A memo is reset before it would outgrow its size, so it holds at most one text's words more
+        assert len(matcher._word_matches) <= 5 + 6
+        assert len(matcher._text_matches) <= 5
+
+
+def test_sample_statement_descriptions():
+    with open(os.path.join(DATA_DIR, "ocr_results.json"), encoding="utf-8") as ocr_file:
+        pages = json.load(ocr_file)
+    texts = [record["text"] for records in pages.values() for record in records]
+    matcher = FuzzyMatcher(["credit", "debit"], 80)
+    assert matcher.match_many(texts) == [baseline_match(["credit", "debit"], text, 80) for text in texts]
+
+
+def test_empty_texts():
+    matcher = FuzzyMatcher(KEYWORDS)
+    assert matcher.match("") == (False,) * len(KEYWORDS)
+    assert matcher.match_many([]) == []
@@ -0,0 +1,143 @@
+import json
+
+import fitz
+import pytest
+
+import incremental
+from benchmarks.synthetic_documents import generate_document
+from classify_document import DEFAULT_KEYWORDS
+from extraction_rules import DEFAULT_RULES_PATH
+from incremental import process_document_incremental
+
+
+@pytest.fixture
+def statement(tmp_path):
+    pdf_path = str(tmp_path / "statement.pdf")
+    generate_document("bank_statement", pdf_path, pages=2, table_density=0.0, seed=3)
+    return pdf_path
+
+
+def run(pdf_path, output_dir, **options):
+    options = {"text_mode": "hybrid", "extract_tables": False, **options}
+    return {result["page"]: result["recomputed"]
+            for result in process_document_incremental(pdf_path, output_dir=output_dir, **options)}
+
+
+def test_unchanged_rerun_recomputes_nothing(statement, tmp_path):
+    output_dir = str(tmp_path / "out")
+    first = run(statement, output_dir)
+    assert first["page_1"] == ["ocr", "classify", "key_values", "transactions"]
+    assert run(statement, output_dir) == {"page_1": [], "page_2": []}
+
+
+@pytest.mark.parametrize("options", [{"deskew": True}, {"binarize": True}, {"render_mode": "adaptive"},
+                                     {"zoom": 3}, {"text_mode": "ocr"}])
+def test_ocr_settings_are_part_of_the_ocr_fingerprint(options):
+    base = incremental.stage_configs(2, "en", "hybrid", False, None, None)
+    arguments = {"zoom": 2, "language": "en", "text_mode": "hybrid", "quantize_tables": False,
+                 "keywords_path": None, "rules_path": None, **options}
+    changed = incremental.stage_configs(**arguments)
+    assert changed["ocr"] != base["ocr"]
+    assert changed["key_values"] == base["key_values"]
+
+
+def test_layout_zoom_only_matters_in_adaptive_mode():
+    full = incremental.stage_configs(2, "en", "ocr", False, None, None, layout_zoom=0.5)
+    assert full == incremental.stage_configs(2, "en", "ocr", False, None, None)
+    adaptive = incremental.stage_configs(2, "en", "ocr", False, None, None, render_mode="adaptive")
+    assert adaptive["ocr"] != incremental.stage_configs(
+        2, "en", "ocr", False, None, None, render_mode="adaptive", layout_zoom=0.5
+    )["ocr"]
+
+
+def test_preprocessing_change_reruns_ocr_only(statement, tmp_path):
+    output_dir = str(tmp_path / "out")
+    run(statement, output_dir)
+    # The text layer reads the same, so the text stages downstream stay fresh
+    assert run(statement, output_dir, deskew=True) == {"page_1": ["ocr"], "page_2": ["ocr"]}
+    assert run(statement, output_dir, deskew=True) == {"page_1": [], "page_2": []}
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+    return str(path)
+
+
+def test_rules_change_reruns_key_values_only(statement, tmp_path):
+    output_dir = str(tmp_path / "out")
+    run(statement, output_dir)
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as rules_file:
+        rules = json.load(rules_file)
+    rules["bank_statement"]["statement_period"] = r"statement period[:\s]*([\w/ -]+)"
+    rules_path = write_json(tmp_path / "rules.json", rules)
+
+    assert run(statement, output_dir, rules_path=rules_path) == {"page_1": ["key_values"], "page_2": ["key_values"]}
+    assert run(statement, output_dir, rules_path=rules_path) == {"page_1": [], "page_2": []}
+
+
+def test_keywords_change_reruns_classification(statement, tmp_path):
+    output_dir = str(tmp_path / "out")
+    first = list(process_document_incremental(statement, output_dir=output_dir, text_mode="hybrid",
+                                              extract_tables=False))
+
+    # Same type for every page: nothing downstream of classification re-runs
+    keywords = {**DEFAULT_KEYWORDS, "bank_statement": DEFAULT_KEYWORDS["bank_statement"] + ["closing"]}
+    keywords_path = write_json(tmp_path / "keywords.json", keywords)
+    assert run(statement, output_dir, keywords_path=keywords_path) == {"page_1": ["classify"],
+                                                                       "page_2": ["classify"]}
+
+    # A type change re-runs the stages that depend on it
+    keywords_path = write_json(tmp_path / "other.json", {"salary_slip": ["account number", "balance"]})
+    results = list(process_document_incremental(statement, output_dir=output_dir, text_mode="hybrid",
+                                                extract_tables=False, keywords_path=keywords_path))
+    assert [result["classification"] for result in results] == ["salary_slip", "salary_slip"]
+    assert [result["recomputed"] for result in results] == [["classify", "key_values", "transactions"]] * 2
+    assert all(result["transactions"] is None for result in results)
+    assert first[0]["transactions"] is not None
+
+
+def test_force_reruns_the_stage(statement, tmp_path):
+    output_dir = str(tmp_path / "out")
+    run(statement, output_dir)
+    assert run(statement, output_dir, force=["key_values"]) == {"page_1": ["key_values"], "page_2": ["key_values"]}
+    assert run(statement, output_dir, force=["ocr"]) == {"page_1": ["ocr"], "page_2": ["ocr"]}
+    with pytest.raises(ValueError):
+        run(statement, output_dir, force=["layout"])
+
+
+def test_code_change_reruns_its_stage(statement, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "out")
+    run(statement, output_dir)
+    versions = incremental.code_versions()
+    monkeypatch.setattr(incremental, "code_versions", lambda: {**versions, "transactions": "changed"})
+    assert run(statement, output_dir) == {"page_1": ["transactions"], "page_2": ["transactions"]}
+
+
+def test_changed_page_is_the_only_one_rerun(statement, tmp_path):
+    output_dir = str(tmp_path / "out")
+    run(statement, output_dir)
+    with fitz.open(statement) as document:
+        document[1].insert_text((60, 800), "Thank you for banking with us", fontsize=8)
+        document.save(statement, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+
+    # The text differs, so every stage of page 2 runs again
+    assert run(statement, output_dir) == {"page_1": [],
+                                          "page_2": ["ocr", "classify", "key_values", "transactions"]}
+
+
+def test_missing_result_file_is_recomputed(statement, tmp_path):
+    output_dir = tmp_path / "out"
+    run(statement, str(output_dir))
+    (output_dir / "key_value_extraction_result.json").unlink()
+    assert run(statement, str(output_dir)) == {"page_1": ["key_values"], "page_2": ["key_values"]}
+
+
+def test_binary_results_are_reused(statement, tmp_path):
+    output_dir = str(tmp_path / "out")
+    first = list(process_document_incremental(statement, output_dir=output_dir, text_mode="hybrid",
+                                              extract_tables=False, storage_format="binary"))
+    second = list(process_document_incremental(statement, output_dir=output_dir, text_mode="hybrid",
+                                               extract_tables=False, storage_format="binary"))
+    assert [result["recomputed"] for result in second] == [[], []]
+    assert [result["key_values"] for result in second] == [result["key_values"] for result in first]
@@ -0,0 +1,49 @@
+from instrumentation import Profiler
+
+
+def test_max_records_keeps_the_summary_complete():
+    profiler = Profiler(max_records=10)
+    for page in range(25):
+        with profiler.stage("ocr", page=f"page_{page}", items=2):
+            pass
+    profiler.merge([dict(profiler.records[-1], stage="render")] * 5)
+
+    assert len(profiler.records) <= 10
+    summary = profiler.summary()
+    assert summary["ocr"]["calls"] == 25
+    assert summary["ocr"]["items"] == 50
+    assert summary["render"]["calls"] == 5
+
+    profiler.reset()
+    assert profiler.summary() == {}
+
+
+def test_take_records_drains():
+    profiler = Profiler()
+    with profiler.stage("classify"):
+        pass
+    assert [record["stage"] for record in profiler.take_records()] == ["classify"]
+    assert profiler.records == []
+
+
+def test_memory_fields():
+    import tracemalloc
+
+    was_tracing = tracemalloc.is_tracing()
+    profiler = Profiler(trace_python_memory=True)
+    try:
+        with profiler.stage("big"):
+            data = bytearray(20 * 1024 * 1024)
+            del data
+        with profiler.stage("small"):
+            data = bytearray(1024)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    big, small = profiler.records
+    # The Python peak is the stage's own, the RSS peak is the process's so far
+    assert big["python_peak_bytes"] >= 20 * 1024 * 1024 > small["python_peak_bytes"]
+    assert small["process_peak_rss_bytes"] >= big["process_peak_rss_bytes"] > 0
+    assert "stage_process_peak_rss_bytes" in profiler.to_prometheus()
+    assert profiler.summary()["small"]["process_peak_rss_bytes"] == small["process_peak_rss_bytes"]
@@ -0,0 +1,109 @@
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+import model_registry
+import ocr_cache
+from ocr_cache import OCRCache
+
+RECORDS = [{"text": "Closing Balance 1,234.50", "confidence": 0.98,
+            "position": [[0, 0], [100, 0], [100, 12], [0, 12]]}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Make every access happen one second after the previous one.
+    """
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(ocr_cache.time, "time", lambda: float(next(ticks)))
+
+
+def entry_size(key):
+    return len(ocr_cache.json.dumps({"key": key, "records": RECORDS}, ensure_ascii=False).encode("utf-8"))
+
+
+def fill(cache, keys):
+    for key in keys:
+        cache.put(key, {"key": key, "records": RECORDS})
+
+
+def cached_keys(cache_dir):
+    return sorted(name[:-5] for name in os.listdir(cache_dir) if name.endswith(".json"))
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = OCRCache(str(tmp_path))
+    assert cache.get("a") is None
+    cache.put("a", RECORDS)
+    assert cache.get("a") == RECORDS
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["bytes"] == os.path.getsize(tmp_path / "a.json")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = OCRCache(str(tmp_path), max_bytes=3 * entry_size("a"))
+    fill(cache, "abc")
+    assert cache.get("a") is not None
+
+    fill(cache, "d")
+    # "b" is the least recently used once "a" was read
+    assert cached_keys(tmp_path) == ["a", "c", "d"]
+    assert cache.get("b") is None
+    assert cache.stats()["bytes"] == 3 * entry_size("a")
+
+    fill(cache, "ef")
+    assert cached_keys(tmp_path) == ["d", "e", "f"]
+    assert cache.stats()["entries"] == 3
+
+
+def test_overwriting_an_entry_keeps_the_size_right(tmp_path, clock):
+    cache = OCRCache(str(tmp_path), max_bytes=2 * entry_size("a"))
+    fill(cache, "aaab")
+    assert cached_keys(tmp_path) == ["a", "b"]
+    assert cache.stats()["bytes"] == 2 * entry_size("a")
+
+
+def test_eviction_order_survives_a_restart(tmp_path):
+    cache = OCRCache(str(tmp_path))
+    fill(cache, "abc")
+    # Access times as left behind by an earlier run: "b" read last, "a" first
+    for key, accessed in zip("acb", [100, 200, 300]):
+        os.utime(tmp_path / f"{key}.json", (accessed, accessed))
+
+    reopened = OCRCache(str(tmp_path), max_bytes=2 * entry_size("a"))
+    assert reopened.stats()["entries"] == 3
+    fill(reopened, "d")
+    assert cached_keys(tmp_path) == ["b", "d"]
+
+
+def test_key_depends_on_pixels_language_kind_and_engine(monkeypatch):
+    cache_key = OCRCache.make_key
+    image = np.zeros((10, 20, 3), dtype=np.uint8)
+    other = image.copy()
+    other[5, 5] = 1
+
+    key = cache_key(None, image)
+    assert key == cache_key(None, image.copy())
+    assert key != cache_key(None, other)
+    assert key != cache_key(None, image.reshape(20, 10, 3))
+    assert key != cache_key(None, image, language="fr")
+    assert key != cache_key(None, image, kind="table")
+    monkeypatch.setattr(model_registry, "get_ocr_model_version", lambda: "other engine")
+    assert key != cache_key(None, image)
+
+
+def test_enable_and_disable(tmp_path):
+    try:
+        cache = ocr_cache.enable(str(tmp_path), max_bytes=100)
+        assert ocr_cache.get_cache() is cache
+        assert ocr_cache.enable(str(tmp_path), max_bytes=200) is cache
+        assert cache.max_bytes == 200
+        assert ocr_cache.enable(str(tmp_path / "other")) is not cache
+    finally:
+        ocr_cache.disable()
+    assert ocr_cache.get_cache() is None
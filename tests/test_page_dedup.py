@@ -0,0 +1,225 @@
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+import page_dedup
+from page_dedup import REFERENCE_ZOOM, PageIndex, page_hash
+from pdf_to_image import pixmap_to_array, render_page
+from text_layer import text_layer_records
+
+ZOOM = 2
+AMOUNT = "1,234.50"
+
+
+def statement(amount=AMOUNT, font_size=9):
+    """
+    Build a one-page statement whose closing balance is ``amount``.
+    """
+    document = fitz.open()
+    page = document.new_page(width=595, height=842)
+    lines = [
+        "First National Bank - Statement of Account",
+        "Account Number: 0123456789",
+        "Statement Period: 01/01/2024 - 31/01/2024",
+        "Opening Balance 2,000.00",
+        "05/01/2024 Salary credit 3,500.00",
+        "09/01/2024 Grocery store debit 415.20",
+        "15/01/2024 Utility bill debit 250.30",
+        f"Closing Balance {amount}",
+    ]
+    for number, line in enumerate(lines):
+        page.insert_text((60, 80 + number * 2.2 * font_size), line, fontsize=font_size)
+    return document
+
+
+def scan(document, angle=0.0, shift=(0, 0), noise=0):
+    """
+    Rasterize a document into an image-only PDF, optionally rotated, shifted and noisy like a rescan.
+    """
+    scanned = fitz.open()
+    for page in document:
+        image = pixmap_to_array(page.get_pixmap(matrix=fitz.Matrix(ZOOM, ZOOM), alpha=False))
+        if angle or shift != (0, 0):
+            height, width = image.shape[:2]
+            matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+            matrix[:, 2] += shift
+            image = cv2.warpAffine(image, matrix, (width, height), borderValue=(255, 255, 255))
+        if noise:
+            rng = np.random.default_rng(0)
+            image = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(np.uint8)
+        target = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        target.insert_image(target.rect, stream=cv2.imencode(".png", image[:, :, ::-1])[1].tobytes())
+    return scanned
+
+
+@pytest.fixture
+def read_truth(monkeypatch):
+    """
+    Replace the OCR of changed boxes by the text of the vector document each scan was made from.
+    """
+    truths = {}
+    calls = []
+
+    def ocr_region(page, rect, zoom=2, language="en"):
+        calls.append(rect)
+        truth = truths[id(page.parent)][page.number]
+        # ``rect`` is on the displayed page, get_text clips on the unrotated one
+        clip = rect * truth.derotation_matrix
+        return [{"text": truth.get_text("text", clip=clip).strip(), "confidence": 1.0,
+                 "position": [[0, 0], [1, 0], [1, 1], [0, 1]]}]
+
+    monkeypatch.setattr(page_dedup, "ocr_region", ocr_region)
+
+    def register(scanned, truth):
+        truths[id(scanned)] = truth
+        return scanned
+
+    register.calls = calls
+    return register
+
+
+def index_page(index, page, truth_page):
+    index.add(page, "config", "original.pdf", "page_1", text_layer_records(truth_page, ZOOM), None, ZOOM)
+
+
+def test_page_hash_is_stable_under_rescan():
+    original = scan(statement())[0]
+    rescan = scan(statement(), angle=0.3, shift=(3, -2), noise=4)[0]
+    first = page_hash(pixmap_to_array(original.get_pixmap(matrix=fitz.Matrix(ZOOM, ZOOM))))
+    second = page_hash(pixmap_to_array(rescan.get_pixmap(matrix=fitz.Matrix(ZOOM, ZOOM))))
+    assert bin(first ^ second).count("1") <= 10
+
+
+def test_identical_page_is_a_duplicate(tmp_path, read_truth):
+    truth = statement()
+    original = read_truth(scan(truth), truth)
+    index = PageIndex(str(tmp_path))
+    index_page(index, original[0], truth[0])
+
+    duplicate = index.find(original[0], "config", ZOOM)
+    assert duplicate is not None
+    assert duplicate["source"] == "original.pdf"
+    assert [record["text"] for record in duplicate["ocr"]] == [
+        record["text"] for record in text_layer_records(truth[0], ZOOM)
+    ]
+    assert not read_truth.calls
+
+
+def test_rescan_is_a_duplicate(tmp_path, read_truth):
+    truth = statement()
+    original = read_truth(scan(truth), truth)
+    rescan = read_truth(scan(truth, angle=0.3, shift=(3, -2), noise=4), truth)
+    index = PageIndex(str(tmp_path))
+    index_page(index, original[0], truth[0])
+
+    duplicate = index.find(rescan[0], "config", ZOOM)
+    assert duplicate is not None
+    # Positions follow the rescan's rotation and shift
+    height, width = 842 * ZOOM, 595 * ZOOM
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), 0.3, 1.0)
+    for record, expected in zip(duplicate["ocr"], text_layer_records(truth[0], ZOOM)):
+        x, y = expected["position"][0]
+        moved = matrix @ [x, y, 1] + [3, -2]
+        assert np.allclose(record["position"][0], moved, atol=1.5)
+
+
+@pytest.mark.parametrize("font_size", [8, 9])
+@pytest.mark.parametrize("amount", ["1,234.80", "1,234.56", "1,284.50", "1,234.30", "1,234.58"])
+def test_single_digit_change_is_rejected(tmp_path, read_truth, font_size, amount):
+    truth = statement(font_size=font_size)
+    changed_truth = statement(amount, font_size=font_size)
+    original = read_truth(scan(truth), truth)
+    changed = read_truth(scan(changed_truth), changed_truth)
+    index = PageIndex(str(tmp_path))
+    index_page(index, original[0], truth[0])
+
+    # Same template: the hash alone can't tell the pages apart
+    index.refresh()
+    assert index.candidates(page_hash(render_page(changed[0], REFERENCE_ZOOM)), "config")
+    assert index.find(changed[0], "config", ZOOM) is None
+    assert index.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("amount", ["1,234.80", "1,284.50"])
+def test_single_digit_change_in_a_rescan_is_rejected(tmp_path, read_truth, amount):
+    truth = statement()
+    changed_truth = statement(amount)
+    original = read_truth(scan(truth), truth)
+    changed = read_truth(scan(changed_truth, angle=0.3, shift=(3, -2), noise=4), changed_truth)
+    index = PageIndex(str(tmp_path))
+    index_page(index, original[0], truth[0])
+
+    assert index.find(changed[0], "config", ZOOM) is None
+
+
+def rotated(document, rotation=90):
+    for page in document:
+        page.set_rotation(rotation)
+    return document
+
+
+def test_rotated_rescan_is_a_duplicate(tmp_path, read_truth):
+    truth = rotated(statement())
+    original = read_truth(rotated(scan(statement())), truth)
+    rescan = read_truth(rotated(scan(statement(), angle=0.3, shift=(3, -2), noise=4)), truth)
+    index = PageIndex(str(tmp_path))
+    index_page(index, original[0], truth[0])
+
+    assert index.find(rescan[0], "config", ZOOM) is not None
+
+
+@pytest.mark.parametrize("amount", ["1,234.80", "1,284.50"])
+def test_single_digit_change_on_a_rotated_page_is_rejected(tmp_path, read_truth, amount):
+    truth = rotated(statement())
+    changed_truth = rotated(statement(amount))
+    original = read_truth(rotated(scan(statement())), truth)
+    changed = read_truth(rotated(scan(statement(amount), angle=0.3, shift=(3, -2), noise=4)), changed_truth)
+    index = PageIndex(str(tmp_path))
+    index_page(index, original[0], truth[0])
+
+    assert index.find(changed[0], "config", ZOOM) is None
+    texts = [changed_truth[0].get_text("text", clip=rect * changed_truth[0].derotation_matrix).strip()
+             for rect in read_truth.calls]
+    # Each re-read covers one line, and the changed line was among them
+    assert all(text and "\n" not in text for text in texts)
+    assert f"Closing Balance {amount}" in texts
+
+
+def test_changed_digit_marks_its_box():
+    truth, changed_truth = statement(), statement("1,234.80")
+    render = lambda document: np.asarray(render_page(document[0], REFERENCE_ZOOM).convert("L"))
+    records = text_layer_records(truth[0], REFERENCE_ZOOM)
+    _, difference, changed = page_dedup.compare_pages(render(truth), render(changed_truth),
+                                                      page_dedup._boxes(records))
+    assert [records[index]["text"] for index in changed] == [f"Closing Balance {AMOUNT}"]
+    assert difference == 0
+
+
+def test_text_layer_change_is_rejected_without_ocr(tmp_path, read_truth):
+    original, changed = statement(), statement("1,234.80")
+    index = PageIndex(str(tmp_path))
+    index_page(index, original[0], original[0])
+
+    assert index.find(changed[0], "config", ZOOM) is None
+    assert not read_truth.calls
+    assert index.find(original[0], "config", ZOOM) is not None
+
+
+def test_other_config_is_not_matched(tmp_path, read_truth):
+    truth = statement()
+    original = read_truth(scan(truth), truth)
+    index = PageIndex(str(tmp_path))
+    index_page(index, original[0], truth[0])
+
+    assert index.find(original[0], "other config", ZOOM) is None
+
+
+def test_index_is_shared_through_the_directory(tmp_path, read_truth):
+    truth = statement()
+    original = read_truth(scan(truth), truth)
+    index_page(PageIndex(str(tmp_path)), original[0], truth[0])
+
+    reopened = PageIndex(str(tmp_path))
+    assert len(reopened.entries) == 1
+    assert reopened.find(original[0], "config", ZOOM) is not None
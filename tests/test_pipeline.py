@@ -0,0 +1,47 @@
+import fitz
+import pytest
+from PIL import Image
+
+from benchmarks.synthetic_documents import generate_document
+from pipeline import process_document
+
+
+@pytest.fixture
+def statement(tmp_path):
+    pdf_path = str(tmp_path / "statement.pdf")
+    generate_document("bank_statement", pdf_path, pages=2, table_density=0.0, seed=5)
+    return pdf_path
+
+
+@pytest.mark.parametrize("render_mode", ["full", "adaptive"])
+def test_saved_page_images_line_up_with_the_ocr_positions(statement, tmp_path, render_mode):
+    output_dir = str(tmp_path / "out")
+    results = list(process_document(statement, output_dir=output_dir, zoom=2, text_mode="hybrid",
+                                    extract_tables=False, save_images=True, render_mode=render_mode))
+
+    with fitz.open(statement) as document:
+        expected = (round(document[0].rect.width * 2), round(document[0].rect.height * 2))
+    with Image.open(tmp_path / "out" / "page_1.png") as image:
+        assert image.size == expected
+    right_edge = max(x for record in results[0]["ocr"] for x, _ in record["position"])
+    assert right_edge <= expected[0]
+
+
+def test_page_task_closes_the_document(statement, monkeypatch):
+    import pipeline
+
+    opened = []
+    real_open = fitz.open
+
+    def tracking_open(*args, **kwargs):
+        document = real_open(*args, **kwargs)
+        opened.append(document)
+        return document
+
+    monkeypatch.setattr(pipeline.fitz, "open", tracking_open)
+    options = pipeline.make_options(text_mode="hybrid", extract_tables=False)
+    page_result, records = pipeline.process_page_task(statement, 2, options)
+
+    assert page_result["page"] == "page_2"
+    assert records
+    assert all(document.is_closed for document in opened)
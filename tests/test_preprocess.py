@@ -0,0 +1,83 @@
+import fitz
+import numpy as np
+import pytest
+
+import preprocess
+import table_extractor
+from benchmarks.synthetic_documents import generate_document
+from pdf_to_image import render_page
+from preprocess import extract_tables_adaptive, ocr_page_adaptive
+
+ZOOM = 2
+LAYOUT_ZOOM = 1.0
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """
+    Replace OCR by one record around the dark pixels of each image, in the image's pixels.
+    """
+    def ocr_image(image, language="en"):
+        gray = np.asarray(image.convert("L"))
+        ys, xs = np.nonzero(gray < 128)
+        if not len(xs):
+            return []
+        x1, y1, x2, y2 = float(xs.min()), float(ys.min()), float(xs.max() + 1), float(ys.max() + 1)
+        return [{"text": "ink", "confidence": 0.9, "position": [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]}]
+
+    monkeypatch.setattr(preprocess, "ocr_image", ocr_image)
+
+
+def statement(tmp_path, rotation):
+    pdf_path = str(tmp_path / "statement.pdf")
+    generate_document("bank_statement", pdf_path, pages=1, table_density=1.0, seed=5)
+    document = fitz.open(pdf_path)
+    document[0].set_rotation(rotation)
+    return document
+
+
+def ink(gray, box):
+    x1, y1, x2, y2 = (int(round(value)) for value in box)
+    return int((gray[max(y1, 0):y2, max(x1, 0):x2] < 128).sum())
+
+
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+def test_adaptive_ocr_finds_the_ink_of_rotated_pages(tmp_path, fake_ocr, rotation):
+    page = statement(tmp_path, rotation)[0]
+    gray = np.asarray(render_page(page, ZOOM).convert("L"))
+    records = ocr_page_adaptive(page, render_page(page, LAYOUT_ZOOM), LAYOUT_ZOOM, ZOOM)
+
+    assert records
+    boxes = [[*record["position"][0], *record["position"][2]] for record in records]
+    # Every record lies on ink of the full render, and together they hold nearly all of it
+    assert all(ink(gray, box) for box in boxes)
+    covered = np.zeros(gray.shape, dtype=bool)
+    for x1, y1, x2, y2 in boxes:
+        covered[max(int(y1) - 2, 0):int(y2) + 2, max(int(x1) - 2, 0):int(x2) + 2] = True
+    assert (covered & (gray < 128)).sum() >= 0.99 * (gray < 128).sum()
+
+
+@pytest.mark.parametrize("rotation", [0, 90])
+def test_adaptive_tables_are_cropped_from_the_displayed_page(tmp_path, monkeypatch, rotation):
+    page = statement(tmp_path, rotation)[0]
+    layout_image = render_page(page, LAYOUT_ZOOM)
+    gray = np.asarray(layout_image.convert("L"))
+    # The ruled table is the widest block of ink on the page
+    ys, xs = np.nonzero(gray < 128)
+    table_box = [float(xs.min()), float(np.percentile(ys, 20)), float(xs.max() + 1), float(ys.max() + 1)]
+    crops = []
+
+    def extract_tables_from_crops(padded_tables, table_pages, page_names):
+        crops.extend(padded_tables)
+        return [""]
+
+    monkeypatch.setattr(table_extractor, "detect_table_boxes", lambda images, names: [[table_box]])
+    monkeypatch.setattr(table_extractor, "extract_tables_from_crops", extract_tables_from_crops)
+    extract_tables_adaptive(page, layout_image, "page_1", LAYOUT_ZOOM, ZOOM)
+
+    (crop,) = crops
+    expected = np.asarray(render_page(page, ZOOM).convert("L"))
+    x1, y1, x2, y2 = (int(value * ZOOM) for value in table_box)
+    # The crop holds the table's ink, with 10 + 20 pixels of padding around it
+    assert crop.size == pytest.approx((x2 - x1 + 60, y2 - y1 + 60), abs=3)
+    assert (np.asarray(crop.convert("L")) < 128).sum() == pytest.approx(ink(expected, [x1, y1, x2, y2]), rel=0.05)
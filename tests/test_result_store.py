@@ -0,0 +1,126 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from result_store import (
+    OCRStore, TableStore, load_ocr_results, load_table_results, save_ocr_store, save_table_store,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def load_json(name):
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as file:
+        return json.load(file)
+
+
+def float32(value):
+    return float(np.float32(value))
+
+
+def test_ocr_store_round_trip(tmp_path):
+    ocr_results = load_json("ocr_results.json")
+    store = load_ocr_results(save_ocr_store(ocr_results, str(tmp_path)))
+
+    assert isinstance(store, OCRStore)
+    assert list(store) == list(ocr_results)
+    for page, records in ocr_results.items():
+        loaded = store[page]
+        assert [record["text"] for record in loaded] == [record["text"] for record in records]
+        # Boxes and confidences are stored as float32
+        assert [record["confidence"] for record in loaded] == [float32(record["confidence"]) for record in records]
+        assert [record["position"] for record in loaded] == [
+            [[float32(x), float32(y)] for x, y in record["position"]] for record in records
+        ]
+        assert store.page_texts(page) == [record["text"] for record in records]
+
+
+def test_ocr_store_boxes(tmp_path):
+    ocr_results = load_json("ocr_results.json")
+    store = load_ocr_results(save_ocr_store(ocr_results, str(tmp_path)))
+
+    for page, records in ocr_results.items():
+        boxes = store.boxes(page)
+        assert boxes.shape == (len(records), 4, 2)
+        assert boxes.dtype == np.float32
+        np.testing.assert_allclose(boxes, [record["position"] for record in records], rtol=1e-6)
+        np.testing.assert_allclose(store.confidences(page), [record["confidence"] for record in records],
+                                   rtol=1e-6)
+
+
+def test_ocr_store_empty_pages_and_unicode(tmp_path):
+    position = [[0, 0], [10, 0], [10, 5], [0, 5]]
+    ocr_results = {
+        "page_1": [],
+        "page_2": [{"text": "Solde: 1 234,50 €", "confidence": 0.5, "position": position},
+                   {"text": "", "confidence": 0.25, "position": position}],
+        "page_3": [],
+    }
+    store = load_ocr_results(save_ocr_store(ocr_results, str(tmp_path)))
+
+    assert dict(store) == ocr_results
+    assert store.boxes("page_1").shape == (0, 4, 2)
+
+    empty = load_ocr_results(save_ocr_store({}, str(tmp_path / "empty")))
+    assert len(empty) == 0
+
+
+def test_ocr_store_can_be_overwritten_while_mapped(tmp_path):
+    position = [[0, 0], [10, 0], [10, 5], [0, 5]]
+    store = load_ocr_results(save_ocr_store({"page_1": [{"text": "old", "confidence": 1.0, "position": position}]},
+                                            str(tmp_path)))
+    save_ocr_store({"page_1": [{"text": "new text", "confidence": 0.5, "position": position}]}, str(tmp_path))
+
+    assert store["page_1"][0]["text"] == "old"
+    assert load_ocr_results(store.store_dir)["page_1"][0]["text"] == "new text"
+
+
+def test_table_store_round_trip(tmp_path):
+    all_tables = load_json("table_extraction_result.json")
+    store = load_table_results(save_table_store(all_tables, str(tmp_path)))
+
+    assert isinstance(store, TableStore)
+    assert list(store) == list(all_tables)
+    for page, table_json in all_tables.items():
+        if not table_json:
+            assert store[page] == ""
+            assert store.grid(page) is None
+            continue
+        expected = json.loads(table_json)
+        loaded = json.loads(store[page])
+        assert [list(record) for record in loaded] == [list(record) for record in expected]
+        for loaded_record, expected_record in zip(loaded, expected):
+            for key, value in expected_record.items():
+                if key.startswith("('Confidence'"):
+                    assert loaded_record[key] == pytest.approx(value, rel=1e-6)
+                else:
+                    assert loaded_record[key] == value
+
+
+def test_table_store_grid_and_empty_cells(tmp_path):
+    table_json = json.dumps([
+        {"('Data', 0)": "Date", "('Data', 1)": None, "('Confidence', 0)": 0.9, "('Confidence', 1)": 0.0},
+        {"('Data', 0)": "01/02", "('Data', 1)": "12.50", "('Confidence', 0)": 0.8, "('Confidence', 1)": 0.7},
+    ])
+    store = load_table_results(save_table_store({"page_1": "", "page_2": table_json}, str(tmp_path)))
+
+    texts, confidences = store.grid("page_2")
+    assert texts.tolist() == [["Date", None], ["01/02", "12.50"]]
+    np.testing.assert_allclose(confidences, [[0.9, 0.0], [0.8, 0.7]], rtol=1e-6)
+    assert json.loads(store["page_2"])[0]["('Data', 1)"] is None
+    with pytest.raises(KeyError):
+        store["page_3"]
+
+
+def test_json_files_still_load(tmp_path):
+    assert load_ocr_results(os.path.join(DATA_DIR, "ocr_results.json")) == load_json("ocr_results.json")
+    assert load_table_results(os.path.join(DATA_DIR, "table_extraction_result.json")) == \
+        load_json("table_extraction_result.json")
+
+
+def test_wrong_store_kind_is_rejected(tmp_path):
+    store_dir = save_ocr_store(load_json("ocr_results.json"), str(tmp_path))
+    with pytest.raises(ValueError):
+        TableStore(store_dir)
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+
+from service import DocumentService, Job, handle_http, watch_directory
+
+
+def finish(service, job_id, finished_at):
+    job = Job(job_id, f"{job_id}.pdf")
+    job.status = "done"
+    job.finished_at = finished_at
+    service.jobs[job_id] = job
+    service._finished.append(job)
+    return job
+
+
+def test_finished_jobs_expire():
+    async def run():
+        service = DocumentService(finished_job_ttl=60, max_finished_jobs=100)
+        now = time.monotonic()
+        finish(service, "old", now - 120)
+        finish(service, "recent", now)
+        service._evict_finished()
+        shutil.rmtree(service._upload_dir)
+        return set(service.jobs)
+
+    assert asyncio.run(run()) == {"recent"}
+
+
+def test_finished_jobs_are_capped():
+    async def run():
+        service = DocumentService(finished_job_ttl=3600, max_finished_jobs=3)
+        now = time.monotonic()
+        for number in range(5):
+            finish(service, f"job_{number}", now)
+        service._evict_finished()
+        shutil.rmtree(service._upload_dir)
+        return list(service.jobs)
+
+    assert asyncio.run(run()) == ["job_2", "job_3", "job_4"]
+
+
+class Writer:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def post(service, body, length=None):
+    reader = asyncio.StreamReader()
+    reader.feed_data(
+        f"POST /documents HTTP/1.1\r\nContent-Length: {len(body) if length is None else length}\r\n\r\n".encode()
+        + body
+    )
+    reader.feed_eof()
+    writer = Writer()
+    await handle_http(service, reader, writer)
+    return writer.data.split(b"\r\n", 1)[0], json.loads(writer.data.split(b"\r\n\r\n", 1)[1])
+
+
+def test_upload_is_written_to_disk_and_queued():
+    async def run():
+        service = DocumentService(queue_size=1)
+        service._queue = asyncio.Queue(maxsize=1)
+        body = b"%PDF-1.4 " + bytes(200 * 1024)
+        status, payload = await post(service, body)
+        job = service.jobs[payload["id"]]
+        with open(job.pdf_path, "rb") as pdf_file:
+            stored = pdf_file.read()
+        shutil.rmtree(service._upload_dir)
+        return status, stored == body, service._reserved
+
+    assert asyncio.run(run()) == (b"HTTP/1.1 202 Accepted", True, 0)
+
+
+def test_full_queue_rejects_before_reading_the_body():
+    async def run():
+        service = DocumentService(queue_size=1)
+        service._queue = asyncio.Queue(maxsize=1)
+        service.submit_file("queued.pdf")
+        # The body is never sent; reading it would fail with an incomplete read
+        status, _ = await post(service, b"", length=50 * 1024 * 1024)
+        uploads = os.listdir(service._upload_dir)
+        shutil.rmtree(service._upload_dir)
+        return status, uploads, service._reserved
+
+    assert asyncio.run(run()) == (b"HTTP/1.1 503 Service Unavailable", [], 0)
+
+
+def test_interrupted_upload_gives_its_slot_back():
+    async def run():
+        service = DocumentService(queue_size=1)
+        service._queue = asyncio.Queue(maxsize=1)
+        status, _ = await post(service, b"%PDF-1.4", length=1024)
+        uploads = os.listdir(service._upload_dir)
+        shutil.rmtree(service._upload_dir)
+        return status, uploads, service._reserved
+
+    assert asyncio.run(run()) == (b"HTTP/1.1 400 Bad Request", [], 0)
+
+
+class BrokenExecutor:
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("A worker died")
+
+
+def test_failed_submission_fails_the_job(tmp_path):
+    pdf_path = str(tmp_path / "document.pdf")
+    with fitz.open() as document:
+        document.new_page()
+        document.new_page()
+        document.save(pdf_path)
+
+    async def run():
+        service = DocumentService(max_pages_in_flight=2)
+        service._page_slots = asyncio.Semaphore(2)
+        service._executor = BrokenExecutor()
+        job = Job("job", pdf_path)
+        try:
+            await asyncio.wait_for(service._run_job(job), timeout=10)
+        except BrokenProcessPool:
+            return service._page_slots._value
+        finally:
+            shutil.rmtree(service._upload_dir)
+
+    # The slot taken for the failed submission is given back
+    assert asyncio.run(run()) == 2
+
+
+class RecordingService:
+    def __init__(self):
+        self.submitted = []
+
+    def submit_file(self, pdf_path, output_name=None):
+        self.submitted.append(os.path.basename(pdf_path))
+        return Job(output_name, pdf_path)
+
+
+def test_watch_waits_until_a_file_stops_changing(tmp_path):
+    async def run():
+        service = RecordingService()
+        watcher = asyncio.create_task(watch_directory(service, str(tmp_path), poll_interval=0.05))
+        pdf_path = tmp_path / "statement.pdf"
+        snapshots = []
+        try:
+            # Still being copied: the file grows between polls
+            for _ in range(10):
+                with open(pdf_path, "ab") as pdf_file:
+                    pdf_file.write(b"%PDF-1.4 chunk ")
+                await asyncio.sleep(0.02)
+                snapshots.append(list(service.submitted))
+            await asyncio.sleep(0.2)
+            snapshots.append(list(service.submitted))
+        finally:
+            watcher.cancel()
+        return snapshots
+
+    snapshots = asyncio.run(run())
+    assert all(snapshot == [] for snapshot in snapshots[:-1])
+    assert snapshots[-1] == ["statement.pdf"]
@@ -0,0 +1,108 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from spatial_index import SpatialIndex
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def brute_nearest(boxes, index, axis, max_gap, min_overlap):
+    """
+    The nearest box after box ``index`` along ``axis``, checking every box on the page.
+    """
+    box = boxes[index]
+    across = 1 - axis
+    end = box[axis + 2]
+    centre = (box[axis] + end) / 2
+    best = best_gap = None
+    for candidate, other in enumerate(boxes):
+        gap = other[axis] - end
+        if candidate == index or other[axis] <= centre or other[axis + 2] <= end:
+            continue
+        if max_gap is not None and gap > max_gap:
+            continue
+        overlap = min(box[across + 2], other[across + 2]) - max(box[across], other[across])
+        smaller = min(box[across + 2] - box[across], other[across + 2] - other[across])
+        if overlap < min_overlap * smaller:
+            continue
+        if best is None or gap < best_gap or (gap == best_gap and candidate < best):
+            best, best_gap = candidate, gap
+    return best
+
+
+def brute_inside(boxes, region, min_fraction):
+    x1, y1, x2, y2 = region
+    found = []
+    for index, (bx1, by1, bx2, by2) in enumerate(boxes):
+        width = max(min(bx2, x2) - max(bx1, x1), 0)
+        height = max(min(by2, y2) - max(by1, y1), 0)
+        area = max((bx2 - bx1) * (by2 - by1), 1e-6)
+        if width * height / area >= min_fraction:
+            found.append(index)
+    return found
+
+
+def random_page(seed, count=300):
+    """
+    Boxes of text lines and words laid out in rows and columns, with some overlap and jitter.
+    """
+    rng = np.random.default_rng(seed)
+    x1 = rng.integers(0, 1100, count)
+    y1 = rng.integers(0, 80, count) * 20 + rng.integers(-4, 4, count)
+    width = rng.integers(20, 300, count)
+    height = rng.integers(12, 24, count)
+    return np.stack([x1, y1, x1 + width, y1 + height], axis=1).astype(np.float32)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("max_gap", [None, 40.0])
+def test_neighbours_match_a_full_scan(seed, max_gap):
+    boxes = random_page(seed)
+    index = SpatialIndex(boxes, [str(number) for number in range(len(boxes))])
+    boxes = index.boxes.tolist()
+    for box in range(len(boxes)):
+        assert index.right_of(box, max_gap) == brute_nearest(boxes, box, 0, max_gap, 0.5)
+        assert index.below(box, max_gap) == brute_nearest(boxes, box, 1, max_gap, 0.3)
+
+
+@pytest.mark.parametrize("min_fraction", [0.0001, 0.5, 1.0])
+def test_inside_matches_a_full_scan(min_fraction):
+    boxes = random_page(7)
+    index = SpatialIndex(boxes, [""] * len(boxes))
+    rng = np.random.default_rng(8)
+    for _ in range(50):
+        # Whole pixels, so float32 boxes and the region give the same areas in both
+        x1, y1 = rng.integers(0, 1200, 2).tolist()
+        region = [x1, y1, x1 + int(rng.integers(10, 600)), y1 + int(rng.integers(10, 600))]
+        assert index.inside(region, min_fraction) == brute_inside(index.boxes.tolist(), region, min_fraction)
+
+
+def test_sample_pages_match_a_full_scan():
+    with open(os.path.join(DATA_DIR, "ocr_results.json"), encoding="utf-8") as ocr_file:
+        pages = json.load(ocr_file)
+    for records in pages.values():
+        index = SpatialIndex.from_records(records)
+        boxes = index.boxes.tolist()
+        for box in range(len(index)):
+            assert index.right_of(box) == brute_nearest(boxes, box, 0, None, 0.5)
+            assert index.below(box) == brute_nearest(boxes, box, 1, None, 0.3)
+
+
+def test_label_and_value_layouts():
+    # "Account Number" with its value to the right, "Balance" with its value underneath
+    index = SpatialIndex([[0, 0, 100, 20], [300, 2, 400, 22], [0, 40, 80, 60], [0, 62, 90, 82], [200, 60, 260, 80]],
+                         ["Account Number", "12345", "Balance", "1,000.00", "Other"])
+    assert index.right_of(0) == 1
+    assert index.right_of(0, max_gap=100) is None
+    assert index.below(2) == 3
+    assert index.right_of(1) is None
+    assert index.inside([0, 30, 150, 90]) == [2, 3]
+
+
+def test_empty_page():
+    index = SpatialIndex.from_quads(np.zeros((0, 4, 2)), [])
+    assert len(index) == 0
+    assert index.inside([0, 0, 100, 100]) == []
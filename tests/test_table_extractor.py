@@ -0,0 +1,235 @@
+import contextlib
+import json
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+import table_extractor
+from result_store import load_table_results, save_table_store
+from table_extractor import (
+    TableResult, build_table_json, get_cells_by_intersecting_rows_and_cols, get_row_col_bounds,
+    get_row_col_bounds_batch, sort_row_col_boxes,
+)
+
+
+def baseline_table_json(num_rows, num_cols, extracted_data, confidence_scores):
+    """
+    The JSON records built cell by cell with DataFrames before TableResult.
+    """
+    df = pd.DataFrame(index=range(num_rows), columns=range(num_cols))
+    for i, data in enumerate(extracted_data):
+        df.iloc[i // num_cols, i % num_cols] = data
+    confidence_df = pd.DataFrame(index=range(num_rows), columns=range(num_cols))
+    for i, score in enumerate(confidence_scores):
+        confidence_df.iloc[i // num_cols, i % num_cols] = score
+    combined_df = pd.concat([df, confidence_df], axis=1, keys=["Data", "Confidence"])
+    return combined_df.to_json(orient="records")
+
+
+def baseline_cells(row_boxes, col_boxes):
+    return [[col_box[0], row_box[1], col_box[2], row_box[3]] for row_box in row_boxes for col_box in col_boxes]
+
+
+def random_cells(rng, num_rows, num_cols):
+    """
+    OCR output of a table as ocr_table_cells returns it: None and 0 for empty cells.
+    """
+    words = ["Date", "Description", "Amount", "12/01/2024", "Café crème", "1,234.50", "-415.20", 'say "hi"']
+    extracted_data, confidence_scores = [], []
+    for _ in range(num_rows * num_cols):
+        if rng.random() < 0.2:
+            extracted_data.append(None)
+            confidence_scores.append(0)
+        else:
+            extracted_data.append(str(rng.choice(words)))
+            confidence_scores.append(float(rng.uniform(0.5, 1.0)))
+    return extracted_data, confidence_scores
+
+
+def table_result(num_rows, num_cols, extracted_data, confidence_scores):
+    texts = np.empty(len(extracted_data), dtype=object)
+    texts[:] = extracted_data
+    return TableResult(texts=texts.reshape(num_rows, num_cols),
+                       confidences=np.asarray(confidence_scores, dtype=np.float64).reshape(num_rows, num_cols),
+                       row_boxes=np.zeros((num_rows, 4)), col_boxes=np.zeros((num_cols, 4)))
+
+
+def assert_same_records(actual, expected):
+    actual, expected = json.loads(actual), json.loads(expected)
+    assert [list(record) for record in actual] == [list(record) for record in expected]
+    assert actual == expected
+
+
+@pytest.mark.parametrize("num_rows, num_cols", [(1, 1), (3, 2), (8, 5), (2, 12)])
+def test_to_json_matches_the_dataframe_layout(num_rows, num_cols):
+    rng = np.random.default_rng(num_rows * 100 + num_cols)
+    for _ in range(10):
+        extracted_data, confidence_scores = random_cells(rng, num_rows, num_cols)
+        assert_same_records(table_result(num_rows, num_cols, extracted_data, confidence_scores).to_json(),
+                            baseline_table_json(num_rows, num_cols, extracted_data, confidence_scores))
+
+
+def test_to_dataframe_columns():
+    result = table_result(2, 2, ["a", None, "b", "c"], [0.9, 0, 0.8, 0.7])
+    frame = result.to_dataframe()
+    assert list(frame.columns) == [("Data", 0), ("Data", 1), ("Confidence", 0), ("Confidence", 1)]
+    assert frame.values.tolist() == [["a", None, 0.9, 0.0], ["b", "c", 0.8, 0.7]]
+    assert (frame.dtypes == object).all()
+
+
+def test_cell_grid_matches_the_loop():
+    rng = np.random.default_rng(0)
+    row_boxes = rng.uniform(0, 500, (6, 4))
+    col_boxes = rng.uniform(0, 500, (4, 4))
+    np.testing.assert_allclose(get_cells_by_intersecting_rows_and_cols(row_boxes, col_boxes),
+                               baseline_cells(row_boxes, col_boxes), rtol=1e-6)
+    assert get_cells_by_intersecting_rows_and_cols(np.zeros((0, 4)), col_boxes).shape == (0, 4)
+
+
+def test_build_table_json_matches_the_baseline(monkeypatch):
+    # Distinct rows and columns in detection order, so suppression keeps them all
+    row_boxes = np.array([[0, 60, 300, 90], [0, 0, 300, 30], [0, 30, 300, 60]], dtype=np.float32)
+    col_boxes = np.array([[200, 0, 300, 90], [0, 0, 100, 90], [100, 0, 200, 90]], dtype=np.float32)
+    extracted_data, confidence_scores = random_cells(np.random.default_rng(1), 3, 3)
+    seen = []
+
+    def ocr_table_cells(padded_image, cells):
+        seen.append(np.asarray(cells).tolist())
+        return extracted_data, confidence_scores
+
+    monkeypatch.setattr(table_extractor, "ocr_table_cells", ocr_table_cells)
+    table_json = build_table_json(None, (row_boxes, np.ones(3), col_boxes, np.ones(3)))
+
+    sorted_rows = sorted(row_boxes.tolist(), key=lambda box: box[1])
+    sorted_cols = sorted(col_boxes.tolist(), key=lambda box: box[0])
+    assert seen == [baseline_cells(sorted_rows, sorted_cols)]
+    assert_same_records(table_json, baseline_table_json(3, 3, extracted_data, confidence_scores))
+
+
+def test_duplicate_rows_are_suppressed():
+    row_boxes = np.array([[0, 0, 300, 30], [0, 2, 300, 31], [0, 30, 300, 60]], dtype=np.float32)
+    col_boxes = np.array([[0, 0, 100, 60]], dtype=np.float32)
+    rows, cols = sort_row_col_boxes(row_boxes, col_boxes, row_scores=[0.6, 0.9, 0.8])
+    assert rows.tolist() == [[0, 2, 300, 31], [0, 30, 300, 60]]
+    assert cols.tolist() == col_boxes.tolist()
+
+
+def test_table_store_accepts_table_results(tmp_path):
+    extracted_data, confidence_scores = random_cells(np.random.default_rng(2), 4, 3)
+    result = table_result(4, 3, extracted_data, confidence_scores)
+    from_results = load_table_results(save_table_store({"page_1": result, "page_2": ""}, str(tmp_path / "a")))
+    from_json = load_table_results(save_table_store({"page_1": result.to_json(), "page_2": ""},
+                                                    str(tmp_path / "b")))
+    assert dict(from_results) == dict(from_json)
+
+
+
+class FakeFeatureExtractor:
+    """
+    Stand-in for the DETR feature extractor: pads a batch to its largest image and masks the padding.
+
+    Its "detections" are one row box per band of dark rows and one column box
+    per band of dark columns, so they only depend on the table's own pixels.
+    """
+
+    def __call__(self, images, return_tensors=None):
+        arrays = [np.asarray(image.convert("L")) for image in images]
+        height = max(array.shape[0] for array in arrays)
+        width = max(array.shape[1] for array in arrays)
+        pixel_values = np.full((len(arrays), height, width), 255, dtype=np.uint8)
+        pixel_mask = np.zeros((len(arrays), height, width), dtype=bool)
+        for index, array in enumerate(arrays):
+            pixel_values[index, :array.shape[0], :array.shape[1]] = array
+            pixel_mask[index, :array.shape[0], :array.shape[1]] = True
+        return {"pixel_values": pixel_values, "pixel_mask": pixel_mask}
+
+    def post_process_object_detection(self, outputs, threshold, target_sizes):
+        results = []
+        for pixels, (height, width) in zip(outputs, target_sizes):
+            assert pixels.shape == (height, width)
+            boxes, labels, scores = [], [], []
+            for label, axis in ((0, 1), (1, 0)):
+                dark = (pixels < 128).any(axis=axis).astype(np.int8)
+                edges = np.flatnonzero(np.diff(np.concatenate([[0], dark, [0]])))
+                length = height if label == 0 else width
+                for start, end in zip(edges[::2], edges[1::2]):
+                    boxes.append([0, start, width, end] if label == 0 else [start, 0, end, height])
+                    labels.append(label)
+                    scores.append(0.5 + 0.5 * (end - start) / length)
+            keep = np.asarray(scores) >= threshold
+            results.append({"labels": np.asarray(labels)[keep],
+                            "boxes": np.asarray(boxes, dtype=np.float32).reshape(-1, 4)[keep],
+                            "scores": np.asarray(scores)[keep]})
+        return results
+
+
+class FakeStructureModel:
+    """
+    Stand-in for the structure model: hands each table's unpadded pixels to post-processing.
+    """
+
+    config = types.SimpleNamespace(label2id={"table row": 0, "table column": 1, "table column header": 2})
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, pixel_values, pixel_mask):
+        self.batches.append(len(pixel_values))
+        return [values[:mask.any(axis=1).sum(), :mask.any(axis=0).sum()]
+                for values, mask in zip(pixel_values, pixel_mask)]
+
+
+@pytest.fixture
+def structure_model(monkeypatch):
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        # Only torch.inference_mode is used around the stand-in model
+        monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(inference_mode=contextlib.nullcontext))
+    model = FakeStructureModel()
+    monkeypatch.setattr(table_extractor.model_registry, "get_structure_feature_extractor", FakeFeatureExtractor)
+    monkeypatch.setattr(table_extractor.model_registry, "get_table_structure_model", lambda: model)
+    return model
+
+
+def table_image(seed):
+    """
+    A white table image of random size with a few dark row and column bands.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = rng.integers(60, 200), rng.integers(80, 300)
+    pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+    for _ in range(rng.integers(1, 5)):
+        y = rng.integers(0, height - 10)
+        pixels[y:y + rng.integers(2, 10), :] = 0
+    for _ in range(rng.integers(1, 4)):
+        x = rng.integers(0, width - 10)
+        pixels[:, x:x + rng.integers(2, 10)] = 0
+    return Image.fromarray(pixels)
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 8])
+def test_batched_structure_matches_single_tables(structure_model, batch_size):
+    tables = [table_image(seed) for seed in range(7)]
+    batched = get_row_col_bounds_batch(tables, batch_size=batch_size)
+    assert structure_model.batches == [len(tables[start:start + batch_size])
+                                       for start in range(0, len(tables), batch_size)]
+
+    singles = [get_row_col_bounds(table) for table in tables]
+    assert len(batched) == len(singles) == len(tables)
+    for batch_result, single_result in zip(batched, singles):
+        assert len(batch_result) == 6
+        for batch_part, single_part in zip(batch_result, single_result):
+            np.testing.assert_array_equal(batch_part, single_part)
+
+
+def test_structure_threshold_is_applied(structure_model):
+    tables = [table_image(seed) for seed in range(4)]
+    for loose, strict in zip(get_row_col_bounds_batch(tables, ts_thresh=0.5),
+                             get_row_col_bounds_batch(tables, ts_thresh=0.9)):
+        assert len(strict[0]) <= len(loose[0])
+        assert (strict[1] >= 0.9).all()
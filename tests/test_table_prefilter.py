@@ -0,0 +1,131 @@
+import threading
+
+import fitz
+import pytest
+
+import pipeline
+from benchmarks.synthetic_documents import FILLER, draw_table, generate_document
+from instrumentation import Profiler, profiler
+from pdf_to_image import render_page
+from pipeline import process_document
+from table_prefilter import TablePrefilter, skip_report
+from text_layer import text_layer_records
+
+ZOOM = 2
+HEADER = ["Item", "Colour", "Size", "Qty", "Price"]
+ROWS = [[f"Widget {number}", "blue", "small", str(number), f"{12.5 * number:,.2f}"] for number in range(1, 9)]
+COLUMN_WIDTHS = [75, 170, 80, 80, 90]
+
+
+def document(kind):
+    """
+    A one-page document with a ruled table, a table without rulings, or only running text.
+    """
+    pdf = fitz.open()
+    page = pdf.new_page(width=595, height=842)
+    page.insert_text((50, 60), "Stock list", fontsize=14)
+    if kind == "ruled":
+        draw_table(page, 90, HEADER, ROWS, COLUMN_WIDTHS)
+    elif kind == "borderless":
+        for row, values in enumerate([HEADER] + ROWS):
+            x = 50
+            for value, width in zip(values, COLUMN_WIDTHS):
+                page.insert_text((x, 100 + row * 18), value, fontsize=9)
+                x += width
+    else:
+        page.insert_textbox(fitz.Rect(50, 90, 545, 500), FILLER * 3, fontsize=9)
+    return pdf
+
+
+@pytest.mark.parametrize("kind, with_ocr, decided_by", [
+    ("ruled", True, "ocr_layout"),
+    ("borderless", True, "ocr_layout"),
+    ("ruled", False, "ruling_lines"),
+    ("borderless", False, "image_layout"),
+])
+def test_pages_with_a_table_go_to_detection(kind, with_ocr, decided_by):
+    page = document(kind)[0]
+    records = text_layer_records(page, ZOOM) if with_ocr else None
+    detect, by, score = TablePrefilter().check(render_page(page, ZOOM), records, "bank_statement")
+    assert (detect, by) == (True, decided_by)
+    assert score >= 0.5
+
+
+@pytest.mark.parametrize("with_ocr", [True, False])
+def test_running_text_is_skipped(with_ocr):
+    page = document("text")[0]
+    records = text_layer_records(page, ZOOM) if with_ocr else None
+    assert TablePrefilter().check(render_page(page, ZOOM), records, "bank_statement")[:2] == (False, "layout")
+    # A zero threshold never skips a page on layout grounds
+    assert TablePrefilter(threshold=0).should_detect(render_page(page, ZOOM), records, "bank_statement")
+
+
+def test_classification_decides_first():
+    page = document("ruled")[0]
+    prefilter = TablePrefilter()
+    assert prefilter.check(render_page(page, ZOOM), text_layer_records(page, ZOOM), "others")[:2] == \
+        (False, "classification")
+    # Without an image or OCR output the model decides
+    assert prefilter.check(None, None, "bank_statement")[:2] == (True, "no_image")
+
+
+def test_statement_table_is_never_skipped(tmp_path):
+    pdf_path = str(tmp_path / "statement.pdf")
+    generate_document("bank_statement", pdf_path, pages=3, table_density=1.0, seed=4)
+    with fitz.open(pdf_path) as pdf:
+        for page in pdf:
+            image = render_page(page, ZOOM)
+            assert TablePrefilter().should_detect(image, text_layer_records(page, ZOOM), "bank_statement")
+            assert TablePrefilter().should_detect(image, None, "bank_statement")
+
+
+def test_skip_report_counts_each_stage():
+    records = [
+        {"stage": "table_prefilter", "skipped": True, "decided_by": "classification"},
+        {"stage": "table_prefilter", "skipped": True, "decided_by": "layout"},
+        {"stage": "table_prefilter", "skipped": False, "decided_by": "ocr_layout"},
+        {"stage": "ocr", "items": 3},
+    ]
+    assert skip_report(records) == {
+        "pages": 3, "skipped": 2, "detected": 1,
+        "skipped_by": {"classification": 1, "layout": 1}, "detected_by": {"ocr_layout": 1},
+    }
+
+
+def test_skip_report_reads_a_snapshot(monkeypatch):
+    # Records keep arriving from other threads while the report is built
+    busy = Profiler()
+    monkeypatch.setattr("table_prefilter.profiler", busy)
+
+    def write():
+        for _ in range(2000):
+            with busy.stage("table_prefilter") as record:
+                record.update(decided_by="layout", skipped=True)
+
+    writers = [threading.Thread(target=write) for _ in range(4)]
+    for writer in writers:
+        writer.start()
+    while any(writer.is_alive() for writer in writers):
+        report = skip_report()
+        assert report["pages"] == report["skipped"] == report["skipped_by"].get("layout", 0)
+    for writer in writers:
+        writer.join()
+    assert skip_report()["skipped_by"] == {"layout": 8000}
+
+
+@pytest.mark.parametrize("render_mode", ["full", "adaptive"])
+def test_pipeline_passes_the_page_type(tmp_path, monkeypatch, render_mode):
+    pdf_path = str(tmp_path / "summary.pdf")
+    document("ruled").save(pdf_path)
+    detected = []
+    monkeypatch.setattr(pipeline, "extract_tables_adaptive", lambda *args, **kwargs: detected.append(args) or "")
+    monkeypatch.setattr("table_extractor.extract_tables_from_image",
+                        lambda *args, **kwargs: detected.append(args) or "")
+    profiler.reset()
+
+    # The page has a ruled table, but an "others" page is never sent to detection
+    (result,) = process_document(pdf_path, text_mode="hybrid", table_prefilter=0.5, render_mode=render_mode)
+    assert result["classification"] == "others"
+    assert result["tables"] == ""
+    assert not detected
+    assert skip_report()["skipped_by"] == {"classification": 1}
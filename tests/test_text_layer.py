@@ -0,0 +1,148 @@
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+import text_layer
+from benchmarks.synthetic_documents import generate_document
+from checksum_validator import extract_transaction_rows, validate_page
+from ocr import get_page_text
+from pdf_to_image import pixmap_to_array, render_page
+from text_layer import extract_page_records, extract_text, image_regions, ocr_region, text_layer_records
+
+ZOOM = 2
+
+
+@pytest.fixture
+def statement(tmp_path):
+    pdf_path = str(tmp_path / "statement.pdf")
+    generate_document("bank_statement", pdf_path, pages=1, table_density=1.0, seed=5)
+    with fitz.open(pdf_path) as document:
+        yield document
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """
+    Replace OCR by one record around the dark pixels of each image, in the image's pixels.
+    """
+    calls = []
+
+    def ocr_image(image, language="en"):
+        gray = np.asarray(image.convert("L"))
+        calls.append(gray.shape)
+        ys, xs = np.nonzero(gray < 128)
+        if not len(xs):
+            return []
+        x1, y1, x2, y2 = float(xs.min()), float(ys.min()), float(xs.max() + 1), float(ys.max() + 1)
+        return [{"text": "ink", "confidence": 0.9, "position": [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]}]
+
+    monkeypatch.setattr(text_layer, "ocr_image", ocr_image)
+    ocr_image.calls = calls
+    return ocr_image
+
+
+def scan(document, searchable=False):
+    """
+    Rasterize a document into image-only pages, optionally under an invisible copy of its text layer.
+    """
+    scanned = fitz.open()
+    for page in document:
+        image = pixmap_to_array(page.get_pixmap(matrix=fitz.Matrix(ZOOM, ZOOM), alpha=False))
+        target = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        target.insert_image(target.rect, stream=cv2.imencode(".png", image[:, :, ::-1])[1].tobytes())
+        if searchable:
+            for block in page.get_text("dict")["blocks"]:
+                for line in block.get("lines", []):
+                    for span in line["spans"]:
+                        target.insert_text(span["origin"], span["text"], fontsize=span["size"], render_mode=3)
+    return scanned
+
+
+def page_with_image(rotation):
+    """
+    A page with a line of text and a black image, shown with the given rotation.
+    """
+    document = fitz.open()
+    page = document.new_page(width=595, height=842)
+    page.insert_text((60, 80), "Cheque deposited at the branch counter on 02/01/2024", fontsize=10)
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 20), False)
+    pixmap.clear_with(0)
+    page.insert_image(fitz.Rect(300, 500, 500, 600), pixmap=pixmap)
+    page.set_rotation(rotation)
+    return document
+
+
+def dark_box(image, rect):
+    """
+    Return the box around the dark pixels of a rendered page inside a region, in page pixels.
+    """
+    x1, y1, x2, y2 = (int(value) for value in rect)
+    gray = np.asarray(image.convert("L"))[y1:y2, x1:x2]
+    ys, xs = np.nonzero(gray < 128)
+    return [x1 + xs.min(), y1 + ys.min(), x1 + xs.max() + 1, y1 + ys.max() + 1]
+
+
+def test_born_digital_page_reads_the_text_layer(statement, fake_ocr):
+    records = extract_page_records(statement[0], ZOOM)
+    assert records == text_layer_records(statement[0], ZOOM)
+    assert not fake_ocr.calls
+    errors, _ = validate_page(get_page_text(records))
+    assert extract_transaction_rows(get_page_text(records)) and not errors
+
+
+def test_scanned_page_needs_ocr(statement, fake_ocr, tmp_path):
+    scanned = scan(statement)
+    assert extract_page_records(scanned[0], ZOOM) is None
+
+    pdf_path = str(tmp_path / "scanned.pdf")
+    scanned.save(pdf_path)
+    extract_text(pdf_path, str(tmp_path), ZOOM)
+    # One full-page OCR call
+    assert fake_ocr.calls == [(842 * ZOOM, 595 * ZOOM)]
+
+
+def test_searchable_scan_is_not_read_twice(statement, fake_ocr):
+    searchable = scan(statement, searchable=True)
+    assert image_regions(searchable[0]) == []
+
+    records = extract_page_records(searchable[0], ZOOM)
+    assert not fake_ocr.calls
+    page_text = get_page_text(records)
+    expected = get_page_text(extract_page_records(statement[0], ZOOM))
+    assert extract_transaction_rows(page_text) == extract_transaction_rows(expected)
+    errors, _ = validate_page(page_text)
+    assert not errors
+
+
+def test_image_on_a_born_digital_page_is_ocred(fake_ocr):
+    document = page_with_image(0)
+    records = extract_page_records(document[0], ZOOM)
+    assert [record["text"] for record in records] == [
+        "Cheque deposited at the branch counter on 02/01/2024", "ink",
+    ]
+    assert records[1]["position"][0] == pytest.approx([600, 1000], abs=1)
+    assert records[1]["position"][2] == pytest.approx([1000, 1200], abs=1)
+
+
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+def test_rotated_page_regions_line_up_with_the_render(fake_ocr, rotation):
+    page = page_with_image(rotation)[0]
+    render = render_page(page, ZOOM)
+
+    (region,) = image_regions(page)
+    assert region in page.rect
+    (record,) = ocr_region(page, region, ZOOM)
+    x1, y1 = record["position"][0]
+    x2, y2 = record["position"][2]
+    assert [x1, y1, x2, y2] == pytest.approx(dark_box(render, region * ZOOM + (-10, -10, 10, 10)), abs=1)
+
+    # Text layer positions are in the same rotated pixels
+    records = extract_page_records(page, ZOOM)
+    assert sorted(record["text"] for record in records) == sorted(
+        ["Cheque deposited at the branch counter on 02/01/2024", "ink"]
+    )
+    text_record = next(record for record in records if record["text"] != "ink")
+    (tx1, ty1), _, (tx2, ty2), _ = text_record["position"]
+    gray = np.asarray(render.convert("L"))
+    assert (gray[int(ty1):int(ty2), int(tx1):int(tx2)] < 128).sum() > 100
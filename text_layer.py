@@ -0,0 +1,144 @@
+import logging
+
+import fitz
+
+from instrumentation import stage
+from ocr import ocr_image, save_ocr_results
+from pdf_to_image import pixmap_to_pil, render_page
+
+logger = logging.getLogger(__name__)
+
+
+def has_usable_text(page, min_chars=20, max_bad_ratio=0.1):
+    """
+    Check whether a page has an embedded text layer worth using instead of OCR.
+
+    Pages with fewer than ``min_chars`` visible characters (scans, image-only
+    pages) or with many unmappable glyphs (broken font encodings) are rejected.
+    """
+    text = page.get_text("text")
+    visible = [char for char in text if not char.isspace()]
+    if len(visible) < min_chars:
+        return False
+
+    bad = sum(1 for char in visible if char == "\ufffd")
+    return bad / len(visible) <= max_bad_ratio
+
+
+def _to_image_quad(page, bbox, zoom):
+    """
+    Convert a rectangle in PDF coordinates to a quad in rendered image pixels.
+    """
+    rect = fitz.Rect(bbox) * page.rotation_matrix * fitz.Matrix(zoom, zoom)
+    return [
+        [rect.x0, rect.y0],
+        [rect.x1, rect.y0],
+        [rect.x1, rect.y1],
+        [rect.x0, rect.y1],
+    ]
+
+
+def text_layer_records(page, zoom=2):
+    """
+    Read the text lines of the page's text layer as OCR-style records.
+
+    Positions are expressed in the pixels of the page rendered at ``zoom``,
+    so they line up with the records perform_ocr produces.
+    """
+    records = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if not text:
+                continue
+            records.append({
+                "text": text,
+                "confidence": 1.0,
+                "position": _to_image_quad(page, line["bbox"], zoom),
+            })
+    return records
+
+
+def image_regions(page, min_area_fraction=0.02, max_text_chars=20):
+    """
+    Return the rectangles of the images on the page that are large enough to hold text.
+
+    Images under at least ``max_text_chars`` characters of the text layer are
+    left out: on a searchable scan their text has already been read from the
+    layer. Rectangles are in the coordinates of the displayed (rotated) page.
+    """
+    page_area = abs(page.rect)
+    words = [(fitz.Rect(word[:4]), len(word[4])) for word in page.get_text("words")]
+    regions = []
+    for info in page.get_image_info():
+        image_rect = fitz.Rect(info["bbox"])
+        covered = sum(chars for rect, chars in words if image_rect.contains((rect.tl + rect.br) / 2))
+        if covered >= max_text_chars:
+            continue
+        rect = image_rect * page.rotation_matrix & page.rect
+        if not rect.is_empty and abs(rect) >= min_area_fraction * page_area:
+            regions.append(rect)
+    return regions
+
+
+def ocr_region(page, rect, zoom=2, language="en"):
+    """
+    Render one region of the page and OCR it, with positions in full-page image pixels.
+
+    Args:
+        rect: The region in the coordinates of the displayed (rotated) page, like page.rect.
+    """
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=rect, alpha=False)
+    records = ocr_image(pixmap_to_pil(pix), language)
+
+    # Shift the region's positions to the full-page image
+    origin = fitz.Rect(rect).top_left * zoom
+    for record in records:
+        record["position"] = [[x + origin.x, y + origin.y] for x, y in record["position"]]
+    return records
+
+
+def extract_page_records(page, zoom=2, language="en", min_chars=20, ocr_images=True):
+    """
+    Extract a page's text from its text layer, OCRing only the images on it.
+
+    Returns:
+        list: OCR-style {"text", "confidence", "position"} records, or None when
+        the page has no usable text layer and needs full-page OCR.
+    """
+    if not has_usable_text(page, min_chars):
+        return None
+
+    with stage("text_layer", page=f"page_{page.number + 1}") as record:
+        records = text_layer_records(page, zoom)
+        record["items"] = len(records)
+
+    if ocr_images:
+        for rect in image_regions(page):
+            records.extend(ocr_region(page, rect, zoom, language))
+
+    # Keep the top-to-bottom, left-to-right order of OCR output
+    records.sort(key=lambda item: (item["position"][0][1], item["position"][0][0]))
+    return records
+
+
+def extract_text(pdf_path, output_dir="data", zoom=2, language="en", min_chars=20):
+    """
+    Build ocr_results.json for a PDF, using the text layer where possible and OCR elsewhere.
+
+    Returns:
+        str: Path to the JSON file, in the same format perform_ocr writes.
+    """
+    ocr_results = {}
+    with fitz.open(pdf_path) as pdf_document:
+        for page in pdf_document:
+            page_name = f"page_{page.number + 1}"
+            page_data = extract_page_records(page, zoom, language, min_chars)
+            if page_data is None:
+                logger.info("No usable text layer on %s, running OCR", page_name)
+                page_data = ocr_image(render_page(page, zoom), language)
+            else:
+                logger.info("Read text layer of %s", page_name)
+            ocr_results[page_name] = page_data
+
+    return save_ocr_results(ocr_results, output_dir)